@@ -0,0 +1,137 @@
+"""
+Benchmark de carga: rota async (/consultar-gastos) contra a implementação
+síncrona anterior, com MongoDB e OpenAI substituídos por dublês locais.
+
+A OpenAI falsa apenas espera `--latencia` segundos antes de responder, então
+o resultado mostra quantas requisições simultâneas cada caminho sustenta.
+Rotas síncronas ficam limitadas ao threadpool do Starlette (40 threads por
+padrão); a rota async não ocupa threads enquanto espera.
+
+Uso (a partir de agente_backend/):
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_async_load --requisicoes 200 --latencia 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import mongomock
+import mongomock_motor
+import motor.motor_asyncio
+import pymongo
+
+# Dublês do MongoDB: precisam estar no lugar antes de importar src.db_mongo
+pymongo.MongoClient = mongomock.MongoClient
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ["LLM_CACHE_DB"] = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from src import db_mongo, process_input  # noqa: E402
+
+USER_ID = 1
+
+
+def _resposta_consulta():
+    hoje = datetime.now()
+    conteudo = json.dumps({
+        "periodo": "mensal",
+        "start_date": hoje.replace(day=1).strftime("%Y-%m-%d"),
+        "end_date": hoje.strftime("%Y-%m-%d"),
+        "tipo": None
+    })
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=conteudo))])
+
+
+class OpenAIFalsa:
+    """Imita client.chat.completions.create com uma latência fixa"""
+
+    def __init__(self, latencia, assincrona):
+        async def criar_async(**kwargs):
+            await asyncio.sleep(latencia)
+            return _resposta_consulta()
+
+        def criar_sync(**kwargs):
+            time.sleep(latencia)
+            return _resposta_consulta()
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=criar_async if assincrona else criar_sync))
+
+
+def consultar_gastos_sync(req: main.QueryRequest):
+    """Implementação anterior: def síncrono, OpenAI e MongoDB bloqueantes"""
+    parametros = process_input.processar_consulta(req.consulta, USER_ID)
+    gastos = db_mongo.get_user_expenses(
+        USER_ID, parametros.get("start_date"), parametros.get("end_date"), parametros.get("tipo")
+    )
+    return {"total": sum(g["valor"] for g in gastos), "gastos": gastos}
+
+
+async def usuario_falso():
+    return SimpleNamespace(id=USER_ID, username="bench")
+
+
+def preparar(latencia, gastos):
+    process_input.client = OpenAIFalsa(latencia, assincrona=False)
+    process_input.async_client = OpenAIFalsa(latencia, assincrona=True)
+    main.app.dependency_overrides[main.get_user_from_token] = usuario_falso
+    main.app.add_api_route("/bench/consultar-gastos-sync", consultar_gastos_sync, methods=["POST"])
+
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    db_mongo.conectar()
+    db_mongo.users_collection.insert_one({"sqlite_id": USER_ID, "username": "bench"})
+    db_mongo.expenses_collection.insert_many([
+        db_mongo.preparar_gasto({"user_id": USER_ID, "valor": 10.0, "tipo": "lazer", "data": hoje, "descricao": f"gasto {i}"})
+        for i in range(gastos)
+    ])
+
+
+async def disparar(cliente, rota, quantidade):
+    """Envia `quantidade` requisições simultâneas e retorna (tempo total, latências)"""
+    async def uma(i):
+        inicio = time.perf_counter()
+        # Textos distintos para não acertar o cache de respostas do GPT
+        resposta = await cliente.post(rota, json={"consulta": f"gastos deste mês {rota} {i}"})
+        resposta.raise_for_status()
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    latencias = await asyncio.gather(*(uma(i) for i in range(quantidade)))
+    return time.perf_counter() - inicio, sorted(latencias)
+
+
+async def executar(args):
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+        for nome, rota in (("sync (threadpool)", "/bench/consultar-gastos-sync"), ("async", "/consultar-gastos")):
+            total, latencias = await disparar(cliente, rota, args.requisicoes)
+            p95 = latencias[int(len(latencias) * 0.95) - 1]
+            print(
+                f"{nome:<18} {args.requisicoes} req em {total:.2f}s  "
+                f"{args.requisicoes / total:.1f} req/s  p95={p95 * 1000:.0f}ms"
+            )
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Carga concorrente: rotas sync x async")
+    parser.add_argument("--requisicoes", type=int, default=200)
+    parser.add_argument("--latencia", type=float, default=0.5, help="Latência da OpenAI falsa (s)")
+    parser.add_argument("--gastos", type=int, default=50)
+    args = parser.parse_args()
+
+    preparar(args.latencia, args.gastos)
+    asyncio.run(executar(args))
+
+
+if __name__ == "__main__":
+    main_bench()
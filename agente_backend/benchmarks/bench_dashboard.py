@@ -0,0 +1,125 @@
+"""
+Benchmark do /dashboard: caminho antigo (duas buscas + agregação em Python)
+contra a agregação única ($facet) e a leitura dos rollups mensais.
+
+Uso (a partir de agente_backend/, com um MongoDB acessível em MONGO_URI):
+
+    python -m benchmarks.bench_dashboard --gastos 5000 --repeticoes 50
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from calendar import monthrange
+from datetime import datetime, timedelta
+
+# Usa um banco separado para não misturar com os dados reais
+os.environ.setdefault("DB_NAME", "agente_financeiro_bench")
+
+from src import db_mongo  # noqa: E402
+
+CATEGORIAS = ["alimentação", "transporte", "moradia", "lazer", "saúde", "educação", "vestuário", "outros"]
+USER_ID = 999999
+
+
+def periodos():
+    hoje = datetime.now()
+    inicio_atual = hoje.replace(day=1)
+    fim_atual = hoje.replace(day=monthrange(hoje.year, hoje.month)[1])
+    fim_anterior = inicio_atual - timedelta(days=1)
+    inicio_anterior = fim_anterior.replace(day=1)
+    return tuple(d.strftime("%Y-%m-%d") for d in (inicio_atual, fim_atual, inicio_anterior, fim_anterior))
+
+
+def popular(quantidade):
+    """Insere `quantidade` gastos distribuídos entre o mês atual e o anterior"""
+    db_mongo.expenses_collection.delete_many({"user_id": USER_ID})
+    db_mongo.rollups_collection.delete_many({"user_id": USER_ID})
+    db_mongo.users_collection.update_one(
+        {"sqlite_id": USER_ID},
+        {"$setOnInsert": {"sqlite_id": USER_ID, "username": "bench"}},
+        upsert=True
+    )
+
+    inicio_atual, fim_atual, inicio_anterior, _ = periodos()
+    inicio = datetime.strptime(inicio_anterior, "%Y-%m-%d")
+    dias = (datetime.strptime(fim_atual, "%Y-%m-%d") - inicio).days + 1
+
+    documentos = [
+        {
+            "user_id": USER_ID,
+            "valor": round(random.uniform(5, 500), 2),
+            "tipo": random.choice(CATEGORIAS),
+            "data": (inicio + timedelta(days=random.randrange(dias))).strftime("%Y-%m-%d"),
+            "descricao": f"gasto de benchmark {i}"
+        }
+        for i in range(quantidade)
+    ]
+    db_mongo.expenses_collection.insert_many([db_mongo.preparar_gasto(doc) for doc in documentos], ordered=False)
+    db_mongo.rebuild_rollups(USER_ID)
+
+
+def caminho_antigo():
+    inicio_atual, fim_atual, inicio_anterior, fim_anterior = periodos()
+    atuais = db_mongo.get_user_expenses(USER_ID, inicio_atual, fim_atual)
+    anteriores = db_mongo.get_user_expenses(USER_ID, inicio_anterior, fim_anterior)
+
+    total_atual = sum(g["valor"] for g in atuais)
+    total_anterior = sum(g["valor"] for g in anteriores)
+    por_categoria = {}
+    for gasto in atuais:
+        por_categoria[gasto["tipo"]] = por_categoria.get(gasto["tipo"], 0) + gasto["valor"]
+    ultimas = sorted(atuais, key=lambda x: x["data"], reverse=True)[:5]
+    return total_atual, total_anterior, por_categoria, ultimas
+
+
+def caminho_agregado():
+    return db_mongo._resumo_por_agregacao(USER_ID, *periodos())
+
+
+def caminho_rollups():
+    return db_mongo.get_dashboard_summary(USER_ID, *periodos())
+
+
+def medir(funcao, repeticoes):
+    funcao()  # aquecimento
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        "p50": statistics.median(tempos),
+        "p95": tempos[int(len(tempos) * 0.95) - 1],
+        "media": statistics.mean(tempos)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do resumo do dashboard")
+    parser.add_argument("--gastos", type=int, default=5000)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    db_mongo.conectar()
+    db_mongo.criar_indices()
+    print(f"Populando {args.gastos} gastos em '{db_mongo.DB_NAME}'...")
+    popular(args.gastos)
+
+    caminhos = (
+        ("antigo (find + Python)", caminho_antigo),
+        ("agregação $facet", caminho_agregado),
+        ("rollups mensais", caminho_rollups),
+    )
+    for nome, funcao in caminhos:
+        r = medir(funcao, args.repeticoes)
+        print(f"{nome:<24} p50={r['p50']:.2f}ms  p95={r['p95']:.2f}ms  média={r['media']:.2f}ms")
+
+    db_mongo.expenses_collection.delete_many({"user_id": USER_ID})
+    db_mongo.rollups_collection.delete_many({"user_id": USER_ID})
+
+
+if __name__ == "__main__":
+    main()
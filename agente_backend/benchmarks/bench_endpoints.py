@@ -0,0 +1,335 @@
+"""
+Benchmark reproduzível das rotas principais da API.
+
+Sobe o `app` do FastAPI em processo, com o MongoDB substituído pelo mongomock e
+a OpenAI substituída por um servidor HTTP local compatível com
+/v1/chat/completions (latência configurável). Popula usuários e gastos em
+várias escalas e mede, por rota, p50/p95/p99 e requisições por segundo:
+
+- POST /processar-gasto   (caminho do GPT: textos sem valor explícito)
+- POST /consultar-gastos  (consultas distintas, sem acerto de cache)
+- GET  /gastos?limit=100
+- GET  /dashboard
+
+O resultado vai para um arquivo JSON. Com --comparar, cada p95 é comparado com
+o de uma execução anterior e o processo termina com código 1 se alguma rota
+piorar além de --tolerancia.
+
+Uso (a partir de agente_backend/):
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_endpoints --escalas 1000 100000 1000000 --saida bench.json
+    python -m benchmarks.bench_endpoints --escalas 1000 100000 --comparar bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mongomock
+import mongomock_motor
+import motor.motor_asyncio
+import pymongo
+
+# Dublês do MongoDB: precisam estar no lugar antes de importar src.db_mongo
+pymongo.MongoClient = mongomock.MongoClient
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+os.environ.setdefault("EXPENSE_BACKEND", "mongo")
+os.environ.setdefault("EXPENSES_SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench_expenses.db"))
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ["OPENAI_API_KEY"] = "bench"
+os.environ["LLM_CACHE_DB"] = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+# O retrato dos usuários fica em cache durante toda a execução (sem SQLite)
+os.environ["AUTH_CACHE_TTL"] = str(24 * 3600)
+
+CATEGORIAS = ["alimentação", "transporte", "moradia", "lazer", "saúde", "educação", "vestuário", "outros"]
+
+ROTAS = ("/processar-gasto", "/consultar-gastos", "/gastos", "/dashboard")
+
+
+# --- OpenAI falsa -----------------------------------------------------------
+
+def _conteudo_falso(prompt, esquema=None):
+    """Resposta no formato esperado pelo prompt ou pelo esquema (consulta ou gasto)"""
+    hoje = datetime.now()
+    if esquema == "consulta" or (esquema is None and "consulta" in prompt):
+        return {
+            "periodo": "mensal",
+            "start_date": hoje.replace(day=1).strftime("%Y-%m-%d"),
+            "end_date": hoje.strftime("%Y-%m-%d"),
+            "tipo": random.choice([None, *CATEGORIAS])
+        }
+    gasto = {
+        "valor": round(random.uniform(5, 300), 2),
+        "tipo": random.choice(CATEGORIAS),
+        "data": hoje.strftime("%Y-%m-%d")
+    }
+    if esquema == "gasto":
+        return {"eh_gasto": True, **gasto}
+    return {**gasto, "descricao": "gasto de benchmark"}
+
+
+def iniciar_openai_falsa(latencia):
+    """Servidor HTTP local compatível com POST /v1/chat/completions; retorna a base_url"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            time.sleep(latencia)
+
+            prompt = " ".join(m.get("content") or "" for m in corpo.get("messages", []))
+            esquema = (corpo.get("response_format") or {}).get("json_schema", {}).get("name")
+            conteudo = json.dumps(_conteudo_falso(prompt, esquema), ensure_ascii=False)
+            resposta = json.dumps({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": corpo.get("model", "gpt-3.5-turbo"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": conteudo},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": len(prompt) // 4,
+                    "completion_tokens": len(conteudo) // 4,
+                    "total_tokens": (len(prompt) + len(conteudo)) // 4
+                }
+            }).encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(resposta)))
+            self.end_headers()
+            self.wfile.write(resposta)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_address[1]}/v1"
+
+
+# --- Preparação -------------------------------------------------------------
+
+def preparar_usuarios(main, quantidade):
+    """Cria os retratos autenticados em cache e retorna {user_id: token}"""
+    tokens = {}
+    for user_id in range(1, quantidade + 1):
+        username = f"bench{user_id}"
+        main.cache_usuarios.guardar(main.UsuarioAutenticado(
+            id=user_id, username=username, liberado=True, is_admin=False,
+            meta_mensal=3000.0, meta_configurada=True
+        ))
+        main.storage.register_user(user_id, username)
+        tokens[user_id] = main.jwt.encode({"sub": username}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+    return tokens
+
+
+def popular(storage, usuarios, quantidade, lote=5000):
+    """Acrescenta `quantidade` gastos distribuídos entre os usuários nos últimos 12 meses"""
+    inicio = datetime.now() - timedelta(days=365)
+    datas = [(inicio + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(366)]
+    while quantidade > 0:
+        tamanho = min(lote, quantidade)
+        storage.save_many([
+            {
+                "user_id": random.randint(1, usuarios),
+                "valor": round(random.uniform(5, 500), 2),
+                "tipo": random.choice(CATEGORIAS),
+                "data": random.choice(datas),
+                "descricao": "gasto de benchmark"
+            }
+            for _ in range(tamanho)
+        ])
+        quantidade -= tamanho
+
+
+# --- Carga ------------------------------------------------------------------
+
+def _palavra():
+    # Sem dígitos, para que o interpretador local não resolva o texto
+    return "".join(random.choices(string.ascii_lowercase, k=8))
+
+
+def montar_requisicao(rota, i):
+    """(método, caminho, corpo JSON) da i-ésima requisição da rota"""
+    if rota == "/processar-gasto":
+        return "POST", rota, {"texto": f"comprei um presente especial {_palavra()}"}
+    if rota == "/consultar-gastos":
+        return "POST", rota, {"consulta": f"quanto gastei este mês {_palavra()} {i}"}
+    if rota == "/gastos":
+        return "GET", "/gastos?limit=100", None
+    return "GET", rota, None
+
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método do posto mais próximo"""
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[indice]
+
+
+async def medir_rota(cliente, tokens, rota, requisicoes, concorrencia, aquecimento):
+    semaforo = asyncio.Semaphore(concorrencia)
+    usuarios = list(tokens)
+    erros = 0
+
+    async def uma(i):
+        nonlocal erros
+        metodo, caminho, corpo = montar_requisicao(rota, i)
+        headers = {"Authorization": f"Bearer {tokens[random.choice(usuarios)]}"}
+        async with semaforo:
+            inicio = time.perf_counter()
+            resposta = await cliente.request(metodo, caminho, json=corpo, headers=headers)
+            duracao = time.perf_counter() - inicio
+        if resposta.status_code >= 400:
+            erros += 1
+        return duracao
+
+    for i in range(aquecimento):
+        await uma(i)
+    erros = 0
+
+    inicio = time.perf_counter()
+    latencias = sorted(await asyncio.gather(*(uma(i) for i in range(requisicoes))))
+    total = time.perf_counter() - inicio
+
+    return {
+        "rota": rota,
+        "requisicoes": requisicoes,
+        "erros": erros,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 3),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 3),
+        "req_s": round(requisicoes / total, 2)
+    }
+
+
+async def executar(main, tokens, args):
+    """Popula cada escala (cumulativamente) e mede todas as rotas"""
+    import httpx
+
+    resultados = []
+    populados = 0
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+        for escala in sorted(args.escalas):
+            print(f"[{escala} gastos] populando...")
+            popular(main.storage, args.usuarios, escala - populados)
+            populados = escala
+
+            for rota in args.rotas:
+                resultado = await medir_rota(
+                    cliente, tokens, rota, args.requisicoes, args.concorrencia, args.aquecimento
+                )
+                resultado["escala"] = escala
+                resultados.append(resultado)
+                print(
+                    f"  {rota:<18} p50={resultado['p50_ms']:.1f}ms p95={resultado['p95_ms']:.1f}ms "
+                    f"p99={resultado['p99_ms']:.1f}ms {resultado['req_s']:.1f} req/s erros={resultado['erros']}"
+                )
+    return resultados
+
+
+# --- Relatório --------------------------------------------------------------
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def carregar_base(arquivo):
+    """Resultados de uma execução anterior, indexados por (escala, rota)"""
+    with open(arquivo, encoding="utf-8") as f:
+        return {(r["escala"], r["rota"]): r for r in json.load(f)["resultados"]}
+
+
+def comparar(resultados, base, tolerancia):
+    """Compara o p95 de cada (escala, rota) com a execução base; retorna as regressões"""
+    regressoes = []
+    print(f"\nComparação com a execução anterior (tolerância {tolerancia:.0f}%):")
+    for resultado in resultados:
+        anterior = base.get((resultado["escala"], resultado["rota"]))
+        if not anterior or not anterior["p95_ms"]:
+            continue
+        variacao = (resultado["p95_ms"] - anterior["p95_ms"]) / anterior["p95_ms"] * 100
+        marca = ""
+        if variacao > tolerancia:
+            marca = "  <- regressão"
+            regressoes.append(resultado)
+        print(
+            f"  {resultado['escala']:>8} {resultado['rota']:<18} p95 "
+            f"{anterior['p95_ms']:.1f}ms -> {resultado['p95_ms']:.1f}ms ({variacao:+.1f}%){marca}"
+        )
+    return regressoes
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Latência e vazão das rotas principais")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1000, 100000, 1000000],
+                        help="Total de gastos em cada rodada (cumulativo, em ordem crescente)")
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--rotas", nargs="+", default=list(ROTAS), choices=ROTAS)
+    parser.add_argument("--requisicoes", type=int, default=500, help="Requisições por rota e escala")
+    parser.add_argument("--concorrencia", type=int, default=32)
+    parser.add_argument("--aquecimento", type=int, default=10)
+    parser.add_argument("--latencia", type=float, default=0.2, help="Latência da OpenAI falsa (s)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default="bench_endpoints.json")
+    parser.add_argument("--comparar", help="Arquivo JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=20.0, help="Piora máxima aceita no p95 (%%)")
+    args = parser.parse_args()
+
+    # Lida antes da execução, para permitir --comparar e --saida no mesmo arquivo
+    base = carregar_base(args.comparar) if args.comparar else None
+
+    random.seed(args.semente)
+    os.environ["OPENAI_BASE_URL"] = iniciar_openai_falsa(args.latencia)
+
+    # Importado só agora: os clientes da OpenAI leem OPENAI_BASE_URL na criação
+    import main
+
+    tokens = preparar_usuarios(main, args.usuarios)
+
+    # Um único loop de eventos: os clientes motor e AsyncOpenAI ficam presos ao loop em que foram usados
+    resultados = asyncio.run(executar(main, tokens, args))
+
+    relatorio = {
+        "metadados": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_atual(),
+            "python": sys.version.split()[0],
+            "plataforma": platform.platform(),
+            "backend": main.storage.nome,
+            "parametros": vars(args)
+        },
+        "resultados": resultados
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em {args.saida}")
+
+    if base is not None and comparar(resultados, base, args.tolerancia):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,61 @@
+"""
+Benchmark das análises colunares de src/historico.py.
+
+Gera um histórico sintético de vários anos em memória (sem banco) e mede
+o tempo de cada análise sobre os arrays já carregados.
+
+Uso (a partir de agente_backend/):
+
+    python -m benchmarks.bench_historico --anos 5 --gastos-por-dia 20
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from src.historico import HistoricoGastos, serie_mensal, estatisticas_categorias, sazonalidade
+
+CATEGORIAS = ["alimentação", "transporte", "moradia", "lazer", "saúde", "educação", "vestuário", "outros"]
+
+
+def gerar_historico(anos, gastos_por_dia):
+    inicio = date.today() - timedelta(days=365 * anos)
+    datas, valores, tipos = [], [], []
+    for dia in range(365 * anos):
+        data = (inicio + timedelta(days=dia)).isoformat()
+        for _ in range(gastos_por_dia):
+            datas.append(data)
+            valores.append(round(random.uniform(5, 500), 2))
+            tipos.append(random.choice(CATEGORIAS))
+    return datas, valores, tipos
+
+
+def medir(nome, funcao, repeticoes):
+    funcao()  # aquecimento
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    print(f"  {nome:<26} {(time.perf_counter() - inicio) / repeticoes * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo das análises do histórico")
+    parser.add_argument("--anos", type=int, default=5)
+    parser.add_argument("--gastos-por-dia", type=int, default=20)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    colunas = gerar_historico(args.anos, args.gastos_por_dia)
+    print(f"{len(colunas[0])} gastos em {args.anos} anos")
+
+    inicio = time.perf_counter()
+    historico = HistoricoGastos(*colunas)
+    print(f"  {'montagem das colunas':<26} {(time.perf_counter() - inicio) * 1000:.2f}ms")
+
+    medir("serie_mensal", lambda: serie_mensal(historico), args.repeticoes)
+    medir("estatisticas_categorias", lambda: estatisticas_categorias(historico), args.repeticoes)
+    medir("sazonalidade", lambda: sazonalidade(historico), args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark de login sob concorrência: bcrypt no threadpool x pool de processos.
+
+Compara a implementação anterior (rota síncrona com bcrypt.checkpw inline) com
+a atual (/login assíncrono, bcrypt em src/senhas.py). Durante a rajada de
+logins, uma rota síncrona trivial é chamada em paralelo para mostrar o efeito
+do bcrypt sobre rotas que não têm relação com autenticação.
+
+Usa um users.db temporário e o mongomock; nada é gravado nos bancos reais.
+
+Uso (a partir de agente_backend/):
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_login --logins 200 --usuarios 50 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import mongomock
+import mongomock_motor
+import motor.motor_asyncio
+import pymongo
+
+pymongo.MongoClient = mongomock.MongoClient
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+# src/db.py usa ./users.db: o benchmark roda em um diretório temporário
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("EXPENSE_BACKEND", "mongo")
+# Sem limite por username: o benchmark repete o login dos mesmos usuários
+os.environ["LOGIN_MAX_TENTATIVAS"] = str(10 ** 9)
+
+import bcrypt  # noqa: E402
+import httpx  # noqa: E402
+
+SENHA = "senha-de-benchmark"
+
+
+def preparar(main, usuarios, rounds):
+    """Cria usuários liberados com hashes no custo informado"""
+    hashed = bcrypt.hashpw(SENHA.encode(), bcrypt.gensalt(rounds)).decode()
+    db = main.SessionLocal()
+    try:
+        for i in range(usuarios):
+            db.add(main.User(username=f"bench{i}", hashed_password=hashed, liberado=True, is_admin=False))
+        db.commit()
+    finally:
+        db.close()
+
+
+def criar_login_inline(main):
+    """Implementação anterior: def síncrono com bcrypt.checkpw no threadpool"""
+    def login_inline(req: main.LoginRequest):
+        db = main.SessionLocal()
+        try:
+            user = db.query(main.User).filter(main.User.username == req.username).first()
+            if not user or not bcrypt.checkpw(req.password.encode(), user.hashed_password.encode()):
+                raise main.HTTPException(status_code=401, detail="Credenciais inválidas")
+            token = main.jwt.encode({"sub": user.username}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+            return {"access_token": token}
+        finally:
+            db.close()
+    return login_inline
+
+
+def ping():
+    """Rota síncrona sem relação com login (ocupa uma thread do threadpool)"""
+    return {"ok": True}
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[max(0, -(-len(valores) * p // 100) - 1)]
+
+
+async def rajada(cliente, rota, logins, usuarios):
+    """Dispara os logins e, em paralelo, pings sequenciais; retorna métricas"""
+    latencias_ping = []
+    terminou = asyncio.Event()
+
+    async def sondar():
+        while not terminou.is_set():
+            inicio = time.perf_counter()
+            await cliente.get("/bench/ping")
+            latencias_ping.append(time.perf_counter() - inicio)
+            await asyncio.sleep(0.01)
+
+    async def um(i):
+        inicio = time.perf_counter()
+        resposta = await cliente.post(rota, json={"username": f"bench{i % usuarios}", "password": SENHA})
+        resposta.raise_for_status()
+        return time.perf_counter() - inicio
+
+    sonda = asyncio.create_task(sondar())
+    inicio = time.perf_counter()
+    latencias = await asyncio.gather(*(um(i) for i in range(logins)))
+    total = time.perf_counter() - inicio
+    terminou.set()
+    await sonda
+
+    return {
+        "logins_s": logins / total,
+        "p95_login_ms": percentil(latencias, 95) * 1000,
+        "p95_ping_ms": percentil(latencias_ping, 95) * 1000 if latencias_ping else 0.0
+    }
+
+
+async def executar(main, args):
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+        # Aquecimento: inicia os processos do pool antes da medição
+        await cliente.post("/login", json={"username": "bench0", "password": SENHA})
+
+        for nome, rota in (("inline (threadpool)", "/bench/login-inline"), ("pool de processos", "/login")):
+            r = await rajada(cliente, rota, args.logins, args.usuarios)
+            print(
+                f"{nome:<20} {r['logins_s']:.1f} logins/s  p95 login={r['p95_login_ms']:.0f}ms  "
+                f"p95 rota não relacionada={r['p95_ping_ms']:.0f}ms"
+            )
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Vazão de login: bcrypt inline x pool de processos")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12, help="Custo bcrypt dos hashes (e BCRYPT_ROUNDS)")
+    args = parser.parse_args()
+
+    # Mesmo custo nos hashes e na configuração, para não medir a regravação do hash
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+    import main
+
+    main.app.add_api_route("/bench/login-inline", criar_login_inline(main), methods=["POST"])
+    main.app.add_api_route("/bench/ping", ping, methods=["GET"])
+
+    preparar(main, args.usuarios, args.rounds)
+    asyncio.run(executar(main, args))
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,120 @@
+"""
+Benchmark dos backends de armazenamento de gastos (MongoDB x SQLite).
+
+Executa as mesmas operações da interface ExpenseStorage em cada backend, para
+escolher o backend de cada instalação pela latência medida.
+
+Uso (a partir de agente_backend/):
+
+    python -m benchmarks.bench_storage --backend sqlite mongo --gastos 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from calendar import monthrange
+from datetime import datetime, timedelta
+
+# Bancos separados para não misturar com os dados reais
+os.environ.setdefault("DB_NAME", "agente_financeiro_bench")
+os.environ.setdefault("EXPENSES_SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench_expenses.db"))
+
+from src.storage import criar_storage  # noqa: E402
+
+CATEGORIAS = ["alimentação", "transporte", "moradia", "lazer", "saúde", "educação", "vestuário", "outros"]
+USER_ID = 999999
+
+
+def periodos():
+    hoje = datetime.now()
+    inicio_atual = hoje.replace(day=1)
+    fim_atual = hoje.replace(day=monthrange(hoje.year, hoje.month)[1])
+    fim_anterior = inicio_atual - timedelta(days=1)
+    inicio_anterior = fim_anterior.replace(day=1)
+    return tuple(d.strftime("%Y-%m-%d") for d in (inicio_atual, fim_atual, inicio_anterior, fim_anterior))
+
+
+def gasto_aleatorio(inicio, dias):
+    return {
+        "user_id": USER_ID,
+        "valor": round(random.uniform(5, 500), 2),
+        "tipo": random.choice(CATEGORIAS),
+        "data": (inicio + timedelta(days=random.randrange(dias))).strftime("%Y-%m-%d"),
+        "descricao": "gasto de benchmark"
+    }
+
+
+def popular(storage, quantidade):
+    """Distribui os gastos pelos últimos 12 meses, em lotes"""
+    fim = datetime.now()
+    inicio = fim - timedelta(days=365)
+    storage.register_user(USER_ID, "bench")
+    for _ in range(0, quantidade, 1000):
+        storage.save_many([gasto_aleatorio(inicio, 365) for _ in range(1000)])
+
+
+def medir(funcao, repeticoes):
+    funcao()  # aquecimento
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return statistics.median(tempos), tempos[int(len(tempos) * 0.95) - 1]
+
+
+def executar(storage, repeticoes):
+    inicio_atual, fim_atual, inicio_anterior, fim_anterior = periodos()
+    hoje = datetime.now()
+    ids_criados = []
+
+    def salvar():
+        ids_criados.append(storage.save(gasto_aleatorio(hoje, 1))["_id"])
+
+    def excluir():
+        if ids_criados:
+            storage.delete(USER_ID, ids_criados.pop())
+
+    operacoes = (
+        ("save", salvar),
+        ("find_range (mês)", lambda: storage.find_range(USER_ID, inicio_atual, fim_atual)),
+        ("find_range (mês, tipo)", lambda: storage.find_range(USER_ID, inicio_atual, fim_atual, "lazer")),
+        ("find_page (100)", lambda: storage.find_page(USER_ID, limit=100)),
+        ("dashboard_summary", lambda: storage.dashboard_summary(
+            USER_ID, inicio_atual, fim_atual, inicio_anterior, fim_anterior)),
+        ("delete", excluir),
+    )
+    for nome, funcao in operacoes:
+        p50, p95 = medir(funcao, repeticoes)
+        print(f"  {nome:<24} p50={p50:.2f}ms  p95={p95:.2f}ms")
+
+
+def limpar(storage):
+    while True:
+        pagina = storage.find_page(USER_ID, limit=1000, fields=["valor"])
+        for gasto in pagina["gastos"]:
+            storage.delete(USER_ID, gasto["_id"])
+        if not pagina["proximo_cursor"]:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos backends de armazenamento")
+    parser.add_argument("--backend", nargs="+", default=["sqlite", "mongo"], choices=["sqlite", "mongo"])
+    parser.add_argument("--gastos", type=int, default=20000)
+    parser.add_argument("--repeticoes", type=int, default=100)
+    args = parser.parse_args()
+
+    for backend in args.backend:
+        storage = criar_storage(backend)
+        print(f"[{backend}] populando {args.gastos} gastos...")
+        popular(storage, args.gastos)
+        executar(storage, args.repeticoes)
+        limpar(storage)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,120 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, Form
+import time
+
+# A partida a frio do worker é medida a partir do início da importação deste módulo
+_INICIO_PARTIDA = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Depends, Request, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response, FileResponse
+from starlette.background import BackgroundTask
+from fastapi.encoders import jsonable_encoder
+from starlette.routing import Match
+from pydantic import BaseModel, Field
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
+import json
 from sqlalchemy.orm import Session
 from src.models import User, UserSettings
 from src.db import SessionLocal, engine, Base
-from src.db_mongo import save_expense, get_user_expenses
-from src.process_input import processar_texto, processar_consulta
-import bcrypt
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from src.storage import get_storage, GastoInvalido
+from src.process_input import processar_texto_async, processar_consulta_async, fechar_clientes
+from src import senhas
+from src.senhas import limitador_login
+import asyncio
+from typing import Optional, List
+import calendar
 from calendar import monthrange
-from bson import ObjectId
 from src.analytics import gerar_dicas_personalizadas
+from src.historico import historicos, serie_mensal, estatisticas_categorias, sazonalidade
+from src.projecao import projecoes
+from src.classificador import classificadores
+from src.importacao import importar_extrato, IMPORTACAO_MAX_BYTES
+from src import exportacao
+from src.versoes import versoes, respostas, gerar_etag, etag_confere
+from src.llm_cache import cache as llm_cache
+from src.auth_cache import cache_usuarios, UsuarioAutenticado
+from src import metrics
+from src.perfil_mongo import monitor_consultas
+import tempfile
+import shutil
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
+# Processamento em lote: máximo de textos por requisição e de chamadas simultâneas ao GPT
+LOTE_MAXIMO = int(os.getenv("LOTE_MAXIMO", "200"))
+LOTE_CONCORRENCIA = int(os.getenv("LOTE_CONCORRENCIA", "8"))
+
+# Gastos por evento no modo SSE de /consultar-gastos
+SSE_LOTE_GASTOS = int(os.getenv("SSE_LOTE_GASTOS", "100"))
+
+# Token opcional exigido em /metrics (Authorization: Bearer <METRICS_TOKEN>)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Orçamento da partida a frio do worker (importação + conexões), em segundos
+PARTIDA_ORCAMENTO_S = float(os.getenv("PARTIDA_ORCAMENTO_S", "2"))
+# Tempo máximo da verificação do banco em /ready
+PRONTIDAO_TIMEOUT_S = float(os.getenv("PRONTIDAO_TIMEOUT_S", "2"))
+
 # Cria o banco e tabela se ainda não existirem
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+# Latência das consultas SQLAlchemy em /metrics
+metrics.instrumentar_sqlalchemy(engine)
+
+# Armazenamento de gastos (MongoDB ou SQLite, conforme EXPENSE_BACKEND); as
+# conexões são abertas no lifespan
+storage = get_storage()
+
+def _gastos_alterados(user_id: int, salvos=(), removidos=()):
+    """
+    Chamado após gravar ou excluir gastos: nova versão dos dados (ETags),
+    descarta o histórico em cache e atualiza os modelos de projeção e de
+    categoria do usuário
+    """
+    versoes.incrementar(user_id)
+    historicos.invalidar(user_id)
+    if salvos:
+        projecoes.registrar(user_id, salvos)
+        classificadores.aprender(user_id, salvos)
+    if removidos:
+        projecoes.remover(user_id, removidos)
+        classificadores.esquecer(user_id, removidos)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Abre as conexões na subida do worker e as fecha no desligamento
+
+    Não espera pelo MongoDB nem cria índices (isso é feito pela migração,
+    src/manager_migracao.py): com o banco fora do ar, o worker sobe e /ready
+    responde 503 até ele voltar.
+    """
+    inicio = time.perf_counter()
+    metrics.partida["importacao"] = inicio - _INICIO_PARTIDA
+    storage.conectar()
+    llm_cache.conectar()
+    metrics.partida["conexoes"] = time.perf_counter() - inicio
+    total = metrics.partida["total"] = time.perf_counter() - _INICIO_PARTIDA
+    if total > PARTIDA_ORCAMENTO_S:
+        print(f"Partida do worker acima do orçamento: {total:.2f}s (orçamento {PARTIDA_ORCAMENTO_S:.2f}s)")
+    app.state.pronto = True
+    try:
+        yield
+    finally:
+        app.state.pronto = False
+        storage.fechar()
+        llm_cache.fechar()
+        await fechar_clientes()
+        await run_in_threadpool(senhas.fechar)
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,8 +122,67 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+class MedirRequisicoes:
+    """
+    Registra a latência de cada requisição por rota (modelo do caminho, não o caminho real)
+
+    Middleware ASGI puro: o tempo para na última parte do corpo
+    (http.response.body sem more_body), então as respostas em fluxo (SSE,
+    NDJSON, exportações CSV/Parquet) contam a duração inteira e não só o
+    primeiro byte, e as tarefas em segundo plano depois da resposta ficam de
+    fora. Ao contrário de @app.middleware("http"), não cria tarefa nem fila
+    por requisição.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        status = 500
+        registrada = False
+
+        def registrar():
+            nonlocal registrada
+            registrada = True
+            metrics.HTTP_DURACAO.observar(
+                time.perf_counter() - inicio,
+                method=scope["method"],
+                route=_modelo_rota(scope),
+                status=status
+            )
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+            if mensagem["type"] == "http.response.body" and not mensagem.get("more_body", False):
+                registrar()
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # Erro ou cliente desconectado antes do fim do corpo
+            if not registrada:
+                registrar()
+
+app.add_middleware(MedirRequisicoes)
+
+def _modelo_rota(scope):
+    """Caminho declarado da rota (ex.: /gastos/{gasto_id}), para não criar uma série por id"""
+    for rota in app.routes:
+        if rota.matches(scope)[0] == Match.FULL:
+            return rota.path
+    return "nao_encontrada"
+
 class RegisterRequest(BaseModel):
     username: str
     password: str
@@ -48,6 +197,9 @@ class LoginRequest(BaseModel):
 class ExpenseRequest(BaseModel):
     texto: str
 
+class BatchExpenseRequest(BaseModel):
+    textos: List[str] = Field(..., min_length=1, max_length=LOTE_MAXIMO)
+
 class QueryRequest(BaseModel):
     consulta: str
 
@@ -59,7 +211,14 @@ def get_db():
     finally:
         db.close()
 
-def get_user_from_token(request: Request, db: Session = Depends(get_db)):
+@metrics.cronometrado("auth")
+def get_user_from_token(request: Request):
+    """
+    Resolve o usuário do token JWT
+
+    O retrato do usuário e de suas configurações fica em cache por alguns
+    segundos (AUTH_CACHE_TTL), então o caminho comum não consulta o SQLite.
+    """
     token = request.headers.get("Authorization")
     if not token or not token.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Token inválido ou ausente")
@@ -71,11 +230,23 @@ def get_user_from_token(request: Request, db: Session = Depends(get_db)):
         if not username:
             raise HTTPException(status_code=401, detail="Token inválido")
         
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="Usuário não encontrado")
+        usuario = cache_usuarios.obter(username)
+        if usuario:
+            return usuario
+        
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.username == username).first()
+            if not user:
+                raise HTTPException(status_code=404, detail="Usuário não encontrado")
             
-        return user
+            user_settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
+            usuario = UsuarioAutenticado.do_modelo(user, user_settings)
+        finally:
+            db.close()
+        
+        cache_usuarios.guardar(usuario)
+        return usuario
     except JWTError:
         raise HTTPException(status_code=401, detail="Token expirado ou inválido")
 
@@ -94,10 +265,21 @@ def verificar_token_admin(request: Request):
         raise HTTPException(status_code=401, detail="Token expirado ou inválido")
 
 @app.post("/login")
-def login(req: LoginRequest, db: Session = Depends(get_db)):
+async def login(req: LoginRequest, request: Request, db: Session = Depends(get_db)):
     print(f"Tentativa de login: {req.username}")
     
-    user = db.query(User).filter(User.username == req.username).first()
+    # Limites por (username, IP), por username e por IP antes de qualquer
+    # trabalho de bcrypt (src/senhas.py, LimitadorLogin)
+    ip = request.client.host if request.client else None
+    espera = limitador_login.reservar(req.username, ip)
+    if espera:
+        raise HTTPException(
+            status_code=429,
+            detail="Muitas tentativas de login. Tente novamente mais tarde",
+            headers={"Retry-After": str(espera)}
+        )
+    
+    user = await run_in_threadpool(lambda: db.query(User).filter(User.username == req.username).first())
     
     if not user:
         raise HTTPException(status_code=401, detail="Usuário não encontrado")
@@ -105,8 +287,19 @@ def login(req: LoginRequest, db: Session = Depends(get_db)):
     if not user.liberado:
         raise HTTPException(status_code=403, detail="Usuário ainda não está liberado para utilizar o sistema")
     
-    if not bcrypt.checkpw(req.password.encode(), user.hashed_password.encode()):
+    # bcrypt no pool de processos: não ocupa o threadpool das outras rotas
+    senha_ok, novo_hash = await senhas.verificar_senha(req.password, user.hashed_password)
+    if not senha_ok:
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
+    limitador_login.limpar(req.username, ip)
+    
+    # O custo configurado (BCRYPT_ROUNDS) mudou: salva o hash refeito
+    if novo_hash:
+        user.hashed_password = novo_hash
+        await run_in_threadpool(db.commit)
+
+    # Registro idempotente no armazenamento de gastos: as rotas de gastos não precisam mais verificar o usuário
+    await storage.register_user_async(user.id, user.username)
 
     token_data = {
         "sub": req.username,
@@ -117,7 +310,7 @@ def login(req: LoginRequest, db: Session = Depends(get_db)):
     return {"access_token": token}
 
 @app.get("/verify")
-def verify_token(request: Request):
+async def verify_token(request: Request):
     token = request.headers.get("Authorization")
     if not token or not token.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Token inválido")
@@ -128,16 +321,10 @@ def verify_token(request: Request):
     except JWTError:
         raise HTTPException(status_code=401, detail="Token expirado ou inválido")
 
-@app.post("/register")
-def register(req: RegisterRequest, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.username == req.username).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Usuário já existe")
-
-    hashed_pw = bcrypt.hashpw(req.password.encode('utf-8'), bcrypt.gensalt())
+def _criar_usuario(db: Session, username: str, hashed_password: str):
     new_user = User(
-        username=req.username,
-        hashed_password=hashed_pw.decode('utf-8'),
+        username=username,
+        hashed_password=hashed_password,
         liberado=False,
         is_admin=False
         )
@@ -145,6 +332,18 @@ def register(req: RegisterRequest, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    return new_user
+
+@app.post("/register")
+async def register(req: RegisterRequest, db: Session = Depends(get_db)):
+    existing_user = await run_in_threadpool(lambda: db.query(User).filter(User.username == req.username).first())
+    if existing_user:
+        raise HTTPException(status_code=400, detail="Usuário já existe")
+
+    hashed_pw = await senhas.gerar_hash(req.password)
+    new_user = await run_in_threadpool(_criar_usuario, db, req.username, hashed_pw)
+    
+    await storage.register_user_async(new_user.id, new_user.username)
     return {"message": "Usuário criado com sucesso"}
 
 @app.put("/liberar/{username}")
@@ -157,43 +356,294 @@ def liberar_usuario(username: str, request: Request, db: Session = Depends(get_d
 
     user.liberado = True
     db.commit()
+    cache_usuarios.invalidar(username)
     return {"message": f"Usuário {username} liberado com sucesso"}
 
+@app.get("/admin/llm-cache")
+def estatisticas_llm_cache(request: Request):
+    """
+    Retorna os contadores do cache de respostas do GPT (chamadas evitadas, taxa de acerto)
+    """
+    verificar_token_admin(request)
+    return llm_cache.estatisticas()
+
+@app.get("/admin/exportar")
+async def exportar_todos_usuarios(
+    request: Request,
+    formato: str = Query("csv", pattern="^(csv|parquet)$"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Exporta os gastos de todos os usuários em um zip, um arquivo por usuário
+
+    Os usuários são exportados em paralelo (EXPORTACAO_WORKERS threads).
+    """
+    verificar_token_admin(request)
+    
+    user_ids = [user_id for (user_id,) in await run_in_threadpool(lambda: db.query(User.id).order_by(User.id).all())]
+    diretorio = tempfile.mkdtemp(prefix="exportacao_")
+    try:
+        arquivos = await run_in_threadpool(
+            exportacao.exportar_usuarios, storage, user_ids, diretorio, formato, start_date, end_date
+        )
+        caminho_zip = await run_in_threadpool(
+            exportacao.empacotar, arquivos, os.path.join(diretorio, f"gastos_{formato}.zip")
+        )
+    except RuntimeError as e:
+        shutil.rmtree(diretorio, ignore_errors=True)
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        shutil.rmtree(diretorio, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar gastos: {str(e)}")
+    
+    return FileResponse(
+        caminho_zip,
+        media_type="application/zip",
+        filename=f"gastos_{formato}.zip",
+        background=BackgroundTask(shutil.rmtree, diretorio, ignore_errors=True)
+    )
+
+@app.get("/admin/consultas-mongo")
+async def consultas_mongo(
+    request: Request,
+    limite: int = Query(20, ge=1, le=500),
+    ordem: str = Query("tempo_total", pattern="^(tempo_total|tempo_max|lentas|examinados)$")
+):
+    """
+    Piores formas de consulta ao MongoDB desde o início do processo
+
+    `examinados` ordena pelos documentos examinados por documento retornado nas
+    amostras de explain (MONGO_EXPLAIN_AMOSTRA). Vazio com o backend SQLite.
+    """
+    verificar_token_admin(request)
+    return {
+        "limite_lenta_ms": monitor_consultas.limite_ms,
+        "amostra_explain": monitor_consultas.amostra,
+        "formas": monitor_consultas.relatorio(limite, ordem)
+    }
+
+@app.get("/admin/consumo-llm")
+async def consumo_llm(request: Request, limite: int = Query(20, ge=1, le=500)):
+    """Usuários com mais tokens da OpenAI desde o início do processo (chamadas, tokens de entrada e de saída)"""
+    verificar_token_admin(request)
+    return {"usuarios": metrics.consumo_llm.maiores(limite)}
+
 # Novas rotas para o assistente financeiro
 
+@app.get("/ready")
+async def prontidao(request: Request):
+    """
+    Prontidão do worker: lifespan concluído e banco de gastos respondendo
+
+    Responde 503 enquanto o worker sobe ou se o banco não responde em
+    PRONTIDAO_TIMEOUT_S. Inclui a duração da partida a frio por fase.
+    """
+    if not getattr(request.app.state, "pronto", False):
+        raise HTTPException(status_code=503, detail="Worker iniciando")
+    try:
+        await asyncio.wait_for(storage.verificar_async(), PRONTIDAO_TIMEOUT_S)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Banco de gastos indisponível: {str(e) or type(e).__name__}")
+
+    return {
+        "status": "pronto",
+        "backend": storage.nome,
+        "partida_s": {fase: round(duracao, 3) for fase, duracao in metrics.partida.items()},
+        "orcamento_partida_s": PARTIDA_ORCAMENTO_S
+    }
+
+@app.get("/metrics")
+def exportar_metricas(request: Request):
+    """Métricas no formato texto do Prometheus"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token inválido ou ausente")
+    return PlainTextResponse(metrics.registro.exportar(), media_type="text/plain; version=0.0.4")
+
+def _evento_sse(evento: str, dados) -> str:
+    """Formata um evento Server-Sent Events com dados em JSON"""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False, default=str)}\n\n"
+
+def _quer_sse(request: Request, formato: str) -> bool:
+    """Modo SSE opcional: ?formato=sse ou Accept: text/event-stream"""
+    return formato == "sse" or "text/event-stream" in request.headers.get("Accept", "")
+
+def _resposta_sse(eventos):
+    # X-Accel-Buffering desativa o buffer do nginx, para os eventos chegarem na hora
+    return StreamingResponse(
+        eventos,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/processar-gasto")
-def processar_gasto(req: ExpenseRequest, user: User = Depends(get_user_from_token)):
+async def processar_gasto(
+    req: ExpenseRequest,
+    request: Request,
+    formato: str = Query("json", pattern="^(json|sse)$"),
+    user: UsuarioAutenticado = Depends(get_user_from_token)
+):
     """
     Processa um texto informado pelo usuário para identificar um gasto
     Exemplo: "gastei 50 reais com mercado hoje"
+
+    Com `formato=sse` (ou Accept: text/event-stream) a resposta é um fluxo de
+    eventos: "interpretando", "rascunho" (gasto interpretado, ainda não salvo),
+    "salvo" e "concluido" (mesmo corpo da resposta JSON), ou "erro".
     """
+    if _quer_sse(request, formato):
+        return _resposta_sse(_processar_gasto_sse(req.texto, user.id))
+
     try:
         # Processar o texto e extrair informações estruturadas
-        gasto = processar_texto(req.texto, user.id)
+        gasto = await processar_texto_async(req.texto, user.id)
         
         # Se houve erro no processamento, retornar
         if "erro" in gasto:
             return {"status": "erro", "mensagem": gasto["erro"]}
         
-        # Salvar no MongoDB - função save_expense garantirá consistência dos IDs
-        save_expense(gasto)
+        # "local" ou "llm": informado na resposta, mas não gravado no gasto
+        origem = gasto.pop("origem", "llm")
         
-        return {"status": "sucesso", "gasto": gasto}
+        # Salvar o gasto - o armazenamento garante a consistência dos IDs
+        gasto = await storage.save_async(gasto)
+        _gastos_alterados(user.id, salvos=[gasto])
+        
+        return {"status": "sucesso", "gasto": gasto, "origem": origem}
+    except GastoInvalido as e:
+        # Valor ou data que o GPT não conseguiu extrair: nada foi gravado
+        return {"status": "erro", "mensagem": str(e)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar gasto: {str(e)}")
 
+async def _processar_gasto_sse(texto: str, user_id: int):
+    """Eventos do modo SSE de /processar-gasto"""
+    try:
+        yield _evento_sse("interpretando", {"texto": texto})
+        gasto = await processar_texto_async(texto, user_id)
+        if "erro" in gasto:
+            yield _evento_sse("erro", {"status": "erro", "mensagem": gasto["erro"]})
+            return
+        
+        origem = gasto.pop("origem", "llm")
+        yield _evento_sse("rascunho", {"gasto": gasto, "origem": origem})
+        
+        gasto = await storage.save_async(gasto)
+        _gastos_alterados(user_id, salvos=[gasto])
+        yield _evento_sse("salvo", {"gasto": gasto})
+        yield _evento_sse("concluido", {"status": "sucesso", "gasto": gasto, "origem": origem})
+    except Exception as e:
+        yield _evento_sse("erro", {"status": "erro", "mensagem": f"Erro ao processar gasto: {str(e)}"})
+
+@app.post("/processar-gastos-lote")
+async def processar_gastos_lote(req: BatchExpenseRequest, user: UsuarioAutenticado = Depends(get_user_from_token)):
+    """
+    Processa vários textos de gasto de uma vez (ex.: anotações de uma semana)
+
+    Os textos são interpretados em paralelo (até LOTE_CONCORRENCIA por vez) e os
+    gastos válidos são gravados com um único insert_many. Cada item da resposta
+    informa sucesso ou erro individualmente.
+    """
+    try:
+        semaforo = asyncio.Semaphore(LOTE_CONCORRENCIA)
+        
+        async def interpretar(texto):
+            async with semaforo:
+                return await processar_texto_async(texto, user.id)
+        
+        interpretados = await asyncio.gather(*(interpretar(texto) for texto in req.textos))
+        
+        resultados = [None] * len(req.textos)
+        validos = []  # (índice original, gasto, origem)
+        for indice, gasto in enumerate(interpretados):
+            if "erro" in gasto:
+                resultados[indice] = {"indice": indice, "status": "erro", "mensagem": gasto["erro"]}
+            else:
+                origem = gasto.pop("origem", "llm")
+                validos.append((indice, gasto, origem))
+        
+        salvos, erros = await storage.save_many_async([gasto for _, gasto, _ in validos])
+        if salvos:
+            _gastos_alterados(user.id, salvos=list(salvos.values()))
+        
+        for posicao, (indice, _, origem) in enumerate(validos):
+            if posicao in erros:
+                resultados[indice] = {"indice": indice, "status": "erro", "mensagem": erros[posicao]}
+            else:
+                resultados[indice] = {"indice": indice, "status": "sucesso", "gasto": salvos[posicao], "origem": origem}
+        
+        return {
+            "status": "sucesso",
+            "total": len(req.textos),
+            "salvos": len(salvos),
+            "resultados": resultados
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao processar lote de gastos: {str(e)}")
+
+@app.post("/importar-extrato")
+async def importar_extrato_rota(
+    request: Request,
+    formato: str = Query(..., pattern="^(csv|ofx)$"),
+    despesas: str = Query("negativas", pattern="^(negativas|positivas)$"),
+    user: UsuarioAutenticado = Depends(get_user_from_token)
+):
+    """
+    Importa um extrato bancário enviado como corpo da requisição (CSV ou OFX)
+
+    O corpo é copiado para um arquivo temporário (em disco acima de 1 MB) e lido
+    em fluxo; os gastos são categorizados localmente e gravados em lotes.
+    Transações já importadas antes são ignoradas. `despesas=positivas` é para
+    CSVs de fatura de cartão, em que as compras têm valor positivo.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as arquivo:
+        tamanho = 0
+        async for pedaco in request.stream():
+            tamanho += len(pedaco)
+            if tamanho > IMPORTACAO_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Arquivo de extrato muito grande")
+            arquivo.write(pedaco)
+        arquivo.seek(0)
+        
+        try:
+            with metrics.cronometrar(stage="importacao"):
+                relatorio = await run_in_threadpool(
+                    importar_extrato, arquivo, user.id, storage, formato, despesas,
+                    lambda salvos: _gastos_alterados(user.id, salvos=salvos)
+                )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao importar extrato: {str(e)}")
+    
+    return {"status": "sucesso", **relatorio}
+
 @app.post("/consultar-gastos")
-def consultar_gastos(req: QueryRequest, user: User = Depends(get_user_from_token)):
+async def consultar_gastos(
+    req: QueryRequest,
+    request: Request,
+    formato: str = Query("json", pattern="^(json|sse)$"),
+    user: UsuarioAutenticado = Depends(get_user_from_token)
+):
     """
     Processa uma consulta do usuário sobre seus gastos
     Exemplo: "quais foram meus gastos do mês?"
+
+    Com `formato=sse` (ou Accept: text/event-stream) a resposta é um fluxo de
+    eventos: "interpretando", "periodo" (assim que as datas são resolvidas),
+    vários "gastos" com até SSE_LOTE_GASTOS itens cada e, por fim, "resumo"
+    (período, total e totais por categoria), ou "erro".
     """
+    if _quer_sse(request, formato):
+        return _resposta_sse(_consultar_gastos_sse(req.consulta, user.id))
+
     try:
         # Processa a consulta para identificar o período e tipo de gasto
-        parametros = processar_consulta(req.consulta, user.id)
+        parametros = await processar_consulta_async(req.consulta, user.id)
         
         # Recupera os gastos do banco de dados
-        gastos = get_user_expenses(
+        gastos = await storage.find_range_async(
             user_id=parametros["user_id"],
             start_date=parametros.get("start_date"),
             end_date=parametros.get("end_date"),
@@ -211,25 +661,9 @@ def consultar_gastos(req: QueryRequest, user: User = Depends(get_user_from_token
                 por_categoria[categoria] = 0
             por_categoria[categoria] += gasto["valor"]
         
-        # Formata o período para mensagem
-        periodo = "do mês atual"
-        if "start_date" in parametros and "end_date" in parametros:
-            inicio = datetime.strptime(parametros["start_date"], "%Y-%m-%d")
-            fim = datetime.strptime(parametros["end_date"], "%Y-%m-%d")
-            
-            if inicio.month == fim.month and inicio.year == fim.year:
-                if inicio.day == 1 and fim.day == monthrange(fim.year, fim.month)[1]:
-                    periodo = f"do mês de {inicio.strftime('%B de %Y')}"
-                else:
-                    periodo = f"de {inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')}"
-            elif inicio.replace(month=1, day=1) == inicio and fim.replace(month=12, day=31) == fim:
-                periodo = f"do ano {inicio.year}"
-            else:
-                periodo = f"de {inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')}"
-        
         resposta = {
             "status": "sucesso",
-            "periodo": periodo,
+            "periodo": _descrever_periodo(parametros),
             "total": total,
             "por_categoria": por_categoria,
             "gastos": gastos
@@ -239,23 +673,222 @@ def consultar_gastos(req: QueryRequest, user: User = Depends(get_user_from_token
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao consultar gastos: {str(e)}")
 
+async def _consultar_gastos_sse(consulta: str, user_id: int):
+    """Eventos do modo SSE de /consultar-gastos: os gastos saem em lotes, sem esperar o total"""
+    try:
+        yield _evento_sse("interpretando", {"consulta": consulta})
+        parametros = await processar_consulta_async(consulta, user_id)
+        periodo = _descrever_periodo(parametros)
+        yield _evento_sse("periodo", {
+            "periodo": periodo,
+            "start_date": parametros.get("start_date"),
+            "end_date": parametros.get("end_date"),
+            "tipo": parametros.get("tipo")
+        })
+        
+        total = 0
+        quantidade = 0
+        por_categoria = {}
+        async for lote in storage.iter_range_async(
+            user_id=parametros["user_id"],
+            start_date=parametros.get("start_date"),
+            end_date=parametros.get("end_date"),
+            tipo=parametros.get("tipo"),
+            batch_size=SSE_LOTE_GASTOS
+        ):
+            for gasto in lote:
+                total += gasto["valor"]
+                por_categoria[gasto["tipo"]] = por_categoria.get(gasto["tipo"], 0) + gasto["valor"]
+            quantidade += len(lote)
+            yield _evento_sse("gastos", lote)
+        
+        yield _evento_sse("resumo", {
+            "status": "sucesso",
+            "periodo": periodo,
+            "total": total,
+            "por_categoria": por_categoria,
+            "quantidade": quantidade
+        })
+    except Exception as e:
+        yield _evento_sse("erro", {"status": "erro", "mensagem": f"Erro ao consultar gastos: {str(e)}"})
+
+def _descrever_periodo(parametros: dict) -> str:
+    """Formata o período da consulta para mensagem"""
+    periodo = "do mês atual"
+    if "start_date" in parametros and "end_date" in parametros:
+        inicio = datetime.strptime(parametros["start_date"], "%Y-%m-%d")
+        fim = datetime.strptime(parametros["end_date"], "%Y-%m-%d")
+        
+        if inicio.month == fim.month and inicio.year == fim.year:
+            if inicio.day == 1 and fim.day == monthrange(fim.year, fim.month)[1]:
+                periodo = f"do mês de {inicio.strftime('%B de %Y')}"
+            else:
+                periodo = f"de {inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')}"
+        elif inicio.replace(month=1, day=1) == inicio and fim.replace(month=12, day=31) == fim:
+            periodo = f"do ano {inicio.year}"
+        else:
+            periodo = f"de {inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')}"
+    return periodo
+
 @app.get("/gastos")
-def listar_gastos(
-    user: User = Depends(get_user_from_token),
+async def listar_gastos(
+    request: Request,
+    user: UsuarioAutenticado = Depends(get_user_from_token),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    tipo: Optional[str] = None
+    tipo: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    fields: Optional[str] = None,
+    formato: str = Query("json", pattern="^(json|ndjson)$")
 ):
     """
     Lista gastos do usuário com filtros opcionais
+
+    - `limit`/`cursor`: paginação por chave (data, _id); a resposta traz `proximo_cursor`
+    - `fields`: lista de campos separados por vírgula (ex.: "valor,tipo"); sem paginação e
+      só com data, tipo e valor, os gastos vêm sem `_id` (com `tipo`, a consulta é coberta pelo índice)
+    - `formato=ndjson`: transmite um gasto por linha à medida que são lidos do banco
+    - `json` responde com ETag e 304 quando o If-None-Match confere
     """
+    campos = [campo.strip() for campo in fields.split(",") if campo.strip()] if fields else None
+    
     try:
-        gastos = get_user_expenses(user.id, start_date, end_date, tipo)
-        return {"status": "sucesso", "gastos": gastos}
+        if formato == "ndjson":
+            lotes = storage.iter_range_async(user.id, start_date, end_date, tipo, fields=campos)
+            # Lê o primeiro lote antes de responder para que erros virem HTTP e não um stream quebrado
+            try:
+                primeiro_lote = await lotes.__anext__()
+            except StopAsyncIteration:
+                primeiro_lote = []
+            
+            async def gerar_linhas():
+                yield "".join(json.dumps(gasto, ensure_ascii=False) + "\n" for gasto in primeiro_lote)
+                async for lote in lotes:
+                    yield "".join(json.dumps(gasto, ensure_ascii=False) + "\n" for gasto in lote)
+            
+            return StreamingResponse(gerar_linhas(), media_type="application/x-ndjson")
+        
+        async def gerar():
+            if limit is not None or cursor:
+                pagina = await storage.find_page_async(
+                    user.id, start_date, end_date, tipo,
+                    cursor=cursor, limit=limit or 100, fields=campos
+                )
+                return {"status": "sucesso", **pagina}
+            
+            gastos = await storage.find_range_async(user.id, start_date, end_date, tipo, fields=campos)
+            return {"status": "sucesso", "gastos": gastos}
+        
+        return await _resposta_condicional(
+            request, user.id, "gastos", (start_date, end_date, tipo, cursor, limit, fields), gerar
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar gastos: {str(e)}")
     
     
+@app.delete("/gastos/{gasto_id}")
+async def excluir_gasto(gasto_id: str, user: UsuarioAutenticado = Depends(get_user_from_token)):
+    """
+    Exclui um gasto do usuário
+    """
+    try:
+        gasto = await storage.delete_async(user.id, gasto_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao excluir gasto: {str(e)}")
+    
+    if not gasto:
+        raise HTTPException(status_code=404, detail="Gasto não encontrado")
+    _gastos_alterados(user.id, removidos=[gasto])
+    return {"status": "sucesso", "gasto": gasto}
+
+@app.get("/exportar")
+async def exportar_gastos(
+    user: UsuarioAutenticado = Depends(get_user_from_token),
+    formato: str = Query("csv", pattern="^(csv|parquet)$"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    tipo: Optional[str] = None
+):
+    """
+    Exporta os gastos do usuário (todo o histórico ou um período)
+
+    O CSV é transmitido lote a lote, à medida que o banco entrega os gastos. O
+    Parquet é escrito em um arquivo temporário, um row group por lote, e enviado
+    ao final (o rodapé do Parquet só existe depois do último lote).
+    """
+    if formato == "csv":
+        async def gerar_csv():
+            yield exportacao.csv_cabecalho()
+            async for lote in exportacao.lotes_gastos_async(storage, user.id, start_date, end_date, tipo):
+                yield exportacao.csv_lote(lote)
+        
+        return StreamingResponse(
+            gerar_csv(),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="gastos.csv"'}
+        )
+    
+    descritor, caminho = tempfile.mkstemp(suffix=".parquet")
+    os.close(descritor)
+    try:
+        await run_in_threadpool(
+            exportacao.exportar_arquivo, storage, user.id, caminho, "parquet", start_date, end_date, tipo
+        )
+    except RuntimeError as e:
+        os.remove(caminho)
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        os.remove(caminho)
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar gastos: {str(e)}")
+    
+    return FileResponse(
+        caminho,
+        media_type="application/vnd.apache.parquet",
+        filename="gastos.parquet",
+        background=BackgroundTask(os.remove, caminho)
+    )
+
+@app.get("/analises/mensal")
+async def analise_mensal(
+    meses: Optional[int] = Query(None, ge=1, le=600),
+    user: UsuarioAutenticado = Depends(get_user_from_token)
+):
+    """
+    Total de cada mês do histórico com médias móveis de 3, 6 e 12 meses e
+    variação em relação ao mês anterior (`meses` limita quantos meses retornam)
+    """
+    try:
+        serie = await run_in_threadpool(lambda: serie_mensal(historicos.obter(storage, user.id), meses))
+        return {"status": "sucesso", "meses": serie}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao analisar histórico: {str(e)}")
+
+@app.get("/analises/categorias")
+async def analise_categorias(user: UsuarioAutenticado = Depends(get_user_from_token)):
+    """
+    Por categoria: total, percentis do valor dos gastos (p50/p75/p90/p95) e
+    variação do último mês em relação ao anterior
+    """
+    try:
+        categorias = await run_in_threadpool(lambda: estatisticas_categorias(historicos.obter(storage, user.id)))
+        return {"status": "sucesso", "categorias": categorias}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao analisar categorias: {str(e)}")
+
+@app.get("/analises/sazonalidade")
+async def analise_sazonalidade(user: UsuarioAutenticado = Depends(get_user_from_token)):
+    """
+    Índices sazonais por mês do ano e por dia da semana (1.0 = gasto típico)
+    """
+    try:
+        resultado = await run_in_threadpool(lambda: sazonalidade(historicos.obter(storage, user.id)))
+        return {"status": "sucesso", **resultado}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao analisar sazonalidade: {str(e)}")
+    
 #### codigo de testes
 
 # Classe para inserir dados de teste
@@ -282,8 +915,9 @@ def add_test_expense(expense: TestExpenseRequest, request: Request = None):
             "descricao": expense.descricao
         }
         
-        # Salvar no MongoDB - a função save_expense já deve converter o ObjectId para string
-        result = save_expense(gasto)
+        # Salvar o gasto - o armazenamento já converte o ID para string
+        result = storage.save(gasto)
+        _gastos_alterados(expense.user_id, salvos=[result])
         
         # Como estamos usando uma função que já faz a conversão, podemos retornar diretamente
         return {
@@ -291,6 +925,8 @@ def add_test_expense(expense: TestExpenseRequest, request: Request = None):
             "gasto": result,
             "message": "Gasto de teste adicionado com sucesso"
         }
+    except GastoInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         # Registrar o erro para debugging
         print(f"Erro ao adicionar gasto de teste: {str(e)}")
@@ -299,14 +935,68 @@ def add_test_expense(expense: TestExpenseRequest, request: Request = None):
 #####
 
 
+def obter_ou_criar_configuracoes(db: Session, user_id: int):
+    """Obtém as configurações do usuário, criando com os valores padrão se não existirem"""
+    user_settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+    if not user_settings:
+        user_settings = UserSettings(user_id=user_id)
+        db.add(user_settings)
+        db.commit()
+        db.refresh(user_settings)
+    return user_settings
+
+async def _resposta_condicional(request: Request, user_id: int, rota: str, partes: tuple, gerar):
+    """
+    Resposta JSON com ETag derivado da versão dos dados do usuário
+
+    Se o If-None-Match confere, responde 304 sem chamar `gerar` (no máximo a
+    leitura da versão persistida). Senão reaproveita o corpo já serializado para
+    a mesma versão ou, na falta dele, chama `gerar()` e guarda o resultado. Sem
+    a versão (banco indisponível), responde sem ETag.
+    """
+    try:
+        versao = await versoes.atual_async(user_id)
+    except Exception as e:
+        print(f"Versão dos dados indisponível, resposta sem ETag: {str(e)}")
+        return await gerar()
+    etag = gerar_etag(versoes.epoca, user_id, versao, rota, *partes)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_confere(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    corpo = respostas.obter(etag)
+    if corpo is None:
+        dados = await gerar()
+        with metrics.cronometrar(stage=f"{rota}_serializacao"):
+            corpo = json.dumps(jsonable_encoder(dados), ensure_ascii=False).encode("utf-8")
+        respostas.guardar(etag, corpo)
+    return Response(content=corpo, media_type="application/json", headers=headers)
+
 @app.get("/dashboard")
-def get_dashboard(user: User = Depends(get_user_from_token)):
+async def get_dashboard(
+    request: Request,
+    user: UsuarioAutenticado = Depends(get_user_from_token),
+    db: Session = Depends(get_db)
+):
     """
     Retorna dados para o dashboard personalizado do usuário
+
+    Responde 304 quando o If-None-Match confere com a versão atual dos dados
+    (o ETag também muda a cada dia, por causa da projeção e do mês corrente).
+    A meta vem do usuário resolvido com o token e entra no ETag: uma meta
+    alterada em outro worker gera outro ETag assim que o cache de autenticação
+    do usuário expira, em vez de reaproveitar um corpo com a meta antiga.
     """
+    hoje = datetime.now()
+    return await _resposta_condicional(
+        request, user.id, "dashboard", (hoje.strftime("%Y-%m-%d"), user.meta_mensal, user.meta_configurada),
+        lambda: _montar_dashboard(user, db, hoje)
+    )
+
+async def _montar_dashboard(user: UsuarioAutenticado, db: Session, hoje: datetime):
+    """Calcula o conteúdo do dashboard"""
     try:
-        # Obter data atual e primeiro dia do mês
-        hoje = datetime.now()
+        # Primeiro dia do mês
         primeiro_dia_mes = hoje.replace(day=1).strftime("%Y-%m-%d")
         ultimo_dia_mes = hoje.replace(day=calendar.monthrange(hoje.year, hoje.month)[1]).strftime("%Y-%m-%d")
         
@@ -314,48 +1004,35 @@ def get_dashboard(user: User = Depends(get_user_from_token)):
         mes_anterior_inicio = (hoje.replace(day=1) - timedelta(days=1)).replace(day=1).strftime("%Y-%m-%d")
         mes_anterior_fim = (hoje.replace(day=1) - timedelta(days=1)).strftime("%Y-%m-%d")
         
-        # Obter configurações do usuário, criando se não existir
-        user_settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
-        if not user_settings:
-            user_settings = UserSettings(user_id=user.id)
-            db.add(user_settings)
-            db.commit()
-            db.refresh(user_settings)
-        
-        # Meta mensal (configuração do usuário)
-        meta_mensal = user_settings.meta_mensal
-        
-        # Buscar gastos do mês atual
-        gastos_mes_atual = get_user_expenses(
-            user_id=user.id,
-            start_date=primeiro_dia_mes,
-            end_date=ultimo_dia_mes
-        )
+        # Meta mensal (configuração do usuário, já resolvida junto com o token)
+        meta_mensal = user.meta_mensal
+        if not user.meta_configurada:
+            # Cria as configurações padrão (SQLite síncrono fora do event loop)
+            with metrics.cronometrar(stage="dashboard_configuracoes"):
+                user_settings = await run_in_threadpool(obter_ou_criar_configuracoes, db, user.id)
+            meta_mensal = user_settings.meta_mensal
+            cache_usuarios.invalidar(user.username)
+            versoes.incrementar(user.id)
         
-        # Buscar gastos do mês anterior
-        gastos_mes_anterior = get_user_expenses(
-            user_id=user.id,
-            start_date=mes_anterior_inicio,
-            end_date=mes_anterior_fim
-        )
+        # Totais, categorias e últimas transações dos dois meses em uma única agregação
+        with metrics.cronometrar(stage="dashboard_resumo"):
+            resumo = await storage.dashboard_summary_async(
+                user_id=user.id,
+                inicio_atual=primeiro_dia_mes,
+                fim_atual=ultimo_dia_mes,
+                inicio_anterior=mes_anterior_inicio,
+                fim_anterior=mes_anterior_fim
+            )
         
-        # Calcular totais
-        total_mes_atual = sum(gasto["valor"] for gasto in gastos_mes_atual)
-        total_mes_anterior = sum(gasto["valor"] for gasto in gastos_mes_anterior) if gastos_mes_anterior else 0
+        total_mes_atual = resumo["total_atual"]
+        total_mes_anterior = resumo["total_anterior"]
+        gastos_por_categoria = resumo["por_categoria_atual"]
         
         # Calcular comparação percentual
         comparacao = 0
         if total_mes_anterior > 0:
             comparacao = ((total_mes_atual - total_mes_anterior) / total_mes_anterior) * 100
         
-        # Agrupar por categoria
-        gastos_por_categoria = {}
-        for gasto in gastos_mes_atual:
-            categoria = gasto["tipo"]
-            if categoria not in gastos_por_categoria:
-                gastos_por_categoria[categoria] = 0
-            gastos_por_categoria[categoria] += gasto["valor"]
-        
         # Encontrar categoria principal
         categoria_principal = {"nome": "nenhuma", "valor": 0, "porcentagem": 0}
         if gastos_por_categoria:
@@ -375,29 +1052,40 @@ def get_dashboard(user: User = Depends(get_user_from_token)):
             for cat, val in gastos_por_categoria.items()
         ]
         
-        # Calcular projeção para o final do mês
-        dias_passados = hoje.day
-        dias_no_mes = calendar.monthrange(hoje.year, hoje.month)[1]
-        projecao_mes = (total_mes_atual / dias_passados) * dias_no_mes if dias_passados > 0 else 0
+        # Projeção para o final do mês: recorrentes pendentes + gasto variável esperado (histórico)
+        with metrics.cronometrar(stage="dashboard_projecao"):
+            projecao = await run_in_threadpool(
+                lambda: projecoes.obter(storage, user.id, hoje.date()).projetar(hoje.date(), total_mes_atual)
+            )
+        projecao_mes = projecao["valor"]
         
         
         # Gerar dicas personalizadas
-        dicas = gerar_dicas_personalizadas(
-            user.id, 
-            gastos_mes_atual, 
-            gastos_mes_anterior,
-            categoria_principal,
-            projecao_mes,
-            meta_mensal
-        )
+        with metrics.cronometrar(stage="dashboard_dicas"):
+            dicas = gerar_dicas_personalizadas(
+                user.id, 
+                gastos_por_categoria, 
+                resumo["por_categoria_anterior"],
+                categoria_principal,
+                projecao_mes,
+                meta_mensal
+            )
         
         return {
             "gastosMes": total_mes_atual,
             "comparacaoMesAnterior": round(comparacao, 1),
             "categoriaPrincipal": categoria_principal,
             "gastosPorCategoria": grafico_categorias,
-            "ultimasTransacoes": sorted(gastos_mes_atual, key=lambda x: x["data"], reverse=True)[:5],
+            "ultimasTransacoes": resumo["ultimas_transacoes"],
             "projecaoMes": round(projecao_mes, 2),
+            "projecaoFaixa": {
+                "minimo": projecao["minimo"],
+                "maximo": projecao["maximo"],
+                "confianca": projecao["confianca"],
+                "recorrentePendente": projecao["recorrente_pendente"],
+                "variavelRestante": projecao["variavel_restante"],
+                "metodo": projecao["metodo"]
+            },
             "metaMensal": meta_mensal,
             "dicas": dicas
         }
@@ -406,33 +1094,26 @@ def get_dashboard(user: User = Depends(get_user_from_token)):
         raise HTTPException(status_code=500, detail=f"Erro ao gerar dashboard: {str(e)}")
 
 @app.get("/configuracoes")
-def get_configuracoes(user: User = Depends(get_user_from_token), db: Session = Depends(get_db)):
+async def get_configuracoes(request: Request, user: UsuarioAutenticado = Depends(get_user_from_token)):
     """
     Retorna as configurações do usuário
     """
-    try:
-        # Obter configurações do usuário
-        user_settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
-        
-        # Se não existir, retornar configurações padrão
-        if not user_settings:
-            return {
-                "meta_mensal": 2000.0,
-                "meta_configurada": False
-            }
-        
+    # As configurações são resolvidas junto com o token (padrão 2000.0 se não existirem)
+    async def gerar():
         return {
-            "meta_mensal": user_settings.meta_mensal,
-            "meta_configurada": True
+            "meta_mensal": user.meta_mensal,
+            "meta_configurada": user.meta_configurada
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao buscar configurações: {str(e)}")
+    
+    # A meta entra no ETag: o corpo vem do usuário em cache, não da versão dos dados
+    return await _resposta_condicional(
+        request, user.id, "configuracoes", (user.meta_mensal, user.meta_configurada), gerar
+    )
 
 @app.post("/configurar-meta")
 def configurar_meta(
     dados: dict, 
-    user: User = Depends(get_user_from_token), 
+    user: UsuarioAutenticado = Depends(get_user_from_token), 
     db: Session = Depends(get_db)
 ):
     """
@@ -461,6 +1142,9 @@ def configurar_meta(
             user_settings.updated_at = datetime.utcnow()
         
         db.commit()
+        cache_usuarios.invalidar(user.username)
+        # A meta fica no banco de usuários: a versão persistida avisa os outros workers
+        versoes.incrementar(user.id, persistir=True)
         
         return {
             "status": "sucesso",
@@ -1,11 +1,11 @@
-def gerar_dicas_personalizadas(user_id, gastos_atuais, gastos_anteriores, categoria_principal, projecao, meta):
+def gerar_dicas_personalizadas(user_id, categorias_atuais, categorias_anteriores, categoria_principal, projecao, meta):
     """
     Gera dicas personalizadas com base nos dados do usuário
     
     Args:
         user_id: ID do usuário
-        gastos_atuais: Lista de gastos do período atual
-        gastos_anteriores: Lista de gastos do período anterior
+        categorias_atuais: Dict {categoria: total} do período atual
+        categorias_anteriores: Dict {categoria: total} do período anterior
         categoria_principal: Dict com informações da categoria principal
         projecao: Valor projetado para o final do período
         meta: Meta mensal do usuário
@@ -35,8 +35,8 @@ def gerar_dicas_personalizadas(user_id, gastos_atuais, gastos_anteriores, catego
         })
     
     # Dica baseada na comparação com mês anterior
-    total_atual = sum(gasto["valor"] for gasto in gastos_atuais)
-    total_anterior = sum(gasto["valor"] for gasto in gastos_anteriores) if gastos_anteriores else 0
+    total_atual = sum(categorias_atuais.values())
+    total_anterior = sum(categorias_anteriores.values()) if categorias_anteriores else 0
     
     if total_anterior > 0 and total_atual > 0:
         variacao = ((total_atual - total_anterior) / total_anterior) * 100
@@ -53,19 +53,7 @@ def gerar_dicas_personalizadas(user_id, gastos_atuais, gastos_anteriores, catego
             })
     
     # Dica baseada em categorias que cresceram muito
-    if gastos_anteriores:
-        categorias_anteriores = {}
-        for gasto in gastos_anteriores:
-            if gasto["tipo"] not in categorias_anteriores:
-                categorias_anteriores[gasto["tipo"]] = 0
-            categorias_anteriores[gasto["tipo"]] += gasto["valor"]
-        
-        categorias_atuais = {}
-        for gasto in gastos_atuais:
-            if gasto["tipo"] not in categorias_atuais:
-                categorias_atuais[gasto["tipo"]] = 0
-            categorias_atuais[gasto["tipo"]] += gasto["valor"]
-        
+    if categorias_anteriores:
         # Encontrar categoria que mais cresceu
         maior_aumento = None
         maior_percentual = 0
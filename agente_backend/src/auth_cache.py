@@ -0,0 +1,99 @@
+# agente_backend/src/auth_cache.py
+"""
+Cache de curta duração da resolução token -> usuário.
+
+Guarda, por username (o "sub" do JWT), um retrato do usuário e das suas
+configurações, para que as rotas autenticadas não consultem o SQLite a cada
+requisição. Rotas que alteram esses dados devem chamar `invalidar`.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_TAMANHO = int(os.getenv("AUTH_CACHE_TAMANHO", "10000"))
+
+# Meta padrão quando o usuário ainda não tem configurações (mesmo valor do modelo)
+META_PADRAO = 2000.0
+
+
+class UsuarioAutenticado:
+    """Retrato somente leitura do usuário e de suas configurações"""
+
+    __slots__ = ("id", "username", "liberado", "is_admin", "meta_mensal", "meta_configurada")
+
+    def __init__(self, id, username, liberado, is_admin, meta_mensal=META_PADRAO, meta_configurada=False):
+        self.id = id
+        self.username = username
+        self.liberado = liberado
+        self.is_admin = is_admin
+        self.meta_mensal = meta_mensal
+        self.meta_configurada = meta_configurada
+
+    @classmethod
+    def do_modelo(cls, user, settings=None):
+        """Cria o retrato a partir dos modelos SQLAlchemy User e UserSettings"""
+        return cls(
+            id=user.id,
+            username=user.username,
+            liberado=user.liberado,
+            is_admin=user.is_admin,
+            meta_mensal=settings.meta_mensal if settings else META_PADRAO,
+            meta_configurada=settings is not None
+        )
+
+
+class CacheUsuarios:
+    """Dicionário LRU com expiração, protegido por lock"""
+
+    def __init__(self, ttl=AUTH_CACHE_TTL, tamanho_maximo=AUTH_CACHE_TAMANHO):
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, username):
+        with self._lock:
+            item = self._itens.get(username)
+            if item is None:
+                self.falhas += 1
+                return None
+            usuario, expira_em = item
+            if expira_em <= time.monotonic():
+                del self._itens[username]
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(username)
+            self.acertos += 1
+            return usuario
+
+    def guardar(self, usuario):
+        with self._lock:
+            self._itens[usuario.username] = (usuario, time.monotonic() + self.ttl)
+            self._itens.move_to_end(usuario.username)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, username):
+        with self._lock:
+            self._itens.pop(username, None)
+
+    def estatisticas(self):
+        """Contadores de acerto/falha; cada acerto é uma consulta ao SQLite evitada"""
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos / total, 4) if total else 0.0,
+                "itens_memoria": len(self._itens)
+            }
+
+
+cache_usuarios = CacheUsuarios()
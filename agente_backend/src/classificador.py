@@ -0,0 +1,291 @@
+# agente_backend/src/classificador.py
+"""
+Classificador de categoria aprendido com os gastos gravados (naive Bayes).
+
+Cada usuário costuma registrar os mesmos estabelecimentos ("padaria do zé",
+"posto shell"), e a categoria desses gastos já está no histórico. Um naive
+Bayes multinomial sobre as palavras da descrição, com um modelo por usuário e
+um modelo global, classifica a frase em microssegundos; o GPT só é chamado para
+a categoria quando a confiança fica abaixo de CLASSIFICADOR_CONFIANCA_MINIMA.
+
+- Modelo do usuário: carregado do armazenamento no primeiro uso (até
+  CLASSIFICADOR_HISTORICO_MAX gastos) e mantido em cache (LRU). Requisições
+  simultâneas de um usuário sem modelo compartilham um único carregamento.
+- Modelo global: soma dos históricos dos usuários já carregados neste processo
+  (mais as gravações seguintes deles). Não é uma base de todos os usuários: um
+  worker recém-iniciado tem o global vazio, e cada worker tem o seu, formado
+  pelos usuários que atendeu. Usuários que saem do LRU continuam no global.
+- Os dois são atualizados a cada gasto salvo ou excluído (`aprender`/`esquecer`).
+- O modelo do usuário é recarregado depois de CLASSIFICADOR_CACHE_TTL segundos,
+  para incluir gravações feitas fora deste processo (managers, outros workers).
+
+As probabilidades dos dois modelos são combinadas com peso proporcional ao
+número de gastos do usuário: com poucos gastos próprios, vale o global.
+
+Os modelos são só contagens; por isso a avaliação offline
+(src/manager_classificador.py) tira o usuário avaliado do global por subtração.
+"""
+import os
+import re
+import math
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from src.coalescencia import ChamadasCoalescidas
+from src.parser_local import CATEGORIAS, _normalizar
+
+load_dotenv()
+
+CLASSIFICADOR_CONFIANCA_MINIMA = float(os.getenv("CLASSIFICADOR_CONFIANCA_MINIMA", "0.9"))
+CLASSIFICADOR_HISTORICO_MAX = int(os.getenv("CLASSIFICADOR_HISTORICO_MAX", "5000"))
+CLASSIFICADOR_USUARIOS_MAX = int(os.getenv("CLASSIFICADOR_USUARIOS_MAX", "2000"))
+CLASSIFICADOR_CACHE_TTL = int(os.getenv("CLASSIFICADOR_CACHE_TTL", "600"))
+
+# Suavização de Laplace das palavras
+ALFA = 0.5
+# Gastos do usuário a partir dos quais o modelo dele pesa tanto quanto o global
+PESO_GLOBAL = 10
+# Ocorrências mínimas das palavras da frase na categoria escolhida (evita decidir por um único gasto)
+EVIDENCIA_MINIMA = 2
+
+# Palavras que não identificam o estabelecimento
+_IGNORADAS = {
+    "de", "da", "do", "das", "dos", "com", "no", "na", "nos", "nas", "em", "o", "a", "os", "as", "e",
+    "um", "uma", "para", "pra", "por", "pelo", "pela", "gastei", "paguei", "comprei", "gasto", "compra",
+    "reais", "real", "rs", "hoje", "ontem", "anteontem", "dia", "valor", "pix", "cartao", "debito", "credito"
+}
+_RE_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+def palavras(descricao):
+    """Palavras da descrição usadas pelo classificador (sem acentos, números e palavras genéricas)"""
+    return [
+        palavra for palavra in _RE_PALAVRA.findall(_normalizar(descricao or ""))
+        if len(palavra) > 1 and not palavra.isdigit() and palavra not in _IGNORADAS
+    ]
+
+
+class ModeloNB:
+    """Contagens de um naive Bayes multinomial: gastos e palavras por categoria"""
+
+    __slots__ = ("documentos", "palavras", "totais", "vocabulario")
+
+    def __init__(self):
+        self.documentos = {}
+        # categoria -> {palavra: ocorrências}
+        self.palavras = {}
+        self.totais = {}
+        # palavra -> ocorrências em todas as categorias
+        self.vocabulario = {}
+
+    @property
+    def n_documentos(self):
+        return sum(self.documentos.values())
+
+    def adicionar(self, tokens, categoria, sinal=1):
+        """Soma (sinal=1) ou retira (sinal=-1) um gasto das contagens"""
+        if categoria not in CATEGORIAS:
+            return
+        self.documentos[categoria] = max(0, self.documentos.get(categoria, 0) + sinal)
+        for palavra in tokens:
+            self._somar_palavra(categoria, palavra, sinal)
+
+    def somar(self, outro, sinal=1):
+        """Soma (ou subtrai) as contagens de outro modelo"""
+        for categoria, quantidade in outro.documentos.items():
+            self.documentos[categoria] = max(0, self.documentos.get(categoria, 0) + sinal * quantidade)
+        for categoria, contagens in outro.palavras.items():
+            for palavra, quantidade in contagens.items():
+                self._somar_palavra(categoria, palavra, sinal * quantidade)
+
+    def _somar_palavra(self, categoria, palavra, quantidade):
+        contagens = self.palavras.setdefault(categoria, {})
+        # Ao retirar, nunca abaixo de zero (gasto que não tinha entrado nas contagens)
+        quantidade = max(quantidade, -contagens.get(palavra, 0))
+        if not quantidade:
+            return
+        contagens[palavra] = contagens.get(palavra, 0) + quantidade
+        self.totais[categoria] = self.totais.get(categoria, 0) + quantidade
+        self.vocabulario[palavra] = self.vocabulario.get(palavra, 0) + quantidade
+        if not contagens[palavra]:
+            del contagens[palavra]
+        if not self.vocabulario[palavra]:
+            del self.vocabulario[palavra]
+
+    def copiar(self):
+        copia = ModeloNB()
+        copia.somar(self)
+        return copia
+
+
+def classificar(tokens, usuario, global_):
+    """
+    Categoria mais provável das palavras pelos dois modelos
+
+    Returns:
+        Tupla (categoria, probabilidade a posteriori) ou (None, 0.0) quando
+        nenhuma palavra foi vista ou a evidência é insuficiente
+    """
+    conhecidas = [palavra for palavra in tokens if palavra in usuario.vocabulario or palavra in global_.vocabulario]
+    if not conhecidas:
+        return None, 0.0
+
+    docs_usuario, docs_global = usuario.n_documentos, global_.n_documentos
+    peso = docs_usuario / (docs_usuario + PESO_GLOBAL)
+    vocabulario = len(global_.vocabulario) + len(usuario.vocabulario) + 1
+    n_categorias = len(CATEGORIAS)
+
+    pontos = {}
+    for categoria in CATEGORIAS:
+        priori = (
+            peso * (usuario.documentos.get(categoria, 0) + 1) / (docs_usuario + n_categorias)
+            + (1 - peso) * (global_.documentos.get(categoria, 0) + 1) / (docs_global + n_categorias)
+        )
+        log_p = math.log(priori)
+        contagens_u, contagens_g = usuario.palavras.get(categoria, {}), global_.palavras.get(categoria, {})
+        denominador_u = usuario.totais.get(categoria, 0) + ALFA * vocabulario
+        denominador_g = global_.totais.get(categoria, 0) + ALFA * vocabulario
+        for palavra in conhecidas:
+            log_p += math.log(
+                peso * (contagens_u.get(palavra, 0) + ALFA) / denominador_u
+                + (1 - peso) * (contagens_g.get(palavra, 0) + ALFA) / denominador_g
+            )
+        pontos[categoria] = log_p
+
+    melhor = max(pontos, key=pontos.get)
+    maximo = pontos[melhor]
+    probabilidade = 1 / sum(math.exp(valor - maximo) for valor in pontos.values())
+
+    evidencia = sum(
+        usuario.palavras.get(melhor, {}).get(palavra, 0) + global_.palavras.get(melhor, {}).get(palavra, 0)
+        for palavra in conhecidas
+    )
+    if evidencia < EVIDENCIA_MINIMA:
+        return None, 0.0
+    return melhor, probabilidade
+
+
+class ClassificadorUsuario:
+    """Modelo de um usuário junto com o global, pronto para classificar"""
+
+    def __init__(self, classificadores, modelo):
+        self._classificadores = classificadores
+        self.modelo = modelo
+
+    def classificar(self, descricao):
+        """Tupla (categoria ou None, confiança)"""
+        tokens = palavras(descricao)
+        if not tokens:
+            return None, 0.0
+        with self._classificadores._lock:
+            return classificar(tokens, self.modelo, self._classificadores.global_)
+
+
+class Classificadores:
+    """Modelos por usuário (LRU com expiração) e o modelo global, atualizados a cada gravação"""
+
+    def __init__(
+        self, tamanho_maximo=CLASSIFICADOR_USUARIOS_MAX, historico_max=CLASSIFICADOR_HISTORICO_MAX,
+        ttl=CLASSIFICADOR_CACHE_TTL
+    ):
+        self.tamanho_maximo = tamanho_maximo
+        self.historico_max = historico_max
+        self.ttl = ttl
+        self.global_ = ModeloNB()
+        # user_id -> (modelo, expiração)
+        self._modelos = OrderedDict()
+        # Usuários cujo histórico já foi somado ao global (não somar de novo ao recarregar)
+        self._no_global = set()
+        # Gravações durante um carregamento em andamento (só usuários sendo
+        # carregados): um modelo lido antes de uma gravação é descartado
+        self._alteracoes = {}
+        # Um carregamento do histórico por usuário em andamento
+        self._carregamentos = ChamadasCoalescidas()
+        self._lock = threading.Lock()
+
+    def em_cache(self, user_id):
+        """Classificador do usuário se o modelo está em memória e válido, senão None (sem acessar o banco)"""
+        with self._lock:
+            item = self._modelos.get(user_id)
+            if item is None or item[1] <= time.monotonic():
+                return None
+            self._modelos.move_to_end(user_id)
+            return ClassificadorUsuario(self, item[0])
+
+    def obter(self, storage, user_id):
+        """Classificador do usuário, carregando o histórico do armazenamento se preciso"""
+        classificador = self.em_cache(user_id)
+        if classificador is not None:
+            return classificador
+        return ClassificadorUsuario(self, self._carregamentos.executar(user_id, lambda: self._carregar(storage, user_id)))
+
+    def _carregar(self, storage, user_id):
+        with self._lock:
+            item = self._modelos.get(user_id)
+            if item is not None and item[1] > time.monotonic():
+                # Carregado por outra chamada entre em_cache e o início deste carregamento
+                return item[0]
+            anterior = item[0] if item is not None else None
+            # Um carregamento por usuário de cada vez (self._carregamentos)
+            self._alteracoes[user_id] = 0
+
+        modelo = ModeloNB()
+        try:
+            for gasto in self._historico(storage, user_id):
+                modelo.adicionar(palavras(gasto.get("descricao")), gasto.get("tipo"))
+        except BaseException:
+            with self._lock:
+                self._alteracoes.pop(user_id, None)
+            raise
+
+        with self._lock:
+            if self._alteracoes.pop(user_id, 0):
+                # Gravação durante o carregamento: o modelo não é guardado nem somado ao global
+                return modelo
+            if user_id not in self._no_global:
+                self._no_global.add(user_id)
+                self.global_.somar(modelo)
+            elif anterior is not None and self._modelos.get(user_id, (None,))[0] is anterior:
+                # Modelo expirado: o global troca as contagens antigas do usuário pelas novas
+                self.global_.somar(anterior, -1)
+                self.global_.somar(modelo)
+            self._modelos[user_id] = (modelo, time.monotonic() + self.ttl)
+            self._modelos.move_to_end(user_id)
+            while len(self._modelos) > self.tamanho_maximo:
+                self._modelos.popitem(last=False)
+        return modelo
+
+    def _historico(self, storage, user_id):
+        restantes = self.historico_max
+        for lote in storage.iter_range(user_id, fields=["tipo", "descricao"], batch_size=min(restantes, 1000)):
+            yield from lote[:restantes]
+            restantes -= len(lote)
+            if restantes <= 0:
+                return
+
+    def _aplicar(self, user_id, gastos, sinal):
+        with self._lock:
+            item = self._modelos.get(user_id)
+            modelo = item[0] if item is not None else None
+            if user_id in self._alteracoes:
+                self._alteracoes[user_id] += 1
+            for gasto in gastos:
+                tokens = palavras(gasto.get("descricao"))
+                if modelo is not None:
+                    modelo.adicionar(tokens, gasto.get("tipo"), sinal)
+                # Sem o histórico somado, o gasto entra no global quando o usuário for carregado
+                if user_id in self._no_global:
+                    self.global_.adicionar(tokens, gasto.get("tipo"), sinal)
+
+    def aprender(self, user_id, gastos):
+        """Atualiza os modelos com gastos recém-salvos"""
+        self._aplicar(user_id, gastos, 1)
+
+    def esquecer(self, user_id, gastos):
+        """Atualiza os modelos com gastos excluídos"""
+        self._aplicar(user_id, gastos, -1)
+
+
+classificadores = Classificadores()
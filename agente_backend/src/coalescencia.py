@@ -0,0 +1,114 @@
+# agente_backend/src/coalescencia.py
+"""
+Coalescência ("single-flight") das chamadas idênticas ao GPT em andamento.
+
+Quando o usuário envia a mesma frase duas vezes, ou o GPTInput.jsx repete a
+requisição depois de uma falha de rede aparente, as chamadas chegam juntas e
+nenhuma encontra o cache (a resposta ainda não voltou). Aqui, chamadas com a
+mesma chave (a chave do cache: tipo, data e texto normalizado) enquanto outra
+está em andamento esperam por ela em vez de chamar a OpenAI de novo, e todas
+recebem a mesma resposta (ou a mesma exceção).
+
+A chamada compartilhada roda em uma tarefa própria: se a requisição que a
+iniciou for cancelada (cliente desconectou), as demais continuam esperando.
+"""
+import asyncio
+import threading
+
+
+class _Chamada:
+    """Chamada síncrona em andamento"""
+
+    __slots__ = ("pronta", "resultado", "erro", "participantes")
+
+    def __init__(self):
+        self.pronta = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.participantes = 1
+
+
+class ChamadasCoalescidas:
+    """Uma chamada por chave em andamento; as concorrentes recebem o mesmo resultado"""
+
+    def __init__(self):
+        # (id do loop, chave) -> [tarefa, participantes]
+        self._tarefas = {}
+        # chave -> _Chamada
+        self._chamadas = {}
+        self._lock = threading.Lock()
+
+        self.executadas = 0
+        self.coalescidas = 0
+        self.maior_grupo = 0
+
+    async def executar_async(self, chave, funcao):
+        """
+        Executa `await funcao()` ou espera a chamada em andamento com a mesma chave
+
+        Args:
+            funcao: função sem argumentos que retorna uma corrotina
+        """
+        loop = asyncio.get_running_loop()
+        identificador = (id(loop), chave)
+        with self._lock:
+            andamento = self._tarefas.get(identificador)
+            if andamento is None:
+                tarefa = loop.create_task(funcao())
+                andamento = self._tarefas[identificador] = [tarefa, 1]
+                self.executadas += 1
+                tarefa.add_done_callback(lambda _: self._encerrar_async(identificador))
+            else:
+                andamento[1] += 1
+                self.coalescidas += 1
+                self.maior_grupo = max(self.maior_grupo, andamento[1])
+        return await asyncio.shield(andamento[0])
+
+    def _encerrar_async(self, identificador):
+        with self._lock:
+            self._tarefas.pop(identificador, None)
+
+    def executar(self, chave, funcao):
+        """Versão síncrona (entre threads) de executar_async"""
+        with self._lock:
+            chamada = self._chamadas.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = self._chamadas[chave] = _Chamada()
+                self.executadas += 1
+            else:
+                chamada.participantes += 1
+                self.coalescidas += 1
+                self.maior_grupo = max(self.maior_grupo, chamada.participantes)
+
+        if not lider:
+            chamada.pronta.wait()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.resultado
+
+        try:
+            chamada.resultado = funcao()
+            return chamada.resultado
+        except BaseException as e:
+            # Inclui KeyboardInterrupt/SystemExit: quem espera recebe a mesma exceção, nunca None
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._chamadas[chave]
+            chamada.pronta.set()
+
+    def estatisticas(self):
+        """Chamadas executadas, chamadas evitadas (coalescidas) e maior grupo que compartilhou uma chamada"""
+        with self._lock:
+            return {
+                "executadas": self.executadas,
+                "coalescidas": self.coalescidas,
+                "em_andamento": len(self._tarefas) + len(self._chamadas),
+                "maior_grupo": self.maior_grupo
+            }
+
+
+# Chamadas ao GPT de processar_texto e processar_consulta
+chamadas_llm = ChamadasCoalescidas()
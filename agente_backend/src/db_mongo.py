@@ -1,12 +1,20 @@
 # agente_backend/src/database.py
 import os
-from pymongo import MongoClient, ASCENDING, DESCENDING
+import json
+import base64
+import asyncio
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from bson.objectid import ObjectId
-from sqlalchemy.orm import Session
-from src.models import User
-from src.db import SessionLocal
 from datetime import datetime
+from collections import OrderedDict
+import threading
+from calendar import monthrange
+from src.metrics import monitor_mongo
+from src.perfil_mongo import monitor_consultas
+from src.storage import ERRO_DUPLICADO, GastoInvalido, normalizar_gasto
 
 load_dotenv()
 
@@ -14,87 +22,796 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "agente_financeiro")
 
-# Conectar ao MongoDB
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+# Pool de conexões e tempos limite (milissegundos) dos clientes pymongo e motor
+MONGO_MAX_POOL = int(os.getenv("MONGO_MAX_POOL", "50"))
+MONGO_MIN_POOL = int(os.getenv("MONGO_MIN_POOL", "0"))
+MONGO_MAX_OCIOSA_MS = int(os.getenv("MONGO_MAX_OCIOSA_MS", "60000"))
+# Espera por um servidor disponível: com o MongoDB fora do ar, as operações falham depois disso
+MONGO_SELECAO_MS = int(os.getenv("MONGO_SELECAO_MS", "5000"))
+MONGO_CONEXAO_MS = int(os.getenv("MONGO_CONEXAO_MS", "5000"))
+MONGO_SOCKET_MS = int(os.getenv("MONGO_SOCKET_MS", "30000"))
+# Espera por uma conexão livre no pool
+MONGO_ESPERA_POOL_MS = int(os.getenv("MONGO_ESPERA_POOL_MS", "5000"))
 
-# Coleções
-users_collection = db["users"]
-expenses_collection = db["expenses"]
+# Clientes e coleções, criados por conectar() (no lifespan da API ou no primeiro
+# uso pelo storage). Importar este módulo não abre conexões nem cria índices.
+client = None
+db = None
+async_client = None
+async_db = None
+users_collection = None
+expenses_collection = None
+# Totais mensais por categoria, mantidos incrementalmente em save_expense
+rollups_collection = None
+# Versão dos dados de cada usuário (src/versoes.py), incrementada a cada gravação
+versoes_collection = None
+# Migrações concluídas (src/manager_migracao.py), verificadas por /ready
+migracoes_collection = None
+async_users_collection = None
+async_expenses_collection = None
+async_rollups_collection = None
+async_versoes_collection = None
+async_migracoes_collection = None
+_conexao_lock = threading.Lock()
+
+def _opcoes_cliente():
+    # monitor_mongo registra a latência de cada comando em /metrics e
+    # monitor_consultas o perfil por forma de consulta, em /admin/consultas-mongo
+    return {
+        "maxPoolSize": MONGO_MAX_POOL,
+        "minPoolSize": MONGO_MIN_POOL,
+        "maxIdleTimeMS": MONGO_MAX_OCIOSA_MS,
+        "serverSelectionTimeoutMS": MONGO_SELECAO_MS,
+        "connectTimeoutMS": MONGO_CONEXAO_MS,
+        "socketTimeoutMS": MONGO_SOCKET_MS,
+        "waitQueueTimeoutMS": MONGO_ESPERA_POOL_MS,
+        "event_listeners": [monitor_mongo, monitor_consultas]
+    }
+
+def conectar():
+    """
+    Cria os clientes pymongo e motor e as coleções (idempotente)
+
+    Não espera pelo servidor: o driver conecta em segundo plano, e um MongoDB
+    fora do ar só aparece nas operações (após MONGO_SELECAO_MS) e em /ready.
+    Os índices são criados pela migração (src/manager_migracao.py).
+    """
+    global client, db, async_client, async_db
+    global users_collection, expenses_collection, rollups_collection, versoes_collection, migracoes_collection
+    global async_users_collection, async_expenses_collection, async_rollups_collection, async_versoes_collection
+    global async_migracoes_collection
+    with _conexao_lock:
+        if client is not None:
+            return
+        novo_client = MongoClient(MONGO_URI, **_opcoes_cliente())
+        db = novo_client[DB_NAME]
+        users_collection = db["users"]
+        expenses_collection = db["expenses"]
+        rollups_collection = db["monthly_rollups"]
+        versoes_collection = db["data_versions"]
+        migracoes_collection = db["migracoes"]
+
+        # Cliente assíncrono (motor) para as rotas async do FastAPI
+        async_client = AsyncIOMotorClient(MONGO_URI, **_opcoes_cliente())
+        async_db = async_client[DB_NAME]
+        async_users_collection = async_db["users"]
+        async_expenses_collection = async_db["expenses"]
+        async_rollups_collection = async_db["monthly_rollups"]
+        async_versoes_collection = async_db["data_versions"]
+        async_migracoes_collection = async_db["migracoes"]
+
+        # Os explains amostrados rodam no cliente síncrono, em uma thread própria
+        monitor_consultas.configurar_explain(novo_client)
+        # Atribuído por último: client preenchido indica conexão pronta para uso
+        client = novo_client
+
+def fechar():
+    """Fecha os clientes (no desligamento da API); um novo uso conecta de novo"""
+    global client, async_client
+    with _conexao_lock:
+        if client is None:
+            return
+        monitor_consultas.configurar_explain(None)
+        client.close()
+        async_client.close()
+        client = async_client = None
+
+async def ping_async():
+    """Comando ping no servidor, usado pela verificação de prontidão"""
+    await async_client.admin.command("ping")
+
+# Migração que preenche `dia`: sem ela, gastos antigos somem dos filtros por período
+MIGRACAO_DIA = "dia"
+_migracao_dia_concluida = False
+
+def marcar_migracao_dia():
+    """Registra que todos os gastos têm `dia` (chamada por src/manager_migracao.py)"""
+    migracoes_collection.update_one(
+        {"_id": MIGRACAO_DIA}, {"$set": {"concluida_em": datetime.utcnow()}}, upsert=True
+    )
+
+async def verificar_migracao_async():
+    """
+    Levanta RuntimeError enquanto a migração de `dia` não foi concluída
+
+    Os filtros, a ordenação e os cursores usam só `dia`; em vez de servir
+    listagens sem os gastos antigos, /ready responde 503 até a migração rodar.
+    Gastos novos sempre gravam `dia`, então a marcação, uma vez vista, fica em
+    memória e as verificações seguintes não consultam o banco.
+    """
+    global _migracao_dia_concluida
+    if _migracao_dia_concluida:
+        return
+    if await async_migracoes_collection.find_one({"_id": MIGRACAO_DIA}) is None:
+        raise RuntimeError("gastos sem a chave `dia`; execute python -m src.manager_migracao")
+    _migracao_dia_concluida = True
+
+# Campos que podem ser pedidos via projeção
+CAMPOS_GASTO = ("user_id", "valor", "tipo", "data", "descricao")
+# Campos presentes no índice (user_id, tipo, dia, valor): com filtro por tipo, projeções
+# só com eles são consultas cobertas (tests/test_storage.py, explain com MongoDB real)
+CAMPOS_INDICE = ("data", "tipo", "valor")
+
+# Usuários já registrados no MongoDB por este processo (LRU limitado),
+# para que leituras e gravações de gastos não consultem users_collection
+USUARIOS_CONHECIDOS_MAX = int(os.getenv("USUARIOS_CONHECIDOS_MAX", "10000"))
+_usuarios_conhecidos = OrderedDict()
+_usuarios_lock = threading.Lock()
+
+# Ordem usada na listagem e na paginação por cursor
+ORDEM_GASTOS = [("dia", DESCENDING), ("_id", DESCENDING)]
+
+# Índices anteriores à chave `dia`, removidos por src/manager_migracao.py
+INDICES_ANTIGOS = ("user_id_1_data_-1__id_-1", "user_id_1_tipo_1")
+
+def criar_indices():
+    """
+    Índices para pesquisa eficiente (create_index é idempotente)
+
+    Executada pela migração (src/manager_migracao.py), não na subida da API.
+
+    Os filtros por período usam `dia`, a data como inteiro AAAAMMDD (ver
+    chave_dia); `data` continua gravada no formato YYYY-MM-DD.
+    """
+    # (user_id, dia, _id) atende os filtros por período e a paginação por cursor
+    expenses_collection.create_index(
+        [("user_id", ASCENDING), ("dia", DESCENDING), ("_id", DESCENDING)], name="user_dia_id"
+    )
+    # (user_id, tipo, dia, valor) atende período + categoria (consultas do processar_consulta)
+    # e, com filtro por tipo, cobre projeções só com data, tipo e valor
+    expenses_collection.create_index(
+        [("user_id", ASCENDING), ("tipo", ASCENDING), ("dia", ASCENDING), ("valor", ASCENDING)],
+        name="user_tipo_dia_valor"
+    )
+    # Deduplicação de extratos importados; gastos digitados não têm hash_importacao
+    expenses_collection.create_index(
+        [("user_id", ASCENDING), ("hash_importacao", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"hash_importacao": {"$exists": True}}
+    )
+    rollups_collection.create_index([("user_id", ASCENDING), ("mes", ASCENDING), ("tipo", ASCENDING)], unique=True)
+    versoes_collection.create_index([("user_id", ASCENDING)], unique=True)
+
+def registrar_usuario_mongo(user_id, username=None):
+    """
+    Registra (de forma idempotente) o usuário do SQLite no MongoDB
+
+    Chamada no login e no cadastro. Usa upsert, então pode ser repetida sem
+    criar duplicatas, e marca o usuário como conhecido neste processo.
+    """
+    users_collection.update_one(*_operacao_registro(user_id, username), upsert=True)
+    _marcar_conhecido(user_id)
 
-# Índices para pesquisa eficiente
-expenses_collection.create_index([("user_id", ASCENDING), ("data", DESCENDING)])
-expenses_collection.create_index([("user_id", ASCENDING), ("tipo", ASCENDING)])
 
 def ensure_user_exists(user_id):
     """
     Garante que um usuário existe no MongoDB com o mesmo ID do SQLite
+
+    Usuários já vistos por este processo não geram nenhuma consulta ao MongoDB.
     """
-    # Verificar se o usuário já existe no MongoDB
-    mongo_user = users_collection.find_one({"sqlite_id": user_id})
+    if _usuario_conhecido(user_id):
+        return
     
-    if not mongo_user:
-        # Se não existir, cria um novo documento de usuário no MongoDB
-        # Obter informações do usuário do SQLite
-        db_session = SessionLocal()
-        try:
-            user_sqlite = db_session.query(User).filter(User.id == user_id).first()
-            if user_sqlite:
-                new_user = {
-                    "sqlite_id": user_id,
-                    "username": user_sqlite.username,
-                    "created_at": datetime.utcnow()
-                }
-                result = users_collection.insert_one(new_user)
-                return str(result.inserted_id)
-            else:
-                # Se não encontrar o usuário no SQLite, algo está errado
-                raise ValueError(f"Usuário com ID {user_id} não encontrado no SQLite")
-        finally:
-            db_session.close()
-    else:
-        # Retorna o ID do MongoDB para o usuário
-        return str(mongo_user["_id"])
-    
-def get_user_expenses(user_id, start_date=None, end_date=None, tipo=None):
+    registrar_usuario_mongo(user_id)
+
+
+def _operacao_registro(user_id, username=None):
+    """Filtro e update do upsert de registro do usuário"""
+    update = {"$setOnInsert": {"sqlite_id": user_id, "created_at": datetime.utcnow()}}
+    if username:
+        update["$set"] = {"username": username}
+    return {"sqlite_id": user_id}, update
+
+
+def _usuario_conhecido(user_id):
+    with _usuarios_lock:
+        if user_id in _usuarios_conhecidos:
+            _usuarios_conhecidos.move_to_end(user_id)
+            return True
+        return False
+
+
+def _marcar_conhecido(user_id):
+    with _usuarios_lock:
+        _usuarios_conhecidos[user_id] = True
+        _usuarios_conhecidos.move_to_end(user_id)
+        while len(_usuarios_conhecidos) > USUARIOS_CONHECIDOS_MAX:
+            _usuarios_conhecidos.popitem(last=False)
+
+def chave_dia(data):
+    """Chave inteira AAAAMMDD de uma data "YYYY-MM-DD" (ordem e comparação de inteiros)"""
+    return int(data[:10].replace("-", ""))
+
+
+def data_da_chave(dia):
+    """Data "YYYY-MM-DD" de uma chave AAAAMMDD"""
+    return f"{dia // 10000:04d}-{dia // 100 % 100:02d}-{dia % 100:02d}"
+
+
+def preparar_gasto(gasto):
+    """Acrescenta a chave `dia` ao gasto antes de gravar (gastos sem data válida ficam como estão)"""
+    try:
+        gasto["dia"] = chave_dia(gasto["data"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    return gasto
+
+
+def get_user_expenses(user_id, start_date=None, end_date=None, tipo=None, fields=None):
     """
     Recupera despesas do usuário com filtros opcionais de data e tipo
+
+    Com `fields` só entre data, tipo e valor, os gastos vêm sem `_id`. Com
+    filtro por tipo, a consulta é coberta pelo índice (user_id, tipo, dia,
+    valor); sem tipo, o planejador costuma usar (user_id, dia, _id) e lê os
+    documentos.
     """
     # Garantir que o usuário exista no MongoDB
     ensure_user_exists(user_id)
     
+    query = _montar_filtro(user_id, start_date, end_date, tipo)
+    
+    # Buscar documentos e converter para formato serializável
+    return [convert_mongo_doc(doc) for doc in expenses_collection.find(query, _montar_projecao(fields, cobrir=True))]
+
+
+def _montar_filtro(user_id, start_date=None, end_date=None, tipo=None):
+    """Monta o filtro do MongoDB para os gastos de um usuário"""
     query = {"user_id": user_id}
     
     if start_date and end_date:
-        query["data"] = {"$gte": start_date, "$lte": end_date}
+        query["dia"] = {"$gte": chave_dia(start_date), "$lte": chave_dia(end_date)}
     elif start_date:
-        query["data"] = {"$gte": start_date}
+        query["dia"] = {"$gte": chave_dia(start_date)}
     elif end_date:
-        query["data"] = {"$lte": end_date}
+        query["dia"] = {"$lte": chave_dia(end_date)}
     
     if tipo:
         query["tipo"] = tipo
     
-    # Buscar documentos e converter para formato serializável
-    return [convert_mongo_doc(doc) for doc in expenses_collection.find(query)]
+    return query
+
+
+def _montar_projecao(fields, cobrir=False):
+    """
+    Converte a lista de campos pedidos em uma projeção do MongoDB.
+
+    A data é lida de `dia` (convert_mongo_doc devolve `data`) e sempre incluída,
+    assim como o `_id`, porque formam a chave do cursor. Com `cobrir=True`
+    (consultas sem ordenação) e só campos do índice, o `_id` fica de fora, e a
+    consulta pode ser respondida apenas pelo índice (ver get_user_expenses).
+    """
+    if not fields:
+        return None
+    
+    invalidos = [campo for campo in fields if campo not in CAMPOS_GASTO]
+    if invalidos:
+        raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+    
+    projecao = {campo: 1 for campo in fields if campo != "data"}
+    projecao["dia"] = 1
+    if cobrir and all(campo in CAMPOS_INDICE for campo in fields):
+        projecao["_id"] = 0
+    return projecao
+
+
+def encode_cursor(doc):
+    """Gera um cursor opaco a partir da chave (dia, _id) do último documento"""
+    chave = json.dumps([doc["dia"], str(doc["_id"])])
+    return base64.urlsafe_b64encode(chave.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Converte um cursor opaco de volta para a chave (dia, _id)"""
+    try:
+        dia, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # Cursores emitidos antes da chave `dia` guardam a data em texto
+        return chave_dia(dia) if isinstance(dia, str) else int(dia), ObjectId(doc_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def get_user_expenses_page(user_id, start_date=None, end_date=None, tipo=None, cursor=None, limit=100, fields=None):
+    """
+    Recupera uma página de despesas ordenada por (data, _id) decrescente
+
+    A paginação é por chave (keyset): o cursor guarda a chave do último item
+    retornado, então cada página custa o mesmo independentemente da posição.
+    """
+    ensure_user_exists(user_id)
+    
+    query = _filtro_pagina(_montar_filtro(user_id, start_date, end_date, tipo), cursor)
+    
+    # Busca um item a mais para saber se existe próxima página
+    docs = list(
+        expenses_collection.find(query, _montar_projecao(fields))
+        .sort(ORDEM_GASTOS)
+        .limit(limit + 1)
+    )
+    
+    return _montar_pagina(docs, limit)
+
+
+def _filtro_pagina(query, cursor):
+    """Restringe o filtro aos documentos posteriores ao cursor na ordem (dia, _id) decrescente"""
+    if not cursor:
+        return query
+    
+    dia, doc_id = decode_cursor(cursor)
+    return {"$and": [query, {"$or": [
+        {"dia": {"$lt": dia}},
+        {"dia": dia, "_id": {"$lt": doc_id}}
+    ]}]}
+
+
+def _montar_pagina(docs, limit):
+    """Monta a resposta paginada a partir de até limit + 1 documentos"""
+    proximo_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        proximo_cursor = encode_cursor(docs[-1])
+    
+    return {
+        "gastos": [convert_mongo_doc(doc) for doc in docs],
+        "proximo_cursor": proximo_cursor
+    }
+
+
+def iter_user_expenses(user_id, start_date=None, end_date=None, tipo=None, fields=None, batch_size=500):
+    """
+    Itera sobre as despesas do usuário em lotes, à medida que o cursor do MongoDB as entrega
+
+    Nunca materializa o resultado inteiro: cada lote tem no máximo `batch_size` itens.
+    """
+    ensure_user_exists(user_id)
+    
+    query = _montar_filtro(user_id, start_date, end_date, tipo)
+    docs = (
+        expenses_collection.find(query, _montar_projecao(fields))
+        .sort(ORDEM_GASTOS)
+        .batch_size(batch_size)
+    )
+    
+    lote = []
+    for doc in docs:
+        lote.append(convert_mongo_doc(doc))
+        if len(lote) >= batch_size:
+            yield lote
+            lote = []
+    
+    if lote:
+        yield lote
+
+
+def get_dashboard_summary(user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes=5):
+    """
+    Calcula o resumo do dashboard (mês atual e anterior) sem transferir todos os documentos
+
+    Retorna os totais de cada período, a soma por categoria de cada período e as
+    últimas transações do período atual. Meses inteiros vêm dos rollups; outros
+    períodos usam uma única agregação no servidor.
+    """
+    # Garantir que o usuário exista no MongoDB
+    ensure_user_exists(user_id)
+
+    meses_atual = _meses_completos(inicio_atual, fim_atual)
+    meses_anterior = _meses_completos(inicio_anterior, fim_anterior)
+
+    # Períodos de meses inteiros são lidos dos rollups: O(categorias) em vez de O(gastos)
+    if meses_atual and meses_anterior and _reparar_rollups(user_id):
+        rollups = get_monthly_rollups(user_id, meses_atual + meses_anterior)
+        ultimas = (
+            expenses_collection.find(_montar_filtro(user_id, inicio_atual, fim_atual))
+            .sort(ORDEM_GASTOS)
+            .limit(limite_transacoes)
+        )
+        return _montar_resumo(_somar_meses(rollups, meses_atual), _somar_meses(rollups, meses_anterior), ultimas)
+
+    return _resumo_por_agregacao(user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes)
+
+
+def _resumo_por_agregacao(user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes=5):
+    """Resumo do dashboard calculado por um pipeline $facet sobre os gastos brutos"""
+    pipeline = _pipeline_resumo(user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes)
+    resultado = next(expenses_collection.aggregate(pipeline), {})
+    return _resumo_do_facet(resultado)
+
+
+def _pipeline_resumo(user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes):
+    """Pipeline $facet com as somas por categoria dos dois períodos e as últimas transações"""
+    periodo_atual = {"dia": {"$gte": chave_dia(inicio_atual), "$lte": chave_dia(fim_atual)}}
+    periodo_anterior = {"dia": {"$gte": chave_dia(inicio_anterior), "$lte": chave_dia(fim_anterior)}}
+
+    pipeline = [
+        # O primeiro $match usa o índice (user_id, dia) e cobre os dois períodos
+        {"$match": {
+            "user_id": user_id,
+            "dia": {
+                "$gte": chave_dia(min(inicio_atual, inicio_anterior)),
+                "$lte": chave_dia(max(fim_atual, fim_anterior))
+            }
+        }},
+        {"$facet": {
+            "atual": [
+                {"$match": periodo_atual},
+                {"$group": {"_id": "$tipo", "total": {"$sum": "$valor"}}}
+            ],
+            "anterior": [
+                {"$match": periodo_anterior},
+                {"$group": {"_id": "$tipo", "total": {"$sum": "$valor"}}}
+            ],
+            "ultimas_transacoes": [
+                {"$match": periodo_atual},
+                {"$sort": {"dia": DESCENDING, "_id": DESCENDING}},
+                {"$limit": limite_transacoes}
+            ]
+        }}
+    ]
+    return pipeline
+
+
+def _resumo_do_facet(resultado):
+    """Converte o documento único do $facet no formato do resumo"""
+    return _montar_resumo(
+        {item["_id"]: item["total"] for item in resultado.get("atual", [])},
+        {item["_id"]: item["total"] for item in resultado.get("anterior", [])},
+        resultado.get("ultimas_transacoes", [])
+    )
+
+
+def _montar_resumo(por_categoria_atual, por_categoria_anterior, ultimas_transacoes):
+    return {
+        "total_atual": sum(por_categoria_atual.values()),
+        "total_anterior": sum(por_categoria_anterior.values()),
+        "por_categoria_atual": por_categoria_atual,
+        "por_categoria_anterior": por_categoria_anterior,
+        "ultimas_transacoes": [convert_mongo_doc(doc) for doc in ultimas_transacoes]
+    }
+
+
+def get_monthly_rollups(user_id, meses):
+    """
+    Lê os totais mensais por categoria dos rollups
+
+    Returns:
+        Dict {"YYYY-MM": {categoria: total}}
+    """
+    return _agrupar_rollups(meses, rollups_collection.find({"user_id": user_id, "mes": {"$in": list(meses)}}))
+
+
+def _agrupar_rollups(meses, docs):
+    resultado = {mes: {} for mes in meses}
+    for doc in docs:
+        # Categorias zeradas (após exclusões) não aparecem no resumo
+        if doc.get("quantidade", 0) > 0:
+            resultado[doc["mes"]][doc["tipo"]] = doc["total"]
+    return resultado
+
+
+def _meses_completos(inicio, fim):
+    """
+    Retorna a lista de meses "YYYY-MM" se o período cobre exatamente meses inteiros,
+    ou None caso contrário
+    """
+    try:
+        data_inicio = datetime.strptime(inicio, "%Y-%m-%d")
+        data_fim = datetime.strptime(fim, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+    if data_inicio.day != 1 or data_fim.day != monthrange(data_fim.year, data_fim.month)[1] or data_inicio > data_fim:
+        return None
+
+    meses = []
+    ano, mes = data_inicio.year, data_inicio.month
+    while (ano, mes) <= (data_fim.year, data_fim.month):
+        meses.append(f"{ano:04d}-{mes:02d}")
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+def _somar_meses(rollups, meses):
+    """Soma os totais por categoria de vários meses dos rollups"""
+    por_categoria = {}
+    for mes in meses:
+        for categoria, total in rollups.get(mes, {}).items():
+            por_categoria[categoria] = por_categoria.get(categoria, 0) + total
+    return por_categoria
+
+
+def _atualizar_rollup(gasto, sinal=1):
+    """
+    Aplica um gasto ao rollup do mês com $inc (atômico no documento).
+    Use sinal=-1 para remover um gasto do rollup.
+
+    O gasto já está gravado (ou excluído) quando o rollup é atualizado; se a
+    atualização falhar, o usuário fica marcado para reconstrução em vez de a
+    requisição falhar (ver _rollup_falhou).
+    """
+    try:
+        rollups_collection.update_one(*_operacao_rollup(gasto, sinal), upsert=True)
+    except Exception as e:
+        _rollup_falhou([gasto.get("user_id")], e)
+
+
+# Usuários cujo rollup ficou divergente (falha ao atualizar depois de gravar o
+# gasto). O próximo resumo do dashboard desses usuários reconstrói os rollups
+# com rebuild_rollups antes de lê-los.
+_rollups_divergentes = set()
+_rollups_lock = threading.Lock()
+
+
+def _rollup_falhou(user_ids, erro):
+    with _rollups_lock:
+        _rollups_divergentes.update(user_ids)
+    print(f"Falha ao atualizar rollups (usuários {sorted(map(str, user_ids))}); reconstrução agendada: {str(erro)}")
+
+
+def _reparar_rollups(user_id):
+    """
+    Reconstrói os rollups do usuário se estiverem marcados como divergentes
+
+    Returns:
+        True se os rollups podem ser lidos; False se a reconstrução falhou
+        (o resumo é então calculado direto dos gastos)
+    """
+    with _rollups_lock:
+        if user_id not in _rollups_divergentes:
+            return True
+        _rollups_divergentes.discard(user_id)
+    try:
+        rebuild_rollups(user_id)
+        return True
+    except Exception as e:
+        _rollup_falhou([user_id], e)
+        return False
+
+
+def _operacao_rollup(gasto, sinal=1):
+    """Filtro e $inc do rollup mensal correspondente a um gasto"""
+    return (
+        {"user_id": gasto["user_id"], "mes": gasto["data"][:7], "tipo": gasto["tipo"]},
+        {"$inc": {"total": float(gasto["valor"]) * sinal, "quantidade": sinal}}
+    )
+
+
+def _operacoes_rollup_lote(gastos):
+    """Agrupa os incrementos de vários gastos por (usuário, mês, categoria) em UpdateOnes"""
+    incrementos = {}
+    for gasto in gastos:
+        chave = (gasto["user_id"], gasto["data"][:7], gasto["tipo"])
+        total, quantidade = incrementos.get(chave, (0, 0))
+        incrementos[chave] = (total + float(gasto["valor"]), quantidade + 1)
+    
+    return [
+        UpdateOne(
+            {"user_id": user_id, "mes": mes, "tipo": tipo},
+            {"$inc": {"total": total, "quantidade": quantidade}},
+            upsert=True
+        )
+        for (user_id, mes, tipo), (total, quantidade) in incrementos.items()
+    ]
+
+
+def rebuild_rollups(user_id=None, corrigir=True):
+    """
+    Recalcula os rollups a partir de expenses_collection e verifica divergências
+
+    Args:
+        user_id: Limita a reconstrução a um usuário (None = todos)
+        corrigir: Se True, grava os valores recalculados sobre os rollups existentes
+
+    Returns:
+        Dict com o número de rollups verificados e a lista de divergências encontradas
+    """
+    filtro = {} if user_id is None else {"user_id": user_id}
+
+    pipeline = [
+        {"$match": filtro},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "mes": {"$substrBytes": ["$data", 0, 7]}, "tipo": "$tipo"},
+            "total": {"$sum": "$valor"},
+            "quantidade": {"$sum": 1}
+        }}
+    ]
+    esperados = {
+        (item["_id"]["user_id"], item["_id"]["mes"], item["_id"]["tipo"]): item
+        for item in expenses_collection.aggregate(pipeline, allowDiskUse=True)
+    }
+    existentes = {
+        (doc["user_id"], doc["mes"], doc["tipo"]): doc
+        for doc in rollups_collection.find(filtro)
+    }
+
+    divergencias = []
+    for chave in set(esperados) | set(existentes):
+        esperado = esperados.get(chave, {"total": 0, "quantidade": 0})
+        existente = existentes.get(chave, {"total": 0, "quantidade": 0})
+        if abs(esperado["total"] - existente["total"]) > 0.005 or esperado["quantidade"] != existente["quantidade"]:
+            divergencias.append({
+                "user_id": chave[0],
+                "mes": chave[1],
+                "tipo": chave[2],
+                "esperado": esperado["total"],
+                "encontrado": existente["total"]
+            })
+
+    if corrigir:
+        for item in divergencias:
+            chave = {"user_id": item["user_id"], "mes": item["mes"], "tipo": item["tipo"]}
+            esperado = esperados.get((item["user_id"], item["mes"], item["tipo"]))
+            if esperado:
+                rollups_collection.update_one(
+                    chave,
+                    {"$set": {"total": esperado["total"], "quantidade": esperado["quantidade"]}},
+                    upsert=True
+                )
+            else:
+                rollups_collection.delete_one(chave)
+        # O resumo do dashboard muda com os rollups corrigidos
+        incrementar_versoes(item["user_id"] for item in divergencias)
+
+    return {"verificados": len(esperados), "divergencias": divergencias}
+
+
+def get_data_version(user_id):
+    """Versão dos dados do usuário (0 se ele nunca gravou)"""
+    doc = versoes_collection.find_one({"user_id": user_id}, {"_id": 0, "versao": 1})
+    return doc["versao"] if doc else 0
+
+
+def _operacoes_versao(user_ids):
+    return [UpdateOne({"user_id": user_id}, {"$inc": {"versao": 1}}, upsert=True) for user_id in user_ids]
+
+
+def incrementar_versoes(user_ids):
+    """
+    Nova versão dos dados dos usuários, depois de uma gravação
+
+    Os ETags e caches da API (src/versoes.py) de todos os processos mudam com
+    ela. Uma falha só é registrada: o gasto já está gravado, e o processo que
+    gravou invalida os próprios caches de qualquer forma.
+    """
+    user_ids = set(user_ids)
+    operacoes = _operacoes_versao(user_ids)
+    if not operacoes:
+        return
+    try:
+        versoes_collection.bulk_write(operacoes, ordered=False)
+    except Exception as e:
+        print(f"Falha ao incrementar a versão dos dados (usuários {sorted(map(str, user_ids))}): {str(e)}")
 
 
 def save_expense(expense_data):
     """
     Salva uma nova despesa no banco de dados
+
+    Raises:
+        GastoInvalido: valor, data ou tipo inválidos (nada é gravado)
     """
+    # Validar antes de inserir: o rollup depende do mês e do valor
+    normalizar_gasto(expense_data)
+
     # Garantir que o usuário exista no MongoDB
     ensure_user_exists(expense_data["user_id"])
     
     # Salvar o gasto
-    result = expenses_collection.insert_one(expense_data)
+    result = expenses_collection.insert_one(preparar_gasto(expense_data))
     
     # Adicionar o ID ao documento original
     expense_data["_id"] = result.inserted_id
     
+    # Manter o total mensal da categoria atualizado
+    _atualizar_rollup(expense_data)
+    incrementar_versoes([expense_data["user_id"]])
+    
     # Converter para formato serializável
     return convert_mongo_doc(expense_data)
 
+def save_expenses(expenses):
+    """
+    Salva vários gastos com um único insert_many não ordenado
+
+    Um documento inválido não impede a gravação dos demais: gastos que não
+    passam em normalizar_gasto nem são enviados. Os rollups mensais são
+    atualizados em um único bulk_write.
+
+    Returns:
+        Tupla (salvos, erros): salvos é um dict {índice: documento serializável}
+        e erros um dict {índice: mensagem}
+    """
+    if not expenses:
+        return {}, {}
+    
+    indices, erros = _validar_lote(expenses)
+    for user_id in {expenses[i]["user_id"] for i in indices}:
+        ensure_user_exists(user_id)
+    
+    if indices:
+        try:
+            # O pymongo preenche o _id de cada documento antes de enviar
+            expenses_collection.insert_many([preparar_gasto(expenses[i]) for i in indices], ordered=False)
+        except BulkWriteError as e:
+            erros.update({indices[posicao]: mensagem for posicao, mensagem in _erros_bulk(e).items()})
+    
+    salvos = {i: expenses[i] for i in indices if i not in erros}
+    
+    operacoes = _operacoes_rollup_lote(salvos.values())
+    if operacoes:
+        try:
+            rollups_collection.bulk_write(operacoes, ordered=False)
+        except Exception as e:
+            _rollup_falhou({gasto["user_id"] for gasto in salvos.values()}, e)
+    incrementar_versoes(gasto["user_id"] for gasto in salvos.values())
+    
+    return {i: convert_mongo_doc(gasto) for i, gasto in salvos.items()}, erros
+
+def delete_expense(user_id, expense_id):
+    """
+    Exclui um gasto do usuário e desconta o valor do rollup mensal
+
+    Returns:
+        O documento excluído (serializável) ou None se não existir
+    """
+    try:
+        doc_id = ObjectId(expense_id)
+    except Exception:
+        return None
+    
+    doc = expenses_collection.find_one_and_delete({"_id": doc_id, "user_id": user_id})
+    if doc:
+        _atualizar_rollup(doc, sinal=-1)
+        incrementar_versoes([user_id])
+    return convert_mongo_doc(doc)
+
+def get_existing_import_hashes(user_id, hashes):
+    """Hashes de importação já gravados para o usuário (consulta coberta pelo índice único)"""
+    if not hashes:
+        return set()
+    docs = expenses_collection.find(
+        {"user_id": user_id, "hash_importacao": {"$in": list(hashes)}},
+        {"_id": 0, "hash_importacao": 1}
+    )
+    return {doc["hash_importacao"] for doc in docs}
+
+def _validar_lote(expenses):
+    """Normaliza os gastos de um lote; retorna (índices válidos, {índice: mensagem} dos inválidos)"""
+    indices, erros = [], {}
+    for i, gasto in enumerate(expenses):
+        try:
+            normalizar_gasto(gasto)
+            indices.append(i)
+        except GastoInvalido as e:
+            erros[i] = str(e)
+    return indices, erros
+
+def _erros_bulk(erro):
+    """Extrai {índice: mensagem} de um BulkWriteError (chave duplicada vira ERRO_DUPLICADO)"""
+    return {
+        item["index"]: ERRO_DUPLICADO if item.get("code") == 11000 else item.get("errmsg", "Erro ao salvar gasto")
+        for item in erro.details.get("writeErrors", [])
+    }
+
 def convert_mongo_doc(doc):
     """Converte um documento do MongoDB para um formato JSON serializável"""
     if doc is None:
@@ -102,6 +819,11 @@ def convert_mongo_doc(doc):
     
     result = {}
     for key, value in doc.items():
+        # A chave `dia` é interna: a API só expõe `data`
+        if key == "dia":
+            if "data" not in doc:
+                result["data"] = data_da_chave(value)
+            continue
         # Converter ObjectId para string
         if isinstance(value, ObjectId):
             result[key] = str(value)
@@ -117,4 +839,170 @@ def convert_mongo_doc(doc):
         else:
             result[key] = value
     
-    return result
\ No newline at end of file
+    return result
+
+
+
+# Variantes assíncronas (motor), usadas pelas rotas async do FastAPI.
+# Compartilham os filtros, pipelines e conversões das versões síncronas acima.
+
+async def ensure_user_exists_async(user_id):
+    """Versão assíncrona de ensure_user_exists"""
+    if _usuario_conhecido(user_id):
+        return
+    
+    await async_users_collection.update_one(*_operacao_registro(user_id), upsert=True)
+    _marcar_conhecido(user_id)
+
+
+async def get_user_expenses_async(user_id, start_date=None, end_date=None, tipo=None, fields=None):
+    """Versão assíncrona de get_user_expenses"""
+    await ensure_user_exists_async(user_id)
+    
+    query = _montar_filtro(user_id, start_date, end_date, tipo)
+    return [
+        convert_mongo_doc(doc)
+        async for doc in async_expenses_collection.find(query, _montar_projecao(fields, cobrir=True))
+    ]
+
+
+async def get_user_expenses_page_async(user_id, start_date=None, end_date=None, tipo=None, cursor=None, limit=100, fields=None):
+    """Versão assíncrona de get_user_expenses_page"""
+    await ensure_user_exists_async(user_id)
+    
+    query = _filtro_pagina(_montar_filtro(user_id, start_date, end_date, tipo), cursor)
+    docs = await (
+        async_expenses_collection.find(query, _montar_projecao(fields))
+        .sort(ORDEM_GASTOS)
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+    return _montar_pagina(docs, limit)
+
+
+async def iter_user_expenses_async(user_id, start_date=None, end_date=None, tipo=None, fields=None, batch_size=500):
+    """Versão assíncrona de iter_user_expenses (gerador assíncrono de lotes)"""
+    await ensure_user_exists_async(user_id)
+    
+    query = _montar_filtro(user_id, start_date, end_date, tipo)
+    docs = (
+        async_expenses_collection.find(query, _montar_projecao(fields))
+        .sort(ORDEM_GASTOS)
+        .batch_size(batch_size)
+    )
+    
+    lote = []
+    async for doc in docs:
+        lote.append(convert_mongo_doc(doc))
+        if len(lote) >= batch_size:
+            yield lote
+            lote = []
+    
+    if lote:
+        yield lote
+
+
+async def get_dashboard_summary_async(user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes=5):
+    """Versão assíncrona de get_dashboard_summary"""
+    await ensure_user_exists_async(user_id)
+    
+    meses_atual = _meses_completos(inicio_atual, fim_atual)
+    meses_anterior = _meses_completos(inicio_anterior, fim_anterior)
+    
+    # Só passa por uma thread quando há reconstrução pendente
+    rollups_prontos = user_id not in _rollups_divergentes or await asyncio.to_thread(_reparar_rollups, user_id)
+    
+    if meses_atual and meses_anterior and rollups_prontos:
+        meses = meses_atual + meses_anterior
+        rollups_docs, ultimas = await asyncio.gather(
+            async_rollups_collection.find({"user_id": user_id, "mes": {"$in": meses}}).to_list(length=None),
+            async_expenses_collection.find(_montar_filtro(user_id, inicio_atual, fim_atual))
+            .sort(ORDEM_GASTOS)
+            .limit(limite_transacoes)
+            .to_list(length=limite_transacoes)
+        )
+        rollups = _agrupar_rollups(meses, rollups_docs)
+        return _montar_resumo(_somar_meses(rollups, meses_atual), _somar_meses(rollups, meses_anterior), ultimas)
+    
+    pipeline = _pipeline_resumo(user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes)
+    resultado = await async_expenses_collection.aggregate(pipeline).to_list(length=1)
+    return _resumo_do_facet(resultado[0] if resultado else {})
+
+
+async def get_data_version_async(user_id):
+    """Versão assíncrona de get_data_version"""
+    doc = await async_versoes_collection.find_one({"user_id": user_id}, {"_id": 0, "versao": 1})
+    return doc["versao"] if doc else 0
+
+
+async def incrementar_versoes_async(user_ids):
+    """Versão assíncrona de incrementar_versoes"""
+    user_ids = set(user_ids)
+    operacoes = _operacoes_versao(user_ids)
+    if not operacoes:
+        return
+    try:
+        await async_versoes_collection.bulk_write(operacoes, ordered=False)
+    except Exception as e:
+        print(f"Falha ao incrementar a versão dos dados (usuários {sorted(map(str, user_ids))}): {str(e)}")
+
+
+async def save_expense_async(expense_data):
+    """Versão assíncrona de save_expense"""
+    normalizar_gasto(expense_data)
+    await ensure_user_exists_async(expense_data["user_id"])
+    
+    result = await async_expenses_collection.insert_one(preparar_gasto(expense_data))
+    expense_data["_id"] = result.inserted_id
+    
+    try:
+        await async_rollups_collection.update_one(*_operacao_rollup(expense_data), upsert=True)
+    except Exception as e:
+        _rollup_falhou([expense_data["user_id"]], e)
+    await incrementar_versoes_async([expense_data["user_id"]])
+    
+    return convert_mongo_doc(expense_data)
+
+
+async def save_expenses_async(expenses):
+    """Versão assíncrona de save_expenses"""
+    if not expenses:
+        return {}, {}
+    
+    indices, erros = _validar_lote(expenses)
+    await asyncio.gather(*(ensure_user_exists_async(user_id) for user_id in {expenses[i]["user_id"] for i in indices}))
+    
+    if indices:
+        try:
+            await async_expenses_collection.insert_many([preparar_gasto(expenses[i]) for i in indices], ordered=False)
+        except BulkWriteError as e:
+            erros.update({indices[posicao]: mensagem for posicao, mensagem in _erros_bulk(e).items()})
+    
+    salvos = {i: expenses[i] for i in indices if i not in erros}
+    
+    operacoes = _operacoes_rollup_lote(salvos.values())
+    if operacoes:
+        try:
+            await async_rollups_collection.bulk_write(operacoes, ordered=False)
+        except Exception as e:
+            _rollup_falhou({gasto["user_id"] for gasto in salvos.values()}, e)
+    await incrementar_versoes_async([gasto["user_id"] for gasto in salvos.values()])
+    
+    return {i: convert_mongo_doc(gasto) for i, gasto in salvos.items()}, erros
+
+
+async def delete_expense_async(user_id, expense_id):
+    """Versão assíncrona de delete_expense"""
+    try:
+        doc_id = ObjectId(expense_id)
+    except Exception:
+        return None
+    
+    doc = await async_expenses_collection.find_one_and_delete({"_id": doc_id, "user_id": user_id})
+    if doc:
+        try:
+            await async_rollups_collection.update_one(*_operacao_rollup(doc, sinal=-1), upsert=True)
+        except Exception as e:
+            _rollup_falhou([user_id], e)
+        await incrementar_versoes_async([user_id])
+    return convert_mongo_doc(doc)
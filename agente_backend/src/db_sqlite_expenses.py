@@ -0,0 +1,309 @@
+# agente_backend/src/db_sqlite_expenses.py
+"""
+Backend de gastos em SQLite embarcado (EXPENSE_BACKEND=sqlite).
+
+O arquivo (EXPENSES_SQLITE_PATH, padrão agente_backend/gastos.db, independente
+do diretório atual) é separado do banco de usuários do SQLAlchemy: as escritas
+de gastos e as de usuários não disputam o mesmo lock de escrita. O modo WAL
+permite leituras concorrentes com uma escrita, e os índices compostos atendem
+os filtros por período/categoria.
+
+Cada escrita roda em `with conn:`: se o INSERT ou o incremento da versão falha,
+a transação é desfeita e o lock de escrita do arquivo é liberado.
+"""
+import os
+import json
+import asyncio
+import base64
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+from src.storage import ExpenseStorage, ERRO_DUPLICADO, normalizar_gasto
+
+load_dotenv()
+
+EXPENSES_SQLITE_PATH = os.getenv(
+    "EXPENSES_SQLITE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gastos.db")
+)
+
+CAMPOS_GASTO = ("user_id", "valor", "tipo", "data", "descricao")
+# Mesma regra do backend MongoDB: find_range só com estes campos devolve os gastos sem id
+CAMPOS_INDICE = ("data", "tipo", "valor")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    valor REAL NOT NULL,
+    tipo TEXT NOT NULL,
+    data TEXT NOT NULL,
+    descricao TEXT,
+    hash_importacao TEXT
+);
+-- Listagem e paginação por (data, id) decrescente
+CREATE INDEX IF NOT EXISTS idx_expenses_user_data ON expenses (user_id, data DESC, id DESC);
+-- Filtro por categoria e período (consultas com tipo)
+CREATE INDEX IF NOT EXISTS idx_expenses_user_tipo_data ON expenses (user_id, tipo, data, valor);
+-- Cobre as somas por categoria do dashboard sem ler a tabela
+CREATE INDEX IF NOT EXISTS idx_expenses_user_data_tipo_valor ON expenses (user_id, data, tipo, valor);
+-- Versão dos dados de cada usuário (src/versoes.py), incrementada na mesma transação das escritas
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id INTEGER PRIMARY KEY,
+    versao INTEGER NOT NULL
+);
+"""
+
+# Deduplicação de extratos importados; gastos digitados têm hash_importacao NULL
+_INDICE_IMPORTACAO = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_user_hash_importacao
+ON expenses (user_id, hash_importacao) WHERE hash_importacao IS NOT NULL;
+"""
+
+_INSERIR = (
+    "INSERT INTO expenses (user_id, valor, tipo, data, descricao, hash_importacao) VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+_INCREMENTAR_VERSAO = (
+    "INSERT INTO data_versions (user_id, versao) VALUES (?, 1) "
+    "ON CONFLICT (user_id) DO UPDATE SET versao = versao + 1"
+)
+
+
+def _parametros_insercao(gasto):
+    return (
+        gasto["user_id"], float(gasto["valor"]), gasto["tipo"], gasto["data"],
+        gasto.get("descricao"), gasto.get("hash_importacao")
+    )
+
+
+def _encode_cursor(data, gasto_id):
+    return base64.urlsafe_b64encode(json.dumps([data, str(gasto_id)]).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        data, gasto_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return data, int(gasto_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+class SQLiteExpenseStorage(ExpenseStorage):
+    """Gastos em uma tabela SQLite, com uma conexão por thread"""
+
+    nome = "sqlite"
+
+    def __init__(self, caminho=EXPENSES_SQLITE_PATH):
+        self.caminho = caminho
+        self._local = threading.local()
+        # Serializa as escritas: o SQLite aceita apenas um escritor por vez
+        self._lock_escrita = threading.Lock()
+
+        conn = self._conexao()
+        conn.executescript(_ESQUEMA)
+        # Tabelas criadas antes da importação de extratos não têm a coluna
+        colunas = {linha["name"] for linha in conn.execute("PRAGMA table_info(expenses)")}
+        if "hash_importacao" not in colunas:
+            conn.execute("ALTER TABLE expenses ADD COLUMN hash_importacao TEXT")
+        conn.executescript(_INDICE_IMPORTACAO)
+        conn.commit()
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._abrir()
+            self._local.conn = conn
+        return conn
+
+    def _abrir(self):
+        conn = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    async def verificar_async(self):
+        await asyncio.to_thread(lambda: self._conexao().execute("SELECT 1").fetchone())
+
+    @staticmethod
+    def _filtro(user_id, start_date=None, end_date=None, tipo=None):
+        condicoes, parametros = ["user_id = ?"], [user_id]
+        if start_date:
+            condicoes.append("data >= ?")
+            parametros.append(start_date)
+        if end_date:
+            condicoes.append("data <= ?")
+            parametros.append(end_date)
+        if tipo:
+            condicoes.append("tipo = ?")
+            parametros.append(tipo)
+        return " AND ".join(condicoes), parametros
+
+    @staticmethod
+    def _colunas(fields, com_id=True):
+        if not fields:
+            return "id, " + ", ".join(CAMPOS_GASTO)
+        invalidos = [campo for campo in fields if campo not in CAMPOS_GASTO]
+        if invalidos:
+            raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+        # data e id são sempre incluídos porque formam a chave do cursor
+        colunas = ", ".join(dict.fromkeys(["data", *fields]))
+        return f"id, {colunas}" if com_id else colunas
+
+    @staticmethod
+    def _documento(linha):
+        doc = dict(linha)
+        if "id" in doc:
+            doc["_id"] = str(doc.pop("id"))
+        return doc
+
+    def register_user(self, user_id, username=None):
+        # Os usuários já estão no SQLite (tabela users); nada a registrar
+        return None
+
+    def save(self, gasto):
+        normalizar_gasto(gasto)
+        with self._lock_escrita:
+            conn = self._conexao()
+            with conn:
+                cursor = conn.execute(_INSERIR, _parametros_insercao(gasto))
+                conn.execute(_INCREMENTAR_VERSAO, (gasto["user_id"],))
+        gasto["_id"] = str(cursor.lastrowid)
+        return dict(gasto)
+
+    def save_many(self, gastos):
+        salvos, erros = {}, {}
+        with self._lock_escrita:
+            conn = self._conexao()
+            # Uma única transação para o lote inteiro
+            with conn:
+                for indice, gasto in enumerate(gastos):
+                    try:
+                        cursor = conn.execute(_INSERIR, _parametros_insercao(normalizar_gasto(gasto)))
+                    except sqlite3.IntegrityError as e:
+                        duplicado = "UNIQUE" in str(e) and gasto.get("hash_importacao")
+                        erros[indice] = ERRO_DUPLICADO if duplicado else f"Erro ao salvar gasto: {e}"
+                        continue
+                    except (KeyError, TypeError, ValueError) as e:
+                        # Inclui GastoInvalido de normalizar_gasto
+                        erros[indice] = f"Erro ao salvar gasto: {e}"
+                        continue
+                    gasto["_id"] = str(cursor.lastrowid)
+                    salvos[indice] = dict(gasto)
+                conn.executemany(
+                    _INCREMENTAR_VERSAO, [(user_id,) for user_id in {g["user_id"] for g in salvos.values()}]
+                )
+        return salvos, erros
+
+    def find_range(self, user_id, start_date=None, end_date=None, tipo=None, fields=None):
+        where, parametros = self._filtro(user_id, start_date, end_date, tipo)
+        com_id = not fields or not all(campo in CAMPOS_INDICE for campo in fields)
+        linhas = self._conexao().execute(
+            f"SELECT {self._colunas(fields, com_id)} FROM expenses WHERE {where}", parametros
+        ).fetchall()
+        return [self._documento(linha) for linha in linhas]
+
+    def find_page(self, user_id, start_date=None, end_date=None, tipo=None, cursor=None, limit=100, fields=None):
+        where, parametros = self._filtro(user_id, start_date, end_date, tipo)
+        if cursor:
+            data, gasto_id = _decode_cursor(cursor)
+            where += " AND (data < ? OR (data = ? AND id < ?))"
+            parametros += [data, data, gasto_id]
+
+        linhas = self._conexao().execute(
+            f"SELECT {self._colunas(fields)} FROM expenses WHERE {where} ORDER BY data DESC, id DESC LIMIT ?",
+            parametros + [limit + 1]
+        ).fetchall()
+
+        proximo_cursor = None
+        if len(linhas) > limit:
+            linhas = linhas[:limit]
+            proximo_cursor = _encode_cursor(linhas[-1]["data"], linhas[-1]["id"])
+
+        return {"gastos": [self._documento(linha) for linha in linhas], "proximo_cursor": proximo_cursor}
+
+    def iter_range(self, user_id, start_date=None, end_date=None, tipo=None, fields=None, batch_size=500):
+        where, parametros = self._filtro(user_id, start_date, end_date, tipo)
+        # Conexão própria do iterador: iter_range_async avança o gerador em
+        # threads diferentes, e a conexão da thread que o criou continua em uso
+        # por outras requisições naquela thread
+        conn = self._abrir()
+        try:
+            cursor = conn.execute(
+                f"SELECT {self._colunas(fields)} FROM expenses WHERE {where} ORDER BY data DESC, id DESC", parametros
+            )
+            while True:
+                linhas = cursor.fetchmany(batch_size)
+                if not linhas:
+                    return
+                yield [self._documento(linha) for linha in linhas]
+        finally:
+            conn.close()
+
+    def dashboard_summary(self, user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes=5):
+        conn = self._conexao()
+
+        def por_categoria(inicio, fim):
+            linhas = conn.execute(
+                "SELECT tipo, SUM(valor) AS total FROM expenses "
+                "WHERE user_id = ? AND data >= ? AND data <= ? GROUP BY tipo",
+                (user_id, inicio, fim)
+            ).fetchall()
+            return {linha["tipo"]: linha["total"] for linha in linhas}
+
+        por_categoria_atual = por_categoria(inicio_atual, fim_atual)
+        por_categoria_anterior = por_categoria(inicio_anterior, fim_anterior)
+        ultimas = conn.execute(
+            f"SELECT {self._colunas(None)} FROM expenses WHERE user_id = ? AND data >= ? AND data <= ? "
+            "ORDER BY data DESC, id DESC LIMIT ?",
+            (user_id, inicio_atual, fim_atual, limite_transacoes)
+        ).fetchall()
+
+        return {
+            "total_atual": sum(por_categoria_atual.values()),
+            "total_anterior": sum(por_categoria_anterior.values()),
+            "por_categoria_atual": por_categoria_atual,
+            "por_categoria_anterior": por_categoria_anterior,
+            "ultimas_transacoes": [self._documento(linha) for linha in ultimas]
+        }
+
+    def delete(self, user_id, gasto_id):
+        try:
+            gasto_id = int(gasto_id)
+        except (TypeError, ValueError):
+            return None
+
+        with self._lock_escrita:
+            conn = self._conexao()
+            linha = conn.execute(
+                f"SELECT {self._colunas(None)} FROM expenses WHERE id = ? AND user_id = ?", (gasto_id, user_id)
+            ).fetchone()
+            if linha is None:
+                return None
+            with conn:
+                conn.execute("DELETE FROM expenses WHERE id = ?", (gasto_id,))
+                conn.execute(_INCREMENTAR_VERSAO, (user_id,))
+        return self._documento(linha)
+
+    def existing_import_hashes(self, user_id, hashes):
+        hashes = list(hashes)
+        if not hashes:
+            return set()
+        marcadores = ", ".join("?" * len(hashes))
+        linhas = self._conexao().execute(
+            "SELECT hash_importacao FROM expenses "
+            f"WHERE user_id = ? AND hash_importacao IS NOT NULL AND hash_importacao IN ({marcadores})",
+            (user_id, *hashes)
+        ).fetchall()
+        return {linha["hash_importacao"] for linha in linhas}
+
+    def data_version(self, user_id):
+        linha = self._conexao().execute("SELECT versao FROM data_versions WHERE user_id = ?", (user_id,)).fetchone()
+        return linha["versao"] if linha else 0
+
+    def bump_data_versions(self, user_ids):
+        with self._lock_escrita:
+            conn = self._conexao()
+            with conn:
+                conn.executemany(_INCREMENTAR_VERSAO, [(user_id,) for user_id in set(user_ids)])
@@ -0,0 +1,180 @@
+# agente_backend/src/exportacao.py
+"""
+Exportação de gastos em CSV e Parquet, em lotes.
+
+Os gastos são lidos com `iter_range` (cursor do MongoDB em lotes de
+EXPORTACAO_LOTE) e cada lote é escrito assim que chega: no CSV, como um pedaço
+do texto transmitido; no Parquet, como um row group. A memória usada depende do
+tamanho do lote, não do período exportado.
+
+No Parquet, `data` é date32 e `tipo` é uma coluna de dicionário (categórica).
+O pyarrow só é importado quando um Parquet é gerado.
+
+`exportar_usuarios` exporta vários usuários em paralelo, um arquivo por usuário.
+
+No CSV, textos que começam com `=`, `+`, `-`, `@`, tab ou CR ganham um `'` na
+frente, para que planilhas não os executem como fórmulas (injeção de CSV).
+`celula_importada` desfaz o escape na importação do CSV exportado.
+"""
+import os
+import io
+import csv
+import zipfile
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXPORTACAO_LOTE = int(os.getenv("EXPORTACAO_LOTE", "5000"))
+EXPORTACAO_WORKERS = int(os.getenv("EXPORTACAO_WORKERS", "4"))
+
+FORMATOS = ("csv", "parquet")
+COLUNAS = ("id", "data", "tipo", "valor", "descricao")
+# Exportação de vários usuários em um único arquivo (ou pacote) inclui o dono de cada gasto
+COLUNAS_ADMIN = ("user_id", *COLUNAS)
+
+_CAMPOS_LEITURA = ["user_id", "valor", "tipo", "data", "descricao"]
+
+# Início de texto que planilhas interpretam como fórmula
+_INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _celula(valor):
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def celula_importada(texto):
+    """Desfaz o escape de fórmula de uma célula de texto exportada por csv_lote"""
+    if texto.startswith("'") and texto[1:].startswith(_INICIO_FORMULA):
+        return texto[1:]
+    return texto
+
+
+def _linha(gasto, colunas):
+    return [_celula(gasto.get("_id") if coluna == "id" else gasto.get(coluna)) for coluna in colunas]
+
+
+def csv_cabecalho(colunas=COLUNAS):
+    return _csv_texto([colunas])
+
+
+def csv_lote(lote, colunas=COLUNAS):
+    """Linhas CSV de um lote de gastos"""
+    return _csv_texto(_linha(gasto, colunas) for gasto in lote)
+
+
+def _csv_texto(linhas):
+    saida = io.StringIO(newline="")
+    # Com "\r\n" o csv também coloca entre aspas campos com \r (com "\n", só os com \n)
+    csv.writer(saida, lineterminator="\r\n").writerows(linhas)
+    return saida.getvalue()
+
+
+def lotes_gastos(storage, user_id, start_date=None, end_date=None, tipo=None, batch_size=EXPORTACAO_LOTE):
+    """Lotes de gastos do usuário com os campos exportados"""
+    return storage.iter_range(user_id, start_date, end_date, tipo, fields=_CAMPOS_LEITURA, batch_size=batch_size)
+
+
+async def lotes_gastos_async(storage, user_id, start_date=None, end_date=None, tipo=None, batch_size=EXPORTACAO_LOTE):
+    """Versão assíncrona de lotes_gastos"""
+    async for lote in storage.iter_range_async(
+        user_id, start_date, end_date, tipo, fields=_CAMPOS_LEITURA, batch_size=batch_size
+    ):
+        yield lote
+
+
+def escrever_csv(destino, lotes, colunas=COLUNAS):
+    """Escreve os lotes em um arquivo texto aberto; retorna o número de gastos"""
+    destino.write(csv_cabecalho(colunas))
+    total = 0
+    for lote in lotes:
+        destino.write(csv_lote(lote, colunas))
+        total += len(lote)
+    return total
+
+
+def _esquema_parquet(pa, colunas):
+    tipos = {
+        "user_id": pa.int64(),
+        "id": pa.string(),
+        "data": pa.date32(),
+        "tipo": pa.dictionary(pa.int32(), pa.string()),
+        "valor": pa.float64(),
+        "descricao": pa.string()
+    }
+    return pa.schema([(coluna, tipos[coluna]) for coluna in colunas])
+
+
+def _tabela_parquet(pa, esquema, lote):
+    colunas = {
+        "user_id": lambda: pa.array([gasto.get("user_id") for gasto in lote], pa.int64()),
+        "id": lambda: pa.array([gasto.get("_id") for gasto in lote], pa.string()),
+        "data": lambda: pa.array([date.fromisoformat(gasto["data"][:10]) for gasto in lote], pa.date32()),
+        "tipo": lambda: pa.array([gasto.get("tipo") for gasto in lote], pa.string()).dictionary_encode(),
+        "valor": lambda: pa.array([float(gasto["valor"]) for gasto in lote], pa.float64()),
+        "descricao": lambda: pa.array([gasto.get("descricao") for gasto in lote], pa.string())
+    }
+    return pa.Table.from_arrays([colunas[nome]() for nome in esquema.names], schema=esquema)
+
+
+def escrever_parquet(destino, lotes, colunas=COLUNAS):
+    """Escreve os lotes em um Parquet (caminho ou arquivo binário), um row group por lote"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Exportação em Parquet requer o pacote pyarrow")
+
+    esquema = _esquema_parquet(pa, colunas)
+    total = 0
+    with pq.ParquetWriter(destino, esquema, compression="zstd") as escritor:
+        for lote in lotes:
+            escritor.write_table(_tabela_parquet(pa, esquema, lote))
+            total += len(lote)
+    return total
+
+
+def exportar_arquivo(storage, user_id, caminho, formato, start_date=None, end_date=None, tipo=None,
+                     colunas=COLUNAS):
+    """Exporta os gastos de um usuário para `caminho`; retorna o número de gastos"""
+    lotes = lotes_gastos(storage, user_id, start_date, end_date, tipo)
+    if formato == "parquet":
+        return escrever_parquet(caminho, lotes, colunas)
+    if formato == "csv":
+        with open(caminho, "w", encoding="utf-8", newline="") as destino:
+            return escrever_csv(destino, lotes, colunas)
+    raise ValueError(f"Formato desconhecido: {formato}")
+
+
+def exportar_usuarios(storage, user_ids, diretorio, formato, start_date=None, end_date=None,
+                      workers=EXPORTACAO_WORKERS):
+    """
+    Exporta vários usuários em paralelo, um arquivo `gastos_<user_id>.<formato>` por usuário
+
+    Cada worker percorre o cursor de um usuário; o driver do MongoDB é seguro
+    entre threads e o backend SQLite usa uma conexão por thread.
+
+    Returns:
+        Lista de (user_id, caminho, quantidade de gastos), na ordem de `user_ids`
+    """
+    os.makedirs(diretorio, exist_ok=True)
+
+    def exportar(user_id):
+        caminho = os.path.join(diretorio, f"gastos_{user_id}.{formato}")
+        total = exportar_arquivo(storage, user_id, caminho, formato, start_date, end_date, colunas=COLUNAS_ADMIN)
+        return user_id, caminho, total
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(exportar, user_ids))
+
+
+def empacotar(arquivos, caminho_zip):
+    """Junta os arquivos exportados em um zip (Parquet já é comprimido e entra sem compressão)"""
+    with zipfile.ZipFile(caminho_zip, "w") as pacote:
+        for _, caminho, _ in arquivos:
+            compressao = zipfile.ZIP_STORED if caminho.endswith(".parquet") else zipfile.ZIP_DEFLATED
+            pacote.write(caminho, os.path.basename(caminho), compress_type=compressao)
+    return caminho_zip
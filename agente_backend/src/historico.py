@@ -0,0 +1,258 @@
+# agente_backend/src/historico.py
+"""
+Análises do histórico completo de gastos de um usuário, em formato colunar.
+
+O histórico é carregado uma vez em três arrays NumPy (dia, valor e código da
+categoria) e guardado em cache por usuário; médias móveis, percentis,
+sazonalidade e variações mensais são calculados sobre esses arrays com
+operações vetorizadas (bincount, cumsum, lexsort), sem laços por gasto.
+
+As rotas que gravam ou excluem gastos devem chamar `historicos.invalidar`.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HISTORICO_CACHE_TTL = int(os.getenv("HISTORICO_CACHE_TTL", "600"))
+HISTORICO_CACHE_TAMANHO = int(os.getenv("HISTORICO_CACHE_TAMANHO", "500"))
+
+# Janelas das médias móveis, em meses
+JANELAS_MEDIA = (3, 6, 12)
+PERCENTIS = (50, 75, 90, 95)
+DIAS_SEMANA = ("segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo")
+
+
+class HistoricoGastos:
+    """
+    Histórico de um usuário em colunas
+
+    Atributos:
+        dias: datetime64[D] de cada gasto
+        valores: float64
+        categorias: int16, índice em `nomes_categorias`
+    """
+
+    __slots__ = ("dias", "valores", "categorias", "nomes_categorias")
+
+    def __init__(self, datas, valores, tipos):
+        self.dias = np.array(datas, dtype="datetime64[D]")
+        self.valores = np.asarray(valores, dtype=np.float64)
+        nomes, codigos = np.unique(np.asarray(tipos, dtype=object).astype(str), return_inverse=True)
+        self.nomes_categorias = [str(nome) for nome in nomes]
+        self.categorias = codigos.astype(np.int16)
+
+    def __len__(self):
+        return len(self.valores)
+
+    def _meses(self):
+        """Meses desde 1970 de cada gasto e o primeiro mês do histórico"""
+        meses = self.dias.astype("datetime64[M]").astype(np.int64)
+        return meses, int(meses.min())
+
+    @staticmethod
+    def _rotulo_mes(mes):
+        return str(np.datetime64(int(mes), "M"))
+
+    def totais_mensais(self):
+        """(meses desde 1970, total de cada mês), incluindo meses sem gastos"""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        meses, primeiro = self._meses()
+        totais = np.bincount(meses - primeiro, weights=self.valores)
+        return np.arange(primeiro, primeiro + len(totais)), totais
+
+    def totais_mensais_por_categoria(self):
+        """(meses, matriz meses x categorias)"""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty((0, len(self.nomes_categorias)))
+        meses, primeiro = self._meses()
+        n_categorias = len(self.nomes_categorias)
+        n_meses = int(meses.max()) - primeiro + 1
+        matriz = np.bincount(
+            (meses - primeiro) * n_categorias + self.categorias,
+            weights=self.valores,
+            minlength=n_meses * n_categorias
+        ).reshape(n_meses, n_categorias)
+        return np.arange(primeiro, primeiro + n_meses), matriz
+
+
+def _media_movel(serie, janela):
+    """Média dos últimos `janela` meses em cada posição (NaN enquanto não há meses suficientes)"""
+    acumulado = np.concatenate(([0.0], np.cumsum(serie)))
+    medias = np.full(len(serie), np.nan)
+    if len(serie) >= janela:
+        medias[janela - 1:] = (acumulado[janela:] - acumulado[:-janela]) / janela
+    return medias
+
+
+def _variacao_percentual(atual, anterior):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(anterior > 0, (atual - anterior) / anterior * 100, np.nan)
+
+
+def _numero(valor, casas=2):
+    """float arredondado, ou None para NaN (JSON não tem NaN)"""
+    valor = float(valor)
+    return None if np.isnan(valor) else round(valor, casas)
+
+
+def serie_mensal(historico, meses=None):
+    """
+    Total de cada mês com médias móveis de 3/6/12 meses e variação mês a mês
+
+    As médias usam o histórico inteiro; `meses` só limita quantos meses voltam.
+    """
+    rotulos, totais = historico.totais_mensais()
+    if not len(totais):
+        return []
+
+    medias = {janela: _media_movel(totais, janela) for janela in JANELAS_MEDIA}
+    anterior = np.concatenate(([np.nan], totais[:-1]))
+    delta = totais - anterior
+    delta_pct = _variacao_percentual(totais, anterior)
+
+    inicio = max(0, len(totais) - meses) if meses else 0
+    return [
+        {
+            "mes": HistoricoGastos._rotulo_mes(rotulos[i]),
+            "total": _numero(totais[i]),
+            **{f"media_{janela}m": _numero(medias[janela][i]) for janela in JANELAS_MEDIA},
+            "variacao": _numero(delta[i]),
+            "variacao_percentual": _numero(delta_pct[i], 1)
+        }
+        for i in range(inicio, len(totais))
+    ]
+
+
+def estatisticas_categorias(historico):
+    """
+    Por categoria: quantidade, total, percentis do valor de cada gasto e
+    variação do último mês do histórico em relação ao anterior
+    """
+    if not len(historico):
+        return []
+
+    # Valores ordenados por (categoria, valor): cada categoria vira uma fatia contígua
+    ordem = np.lexsort((historico.valores, historico.categorias))
+    valores_ordenados = historico.valores[ordem]
+    contagens = np.bincount(historico.categorias, minlength=len(historico.nomes_categorias))
+    limites = np.concatenate(([0], np.cumsum(contagens)))
+    totais = np.bincount(historico.categorias, weights=historico.valores, minlength=len(contagens))
+
+    _, matriz = historico.totais_mensais_por_categoria()
+    ultimo = matriz[-1]
+    penultimo = matriz[-2] if len(matriz) > 1 else np.zeros_like(ultimo)
+    delta_pct = _variacao_percentual(ultimo, penultimo)
+
+    resultado = []
+    for codigo, nome in enumerate(historico.nomes_categorias):
+        fatia = valores_ordenados[limites[codigo]:limites[codigo + 1]]
+        percentis = np.percentile(fatia, PERCENTIS) if len(fatia) else np.full(len(PERCENTIS), np.nan)
+        resultado.append({
+            "categoria": nome,
+            "quantidade": int(contagens[codigo]),
+            "total": _numero(totais[codigo]),
+            "percentis": {f"p{p}": _numero(v) for p, v in zip(PERCENTIS, percentis)},
+            "ultimo_mes": _numero(ultimo[codigo]),
+            "mes_anterior": _numero(penultimo[codigo]),
+            "variacao_percentual": _numero(delta_pct[codigo], 1)
+        })
+    return sorted(resultado, key=lambda item: item["total"], reverse=True)
+
+
+def sazonalidade(historico):
+    """
+    Índices sazonais: gasto médio de cada mês do ano e de cada dia da semana,
+    divididos pela média geral (1.0 = típico, 1.2 = 20% acima do normal)
+    """
+    rotulos, totais = historico.totais_mensais()
+    if not len(totais):
+        return {"meses": [], "dias_semana": []}
+
+    # Mês do ano (0-11) de cada mês do histórico, e média por mês do ano
+    mes_do_ano = rotulos % 12
+    ocorrencias = np.bincount(mes_do_ano, minlength=12)
+    soma_por_mes = np.bincount(mes_do_ano, weights=totais, minlength=12)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media_por_mes = np.where(ocorrencias > 0, soma_por_mes / ocorrencias, np.nan)
+    indice_mes = media_por_mes / totais.mean() if totais.mean() > 0 else np.full(12, np.nan)
+
+    # 1970-01-01 foi uma quinta-feira: (dias + 3) % 7 dá 0 = segunda
+    dia_semana = (historico.dias.astype(np.int64) + 3) % 7
+    total_dias = int((historico.dias.max() - historico.dias.min()).astype(np.int64)) + 1
+    # Quantas vezes cada dia da semana aparece no intervalo do histórico
+    primeiro = (int(historico.dias.min().astype(np.int64)) + 3) % 7
+    ocorrencias_dia = np.full(7, total_dias // 7)
+    ocorrencias_dia[(primeiro + np.arange(total_dias % 7)) % 7] += 1
+    media_por_dia = np.bincount(dia_semana, weights=historico.valores, minlength=7) / ocorrencias_dia
+    media_diaria = historico.valores.sum() / total_dias
+    indice_dia = media_por_dia / media_diaria if media_diaria > 0 else np.full(7, np.nan)
+
+    return {
+        "meses": [
+            {"mes": i + 1, "media": _numero(media_por_mes[i]), "indice": _numero(indice_mes[i], 3),
+             "anos": int(ocorrencias[i])}
+            for i in range(12)
+        ],
+        "dias_semana": [
+            {"dia": DIAS_SEMANA[i], "media": _numero(media_por_dia[i]), "indice": _numero(indice_dia[i], 3)}
+            for i in range(7)
+        ]
+    }
+
+
+def carregar_historico(storage, user_id, batch_size=5000):
+    """Lê todos os gastos do usuário (somente data, valor e tipo) em colunas"""
+    datas, valores, tipos = [], [], []
+    for lote in storage.iter_range(user_id, fields=["data", "valor", "tipo"], batch_size=batch_size):
+        for gasto in lote:
+            datas.append(gasto["data"])
+            valores.append(gasto["valor"])
+            tipos.append(gasto["tipo"])
+    return HistoricoGastos(datas, valores, tipos)
+
+
+class CacheHistoricos:
+    """Históricos por usuário, LRU com expiração, protegido por lock"""
+
+    def __init__(self, ttl=HISTORICO_CACHE_TTL, tamanho_maximo=HISTORICO_CACHE_TAMANHO):
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo
+        self._itens = OrderedDict()
+        # Contador de invalidações por usuário: um carregamento que começou antes
+        # de uma gravação não deve ser guardado
+        self._invalidacoes = {}
+        self._lock = threading.Lock()
+
+    def obter(self, storage, user_id):
+        """Histórico do usuário, carregado do armazenamento se não estiver em cache"""
+        with self._lock:
+            item = self._itens.get(user_id)
+            if item is not None and item[1] > time.monotonic():
+                self._itens.move_to_end(user_id)
+                return item[0]
+            invalidacoes = self._invalidacoes.get(user_id, 0)
+
+        historico = carregar_historico(storage, user_id)
+        with self._lock:
+            if self._invalidacoes.get(user_id, 0) != invalidacoes:
+                return historico
+            self._itens[user_id] = (historico, time.monotonic() + self.ttl)
+            self._itens.move_to_end(user_id)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+        return historico
+
+    def invalidar(self, user_id):
+        with self._lock:
+            self._itens.pop(user_id, None)
+            self._invalidacoes[user_id] = self._invalidacoes.get(user_id, 0) + 1
+
+
+historicos = CacheHistoricos()
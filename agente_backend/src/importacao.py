@@ -0,0 +1,321 @@
+# agente_backend/src/importacao.py
+"""
+Importação de extratos bancários (CSV e OFX) em fluxo.
+
+O arquivo é lido linha a linha (CSV) ou em blocos (OFX) e os gastos são
+gravados em lotes de IMPORTACAO_LOTE com `save_many` (insert_many no MongoDB):
+a memória usada não depende do tamanho do extrato.
+
+Cada gasto importado recebe um `hash_importacao` derivado do conteúdo da
+transação, com índice único por usuário. Antes de gravar um lote, os hashes que
+o usuário já tem são buscados em uma única consulta coberta pelo índice, então
+reimportar um extrato que se sobrepõe a um anterior quase não grava nada. O
+índice único continua barrando duplicatas de importações simultâneas.
+
+A categoria vem do categorizador local (`parser_local.categorizar`), sem LLM.
+"""
+import os
+import re
+import csv
+import html
+import codecs
+import hashlib
+from datetime import datetime
+from dotenv import load_dotenv
+
+from src.exportacao import celula_importada
+from src.parser_local import categorizar, _normalizar
+from src.storage import ERRO_DUPLICADO
+
+load_dotenv()
+
+IMPORTACAO_LOTE = int(os.getenv("IMPORTACAO_LOTE", "500"))
+# Tamanho máximo do arquivo enviado para /importar-extrato
+IMPORTACAO_MAX_BYTES = int(os.getenv("IMPORTACAO_MAX_BYTES", str(50 * 1024 * 1024)))
+# Quantas mensagens de erro por linha entram no relatório
+IMPORTACAO_MAX_ERROS = 20
+
+FORMATOS = ("csv", "ofx")
+
+# Nomes de coluna (normalizados) aceitos no cabeçalho do CSV
+COLUNAS_DATA = ("data", "date", "data lancamento", "data da transacao", "data movimento", "data compra")
+COLUNAS_VALOR = ("valor", "amount", "valor (r$)", "valor r$", "quantia", "montante")
+# Extratos com colunas separadas de débito e crédito: o débito é sempre gasto
+COLUNAS_DEBITO = ("debito", "debito (r$)", "saida", "saidas")
+COLUNAS_DESCRICAO = (
+    "descricao", "title", "historico", "lancamento", "estabelecimento", "memo", "description", "detalhes"
+)
+
+_FORMATOS_DATA = ("%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%Y", "%d.%m.%Y")
+_RE_TAG_OFX = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+_TAMANHO_BLOCO = 64 * 1024
+
+
+def _detectar_codificacao(arquivo):
+    """UTF-8 (com ou sem BOM) ou, se o início do arquivo não for UTF-8 válido, cp1252"""
+    inicio = arquivo.read(_TAMANHO_BLOCO)
+    arquivo.seek(0)
+    try:
+        # final=False: um caractere cortado no fim da amostra não é erro
+        codecs.getincrementaldecoder("utf-8")().decode(inicio, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def _converter_valor(texto):
+    """
+    Converte "1.234,56", "-1234.56", "R$ 12,00" ou "(12,00)" em float
+
+    Com ponto e vírgula, o último separador é o decimal; só vírgula é decimal;
+    só ponto é decimal, a menos que apareça mais de uma vez (milhar).
+    """
+    texto = (texto or "").strip().replace("R$", "").replace(" ", "")
+    negativo = texto.startswith("(") and texto.endswith(")")
+    texto = texto.strip("()")
+    if "," in texto and "." in texto:
+        if texto.rfind(",") > texto.rfind("."):
+            texto = texto.replace(".", "").replace(",", ".")
+        else:
+            texto = texto.replace(",", "")
+    elif "," in texto:
+        texto = texto.replace(",", ".")
+    elif texto.count(".") > 1:
+        texto = texto.replace(".", "")
+    valor = float(texto)
+    return -valor if negativo else valor
+
+
+def _converter_data(texto):
+    """Data do extrato no formato YYYY-MM-DD"""
+    texto = (texto or "").strip()
+    for formato in _FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto[:10], formato).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida: {texto!r}")
+
+
+def _hash_conteudo(*partes):
+    return hashlib.sha256("|".join(str(parte) for parte in partes).encode("utf-8")).hexdigest()[:32]
+
+
+class _Ocorrencias:
+    """
+    Numera transações idênticas (mesma data, valor e descrição) dentro do extrato
+
+    Dois cafés iguais no mesmo dia são gastos diferentes: o número da ocorrência
+    entra no hash. A contagem só guarda a data corrente, então o extrato precisa
+    ter as transações de cada dia juntas (como todo extrato bancário tem).
+    """
+
+    def __init__(self):
+        self._data = None
+        self._contagem = {}
+
+    def proxima(self, data, chave):
+        if data != self._data:
+            self._data = data
+            self._contagem = {}
+        self._contagem[chave] = self._contagem.get(chave, 0) + 1
+        return self._contagem[chave]
+
+
+def _gasto(user_id, valor, data, descricao, hash_importacao):
+    tipo, _ = categorizar(descricao)
+    return {
+        "user_id": user_id,
+        "valor": round(abs(valor), 2),
+        "tipo": tipo,
+        "data": data,
+        "descricao": descricao or "Importado do extrato",
+        "hash_importacao": hash_importacao
+    }
+
+
+def _coluna(cabecalho, nomes):
+    for indice, nome in enumerate(cabecalho):
+        if _normalizar(nome.strip()) in nomes:
+            return indice
+    return None
+
+
+def ler_csv(arquivo, user_id, despesas="negativas"):
+    """
+    Gera (número da linha, gasto ou None, erro ou None) para cada linha do CSV
+
+    O gasto é None (sem erro) nas linhas que não são despesas, como créditos e
+    pagamentos. `despesas` indica o sinal dos gastos na coluna de valor:
+    "negativas" em extratos de conta, "positivas" em faturas de cartão.
+    """
+    texto = codecs.getreader(_detectar_codificacao(arquivo))(arquivo)
+    primeira = texto.readline()
+    delimitador = max((";", ",", "\t"), key=primeira.count)
+    cabecalho = next(csv.reader([primeira], delimiter=delimitador), [])
+
+    col_data = _coluna(cabecalho, COLUNAS_DATA)
+    col_valor = _coluna(cabecalho, COLUNAS_VALOR)
+    col_debito = _coluna(cabecalho, COLUNAS_DEBITO)
+    col_descricao = _coluna(cabecalho, COLUNAS_DESCRICAO)
+    if col_data is None or (col_valor is None and col_debito is None):
+        raise ValueError("Cabeçalho do CSV sem colunas de data e valor reconhecidas")
+
+    ocorrencias = _Ocorrencias()
+    for numero, linha in enumerate(csv.reader(texto, delimiter=delimitador), start=2):
+        if not any(campo.strip() for campo in linha):
+            continue
+        try:
+            data = _converter_data(linha[col_data])
+            if col_valor is not None and linha[col_valor].strip():
+                valor = _converter_valor(linha[col_valor])
+                eh_despesa = valor < 0 if despesas == "negativas" else valor > 0
+            else:
+                valor = _converter_valor(linha[col_debito]) if col_debito is not None else 0
+                eh_despesa = valor != 0
+        except (IndexError, ValueError) as e:
+            yield numero, None, str(e)
+            continue
+
+        if not eh_despesa:
+            yield numero, None, None
+            continue
+
+        descricao = linha[col_descricao].strip() if col_descricao is not None and col_descricao < len(linha) else ""
+        # CSV exportado pela própria API (src/exportacao.py) tem fórmulas escapadas
+        descricao = celula_importada(descricao)
+        chave = (round(abs(valor), 2), _normalizar(descricao))
+        hash_importacao = _hash_conteudo("csv", data, *chave, ocorrencias.proxima(data, chave))
+        yield numero, _gasto(user_id, valor, data, descricao, hash_importacao), None
+
+
+def _tags_ofx(texto):
+    """Gera (fechamento, tag, valor) lendo o OFX em blocos (SGML 1.x ou XML 2.x)"""
+    resto = ""
+    while True:
+        bloco = texto.read(_TAMANHO_BLOCO)
+        buffer = resto + bloco
+        # Uma tag pode estar cortada no fim do bloco: fica para a próxima leitura
+        limite = buffer.rfind("<") if bloco else len(buffer)
+        for encontrada in _RE_TAG_OFX.finditer(buffer, 0, max(limite, 0)):
+            fechamento, tag, valor = encontrada.groups()
+            yield fechamento == "/", tag.upper(), html.unescape(valor.strip())
+        if not bloco:
+            return
+        resto = buffer[max(limite, 0):]
+
+
+def ler_ofx(arquivo, user_id, despesas="negativas"):
+    """
+    Gera (número da transação, gasto ou None, erro ou None) para cada STMTTRN
+
+    No OFX os débitos têm TRNAMT negativo tanto em contas quanto em cartões;
+    `despesas="positivas"` inverte o sinal para arquivos que fogem do padrão.
+    O hash usa a conta (ACCTID) e o FITID, identificador da transação no banco.
+    """
+    texto = codecs.getreader(_detectar_codificacao(arquivo))(arquivo)
+    conta = ""
+    transacao = None
+    numero = 0
+    ocorrencias = _Ocorrencias()
+
+    for fechamento, tag, valor in _tags_ofx(texto):
+        if tag == "STMTTRN":
+            if not fechamento:
+                transacao = {}
+                continue
+            if transacao is None:
+                continue
+            numero += 1
+            atual, transacao = transacao, None
+            try:
+                data = _converter_data(f"{atual['DTPOSTED'][:4]}-{atual['DTPOSTED'][4:6]}-{atual['DTPOSTED'][6:8]}")
+                quantia = _converter_valor(atual["TRNAMT"])
+            except (KeyError, ValueError) as e:
+                yield numero, None, f"transação inválida: {e}"
+                continue
+
+            if not (quantia < 0 if despesas == "negativas" else quantia > 0):
+                yield numero, None, None
+                continue
+
+            descricao = atual.get("MEMO") or atual.get("NAME") or ""
+            if atual.get("FITID"):
+                hash_importacao = _hash_conteudo("ofx", conta, atual["FITID"])
+            else:
+                chave = (round(abs(quantia), 2), _normalizar(descricao))
+                hash_importacao = _hash_conteudo("ofx", conta, data, *chave, ocorrencias.proxima(data, chave))
+            yield numero, _gasto(user_id, quantia, data, descricao, hash_importacao), None
+        elif fechamento:
+            continue
+        elif transacao is not None:
+            transacao[tag] = valor
+        elif tag == "ACCTID":
+            conta = valor
+
+
+LEITORES = {"csv": ler_csv, "ofx": ler_ofx}
+
+
+def importar_extrato(arquivo, user_id, storage, formato, despesas="negativas", ao_salvar=None,
+                     tamanho_lote=IMPORTACAO_LOTE):
+    """
+    Importa um extrato aberto em modo binário
+
+    Args:
+        arquivo: arquivo binário posicionável (arquivo local ou upload em disco)
+        storage: backend de gastos (ExpenseStorage)
+        formato: "csv" ou "ofx"
+        despesas: sinal dos gastos no arquivo ("negativas" ou "positivas")
+        ao_salvar: função chamada com a lista de gastos gravados de cada lote
+
+    Returns:
+        Relatório com linhas lidas, importadas, duplicadas, ignoradas (não são
+        despesas), inválidas e as primeiras mensagens de erro
+    """
+    if formato not in LEITORES:
+        raise ValueError(f"Formato desconhecido: {formato}")
+
+    relatorio = {"lidos": 0, "importados": 0, "duplicados": 0, "ignorados": 0, "invalidos": 0, "erros": []}
+
+    def registrar_erro(mensagem):
+        relatorio["invalidos"] += 1
+        if len(relatorio["erros"]) < IMPORTACAO_MAX_ERROS:
+            relatorio["erros"].append(mensagem)
+
+    def gravar(lote):
+        existentes = storage.existing_import_hashes(user_id, [gasto["hash_importacao"] for gasto in lote])
+        novos, vistos = [], set(existentes)
+        for gasto in lote:
+            # Também descarta repetições dentro do próprio lote (ex.: FITID repetido no arquivo)
+            if gasto["hash_importacao"] not in vistos:
+                vistos.add(gasto["hash_importacao"])
+                novos.append(gasto)
+        relatorio["duplicados"] += len(lote) - len(novos)
+
+        salvos, erros = storage.save_many(novos)
+        for indice, mensagem in erros.items():
+            if mensagem == ERRO_DUPLICADO:
+                relatorio["duplicados"] += 1
+            else:
+                registrar_erro(f"{novos[indice]['data']} {novos[indice]['descricao']}: {mensagem}")
+        relatorio["importados"] += len(salvos)
+        if salvos and ao_salvar:
+            ao_salvar(list(salvos.values()))
+
+    lote = []
+    for numero, gasto, erro in LEITORES[formato](arquivo, user_id, despesas):
+        relatorio["lidos"] += 1
+        if erro:
+            registrar_erro(f"{'linha' if formato == 'csv' else 'transação'} {numero}: {erro}")
+        elif gasto is None:
+            relatorio["ignorados"] += 1
+        else:
+            lote.append(gasto)
+            if len(lote) >= tamanho_lote:
+                gravar(lote)
+                lote = []
+    if lote:
+        gravar(lote)
+
+    return relatorio
@@ -0,0 +1,150 @@
+# agente_backend/src/llm_cache.py
+"""
+Cache das respostas do GPT para processar_texto e processar_consulta.
+
+Um LRU em memória (limitado) fica na frente de uma tabela SQLite local com TTL,
+para que frases repetidas ("uber 20", "gastos deste mês") não gerem novas
+chamadas à API, inclusive entre reinícios do servidor.
+
+O arquivo (LLM_CACHE_DB, padrão agente_backend/llm_cache.db, independente do
+diretório atual) só é aberto no primeiro uso ou por `conectar` no lifespan da
+API: importar o módulo, como fazem os managers e benchmarks, não cria bancos.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_DB = os.getenv(
+    "LLM_CACHE_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm_cache.db")
+)
+LLM_CACHE_TAMANHO = int(os.getenv("LLM_CACHE_TAMANHO", "1024"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 60 * 60)))
+
+
+def normalizar_texto(texto):
+    """Minúsculas, espaços colapsados e sem pontuação nas pontas"""
+    return re.sub(r"\s+", " ", texto.lower()).strip(" .!?;,")
+
+
+def chave_cache(tipo, texto, data_referencia):
+    """
+    Gera a chave do cache. A data de referência faz parte da chave porque
+    expressões como "hoje" ou "este mês" dependem do dia da chamada.
+    """
+    bruto = f"{tipo}|{data_referencia}|{normalizar_texto(texto)}"
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """LRU em memória na frente de uma tabela SQLite com expiração"""
+
+    def __init__(self, caminho_db=LLM_CACHE_DB, tamanho_maximo=LLM_CACHE_TAMANHO, ttl=LLM_CACHE_TTL):
+        self.caminho_db = caminho_db
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.acertos_memoria = 0
+        self.acertos_persistentes = 0
+        self.falhas = 0
+
+    def conectar(self):
+        """Abre o banco (no lifespan da API; as operações também abrem no primeiro uso)"""
+        with self._lock:
+            self._conexao()
+
+    def fechar(self):
+        """Fecha o banco; o LRU em memória é mantido e o banco reabre no próximo uso"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _conexao(self):
+        # Chamado com self._lock adquirido
+        if self._conn is None:
+            conn = sqlite3.connect(self.caminho_db, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira_em REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def obter(self, chave):
+        """Retorna o valor em cache (dict) ou None se ausente/expirado"""
+        agora = time.time()
+        with self._lock:
+            item = self._memoria.get(chave)
+            if item and item[1] > agora:
+                self._memoria.move_to_end(chave)
+                self.acertos_memoria += 1
+                return json.loads(item[0])
+
+            linha = self._conexao().execute(
+                "SELECT valor, expira_em FROM llm_cache WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha and linha[1] > agora:
+                self._guardar_memoria(chave, linha[0], linha[1])
+                self.acertos_persistentes += 1
+                return json.loads(linha[0])
+
+            self._memoria.pop(chave, None)
+            self.falhas += 1
+            return None
+
+    def salvar(self, chave, valor, ttl=None):
+        """Guarda um valor (dict serializável) em memória e no SQLite"""
+        serializado = json.dumps(valor, ensure_ascii=False)
+        expira_em = time.time() + (ttl or self.ttl)
+        with self._lock:
+            self._guardar_memoria(chave, serializado, expira_em)
+            conn = self._conexao()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (chave, valor, expira_em) VALUES (?, ?, ?)",
+                (chave, serializado, expira_em)
+            )
+            conn.commit()
+
+    def limpar_expirados(self):
+        """Remove do SQLite as entradas vencidas; retorna quantas foram removidas"""
+        with self._lock:
+            conn = self._conexao()
+            cursor = conn.execute("DELETE FROM llm_cache WHERE expira_em <= ?", (time.time(),))
+            conn.commit()
+            return cursor.rowcount
+
+    def estatisticas(self):
+        """Contadores de acerto/falha; cada acerto é uma chamada à API evitada"""
+        with self._lock:
+            acertos = self.acertos_memoria + self.acertos_persistentes
+            total = acertos + self.falhas
+            return {
+                "acertos_memoria": self.acertos_memoria,
+                "acertos_persistentes": self.acertos_persistentes,
+                "falhas": self.falhas,
+                "chamadas_evitadas": acertos,
+                "taxa_acerto": round(acertos / total, 4) if total else 0.0,
+                "itens_memoria": len(self._memoria)
+            }
+
+    def _guardar_memoria(self, chave, serializado, expira_em):
+        self._memoria[chave] = (serializado, expira_em)
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.tamanho_maximo:
+            self._memoria.popitem(last=False)
+
+
+# Instância usada pelo processamento de texto (o banco é aberto no primeiro uso)
+cache = LLMCache()
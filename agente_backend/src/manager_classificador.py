@@ -0,0 +1,149 @@
+"""
+Avaliação offline do classificador de categoria aprendido (src/classificador.py)
+contra o histórico gravado.
+
+Para cada usuário, os gastos são percorridos em ordem de data: cada gasto é
+classificado com o que o modelo sabia até ali (modelo do usuário com os gastos
+anteriores e modelo global com os demais usuários) e depois aprendido, como
+acontece na API. O relatório mostra, por limiar de confiança, a cobertura (gastos
+em que o GPT seria dispensado para a categoria) e a precisão nesses gastos, ao
+lado das palavras-chave do interpretador local.
+
+A categoria gravada é usada como verdade; gastos categorizados pelas próprias
+palavras-chave favorecem essa linha de comparação.
+
+Uso (a partir de agente_backend/):
+
+    python -m src.manager_classificador                 # todos os usuários
+    python -m src.manager_classificador --user-id 3
+    python -m src.manager_classificador --limiares 0.8 0.9 0.95
+"""
+import time
+import argparse
+
+from src.db import SessionLocal
+from src.models import User
+from src.storage import get_storage
+from src.parser_local import CATEGORIAS, categorizar
+from src.classificador import (
+    ModeloNB, palavras, classificar, CLASSIFICADOR_CONFIANCA_MINIMA, CLASSIFICADOR_HISTORICO_MAX
+)
+
+
+def carregar(storage, user_id, maximo):
+    """Gastos do usuário com categoria conhecida, do mais antigo para o mais recente"""
+    gastos = []
+    for lote in storage.iter_range(user_id, fields=["tipo", "descricao", "data"], batch_size=1000):
+        gastos.extend(gasto for gasto in lote if gasto.get("tipo") in CATEGORIAS)
+        if len(gastos) >= maximo:
+            break
+    gastos = gastos[:maximo]
+    gastos.sort(key=lambda gasto: str(gasto.get("data")))
+    return gastos
+
+
+def _modelo(gastos):
+    modelo = ModeloNB()
+    for gasto in gastos:
+        modelo.adicionar(palavras(gasto.get("descricao")), gasto["tipo"])
+    return modelo
+
+
+def avaliar(historicos):
+    """
+    Classificações sequenciais de todos os usuários
+
+    Returns:
+        Lista de (categoria real, categoria prevista ou None, confiança,
+        categoria das palavras-chave, confiança das palavras-chave) e o tempo
+        médio por classificação em microssegundos
+    """
+    completos = {user_id: _modelo(gastos) for user_id, gastos in historicos.items()}
+    global_ = ModeloNB()
+    for modelo in completos.values():
+        global_.somar(modelo)
+
+    resultados, duracao = [], 0.0
+    for user_id, gastos in historicos.items():
+        # Global sem o próprio usuário (as contagens são somas)
+        global_.somar(completos[user_id], -1)
+        usuario = ModeloNB()
+        for gasto in gastos:
+            tokens = palavras(gasto.get("descricao"))
+            inicio = time.perf_counter()
+            previsto, confianca = classificar(tokens, usuario, global_) if tokens else (None, 0.0)
+            duracao += time.perf_counter() - inicio
+            palavra_chave, confianca_chave = categorizar(gasto.get("descricao"))
+            resultados.append((gasto["tipo"], previsto, confianca, palavra_chave, confianca_chave))
+            usuario.adicionar(tokens, gasto["tipo"])
+        global_.somar(completos[user_id])
+
+    return resultados, (duracao / len(resultados) * 1e6 if resultados else 0.0)
+
+
+def _linha(nome, cobertos, acertos, total):
+    cobertura = cobertos / total * 100 if total else 0.0
+    precisao = acertos / cobertos * 100 if cobertos else 0.0
+    return f"  {nome:<28} cobertura {cobertura:5.1f}% ({cobertos})  precisão {precisao:5.1f}%"
+
+
+def relatorio(resultados, limiares, limiar_atual):
+    total = len(resultados)
+    print(f"Gastos avaliados: {total}")
+    if not total:
+        return
+
+    previstos = [r for r in resultados if r[1] is not None]
+    acertos = sum(1 for r in previstos if r[0] == r[1])
+    print(_linha("classificador (qualquer)", len(previstos), acertos, total))
+    for limiar in limiares:
+        cobertos = [r for r in previstos if r[2] >= limiar]
+        nome = f"classificador >= {limiar:.2f}" + (" *" if limiar == limiar_atual else "")
+        print(_linha(nome, len(cobertos), sum(1 for r in cobertos if r[0] == r[1]), total))
+
+    # Palavras-chave: confiança 0.4 é uma palavra-chave sem empate
+    chave = [r for r in resultados if r[4] >= 0.4]
+    print(_linha("palavras-chave (sem empate)", len(chave), sum(1 for r in chave if r[0] == r[3]), total))
+    print(_linha("palavras-chave (qualquer)", total, sum(1 for r in resultados if r[0] == r[3]), total))
+
+    print(f"Por categoria (limiar {limiar_atual:.2f}):")
+    for categoria in CATEGORIAS:
+        da_categoria = [r for r in resultados if r[0] == categoria]
+        if not da_categoria:
+            continue
+        cobertos = [r for r in da_categoria if r[1] is not None and r[2] >= limiar_atual]
+        print(_linha(categoria, len(cobertos), sum(1 for r in cobertos if r[0] == r[1]), len(da_categoria)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avalia o classificador de categoria com o histórico gravado")
+    parser.add_argument("--user-id", type=int, default=None, help="ID do usuário (padrão: todos)")
+    parser.add_argument(
+        "--limiares", type=float, nargs="+", default=[0.5, 0.7, 0.8, 0.9, 0.95, 0.99],
+        help="Limiares de confiança comparados"
+    )
+    parser.add_argument("--max-gastos", type=int, default=CLASSIFICADOR_HISTORICO_MAX, help="Gastos por usuário")
+    args = parser.parse_args()
+
+    if args.user_id is not None:
+        user_ids = [args.user_id]
+    else:
+        db = SessionLocal()
+        try:
+            user_ids = [user_id for (user_id,) in db.query(User.id).order_by(User.id).all()]
+        finally:
+            db.close()
+
+    storage = get_storage()
+    inicio = time.perf_counter()
+    historicos = {user_id: carregar(storage, user_id, args.max_gastos) for user_id in user_ids}
+    print(f"{len(historicos)} usuários carregados em {time.perf_counter() - inicio:.1f}s")
+
+    resultados, microssegundos = avaliar(historicos)
+    limiares = sorted(set(args.limiares) | {CLASSIFICADOR_CONFIANCA_MINIMA})
+    relatorio(resultados, limiares, CLASSIFICADOR_CONFIANCA_MINIMA)
+    print(f"Tempo médio por classificação: {microssegundos:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
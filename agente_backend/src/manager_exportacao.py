@@ -0,0 +1,61 @@
+"""
+Exporta gastos para CSV ou Parquet, sem passar pela API.
+
+Uso (a partir de agente_backend/):
+
+    python -m src.manager_exportacao --user-id 3 --saida gastos.csv
+    python -m src.manager_exportacao --user-id 3 --formato parquet --saida gastos.parquet --inicio 2024-01-01
+    python -m src.manager_exportacao --todos --formato parquet --saida exportacao/ --workers 8
+
+Com --todos, cada usuário vira um arquivo gastos_<id>.<formato> no diretório de
+saída, exportados em paralelo.
+"""
+import os
+import time
+import argparse
+
+from src.db import SessionLocal
+from src.models import User
+from src.exportacao import FORMATOS, EXPORTACAO_WORKERS, exportar_arquivo, exportar_usuarios
+from src.storage import get_storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta gastos para CSV ou Parquet")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--user-id", type=int, help="ID do usuário")
+    grupo.add_argument("--todos", action="store_true", help="Todos os usuários, um arquivo por usuário")
+    parser.add_argument("--saida", required=True, help="Arquivo de saída (ou diretório, com --todos)")
+    parser.add_argument("--formato", choices=FORMATOS, default=None, help="Padrão: pela extensão ou csv")
+    parser.add_argument("--inicio", default=None, help="Data inicial (YYYY-MM-DD)")
+    parser.add_argument("--fim", default=None, help="Data final (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=EXPORTACAO_WORKERS, help="Usuários exportados em paralelo")
+    args = parser.parse_args()
+
+    extensao = os.path.splitext(args.saida)[1].lower().lstrip(".")
+    formato = args.formato or (extensao if extensao in FORMATOS else "csv")
+    storage = get_storage()
+    inicio = time.perf_counter()
+
+    if args.user_id is not None:
+        total = exportar_arquivo(storage, args.user_id, args.saida, formato, args.inicio, args.fim)
+        print(f"{total} gastos exportados para {args.saida} em {time.perf_counter() - inicio:.1f}s")
+        return
+
+    db = SessionLocal()
+    try:
+        user_ids = [user_id for (user_id,) in db.query(User.id).order_by(User.id).all()]
+    finally:
+        db.close()
+
+    arquivos = exportar_usuarios(storage, user_ids, args.saida, formato, args.inicio, args.fim, workers=args.workers)
+    for user_id, caminho, total in arquivos:
+        print(f"- usuário {user_id}: {total} gastos -> {caminho}")
+    print(
+        f"{len(arquivos)} usuários, {sum(total for _, _, total in arquivos)} gastos "
+        f"em {time.perf_counter() - inicio:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Importa um extrato bancário (CSV ou OFX) para um usuário, sem passar pela API.
+
+Uso (a partir de agente_backend/):
+
+    python -m src.manager_importacao extrato.ofx --user-id 3
+    python -m src.manager_importacao fatura.csv --user-id 3 --despesas positivas
+    python -m src.manager_importacao extrato.txt --user-id 3 --formato csv
+
+Reimportar um extrato (ou um que se sobrepõe a outro) não duplica gastos. A
+gravação incrementa a versão dos dados do usuário no banco, e a API no ar deixa
+de servir as respostas em cache (ETags) em até VERSOES_TTL_S segundos. A
+projeção e as análises são recalculadas quando os caches delas expiram.
+"""
+import os
+import argparse
+
+from src.importacao import FORMATOS, importar_extrato
+from src.storage import get_storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa um extrato bancário CSV ou OFX")
+    parser.add_argument("arquivo", help="Caminho do extrato")
+    parser.add_argument("--user-id", type=int, required=True, help="ID do usuário dono dos gastos")
+    parser.add_argument("--formato", choices=FORMATOS, default=None, help="Padrão: pela extensão do arquivo")
+    parser.add_argument(
+        "--despesas", choices=("negativas", "positivas"), default="negativas",
+        help="Sinal dos gastos no arquivo (positivas em faturas de cartão em CSV)"
+    )
+    args = parser.parse_args()
+
+    formato = args.formato or os.path.splitext(args.arquivo)[1].lower().lstrip(".")
+    if formato not in FORMATOS:
+        parser.error("Não foi possível deduzir o formato pela extensão; use --formato")
+
+    storage = get_storage()
+    with open(args.arquivo, "rb") as arquivo:
+        relatorio = importar_extrato(arquivo, args.user_id, storage, formato, args.despesas)
+
+    print(f"Linhas lidas: {relatorio['lidos']}")
+    print(f"Gastos importados: {relatorio['importados']}")
+    print(f"Já existentes (ignorados): {relatorio['duplicados']}")
+    print(f"Créditos e outras linhas que não são gastos: {relatorio['ignorados']}")
+    if relatorio["invalidos"]:
+        print(f"Linhas inválidas: {relatorio['invalidos']}")
+        for erro in relatorio["erros"]:
+            print(f"- {erro}")
+
+
+if __name__ == "__main__":
+    main()
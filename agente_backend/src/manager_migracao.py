@@ -0,0 +1,202 @@
+"""
+Migração dos gastos para a chave de data `dia` (inteiro AAAAMMDD) e criação
+dos índices do MongoDB.
+
+A API não cria índices ao subir: este script é o passo de migração de cada
+implantação. Preenche `dia` em lotes nos gastos que ainda não têm o campo, cria
+os índices (user_id, dia, _id) e (user_id, tipo, dia, valor) e remove os
+índices antigos sobre `data`. Antes e depois, executa explain das consultas típicas de um
+usuário e mostra o índice usado, as chaves e documentos examinados e se a
+consulta foi coberta pelo índice, além dos acessos de cada índice ($indexStats).
+
+Deve ser executada uma vez ao atualizar: sem `dia`, os gastos antigos não
+aparecem nos filtros por período. Ao terminar, registra a migração na coleção
+`migracoes`; até lá, /ready responde 503 (db_mongo.verificar_migracao_async).
+Em uma instalação nova, `--apenas-indices` também registra a migração se
+nenhum gasto estiver sem `dia`.
+
+Uso (a partir de agente_backend/):
+
+    python -m src.manager_migracao                    # migra e compara os planos
+    python -m src.manager_migracao --user-id 3        # usuário usado nas consultas do relatório
+    python -m src.manager_migracao --apenas-relatorio # só mostra os planos atuais
+    python -m src.manager_migracao --apenas-indices   # só cria/atualiza os índices
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from src import db_mongo
+from src.db_mongo import criar_indices, chave_dia, marcar_migracao_dia, INDICES_ANTIGOS
+
+
+def _chave(data):
+    if isinstance(data, datetime):
+        return int(data.strftime("%Y%m%d"))
+    return chave_dia(data)
+
+
+def preencher_dia(lote=1000):
+    """
+    Grava `dia` nos gastos que não têm o campo, em lotes ordenados por _id
+
+    Os gastos convertidos passam a aparecer nos filtros por período: a versão dos
+    dados dos usuários de cada lote é incrementada (ETags e caches da API).
+    """
+    convertidos, invalidos = 0, []
+    ultimo = None
+    while True:
+        filtro = {"dia": {"$exists": False}}
+        if ultimo is not None:
+            filtro["_id"] = {"$gt": ultimo}
+        docs = list(db_mongo.expenses_collection.find(filtro, {"data": 1, "user_id": 1}).sort("_id", ASCENDING).limit(lote))
+        if not docs:
+            break
+
+        operacoes, usuarios = [], set()
+        for doc in docs:
+            try:
+                operacoes.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"dia": _chave(doc["data"])}}))
+                usuarios.add(doc.get("user_id"))
+            except (KeyError, TypeError, ValueError):
+                invalidos.append(doc["_id"])
+        if operacoes:
+            convertidos += db_mongo.expenses_collection.bulk_write(operacoes, ordered=False).modified_count
+            db_mongo.incrementar_versoes(usuarios)
+        ultimo = docs[-1]["_id"]
+        print(f"  {convertidos} gastos convertidos...")
+
+    return convertidos, invalidos
+
+
+def _consultas(user_id, campo, migrado):
+    """Consultas típicas do usuário: período, período + categoria, projeção coberta e página"""
+    ultimo = db_mongo.expenses_collection.find_one({"user_id": user_id}, sort=[("_id", DESCENDING)])
+    if ultimo is None:
+        return []
+    fim = datetime.strptime(str(ultimo["data"])[:10], "%Y-%m-%d")
+    inicio = fim - timedelta(days=90)
+    if migrado:
+        intervalo = {"$gte": int(inicio.strftime("%Y%m%d")), "$lte": int(fim.strftime("%Y%m%d"))}
+    else:
+        intervalo = {"$gte": inicio.strftime("%Y-%m-%d"), "$lte": fim.strftime("%Y-%m-%d")}
+
+    periodo = {"user_id": user_id, campo: intervalo}
+    com_tipo = {**periodo, "tipo": ultimo["tipo"]}
+    return [
+        ("período", db_mongo.expenses_collection.find(periodo)),
+        ("período + categoria", db_mongo.expenses_collection.find(com_tipo)),
+        ("período + categoria (valor)", db_mongo.expenses_collection.find(com_tipo, {campo: 1, "tipo": 1, "valor": 1, "_id": 0})),
+        ("página de 100", db_mongo.expenses_collection.find(periodo).sort([(campo, DESCENDING), ("_id", DESCENDING)]).limit(100)),
+    ]
+
+
+def _resumo_plano(explain):
+    """Índice, estágios e contadores do plano vencedor de um explain"""
+    plano = explain.get("queryPlanner", {}).get("winningPlan", {})
+    # Com o motor SBE, o plano fica em winningPlan.queryPlan
+    plano = plano.get("queryPlan", plano)
+    estagios, indices = [], []
+
+    def percorrer(no):
+        estagios.append(no.get("stage", "?"))
+        if no.get("indexName"):
+            indices.append(no["indexName"])
+        if "inputStage" in no:
+            percorrer(no["inputStage"])
+        for filho in no.get("inputStages", []):
+            percorrer(filho)
+
+    percorrer(plano)
+    estatisticas = explain.get("executionStats", {})
+    documentos = estatisticas.get("totalDocsExamined", 0)
+    return {
+        "indice": ", ".join(indices) or "nenhum (COLLSCAN)",
+        "estagios": " <- ".join(estagios),
+        "chaves": estatisticas.get("totalKeysExamined", 0),
+        "documentos": documentos,
+        "retornados": estatisticas.get("nReturned", 0),
+        "ms": estatisticas.get("executionTimeMillis", 0),
+        "coberta": bool(indices) and documentos == 0 and "FETCH" not in estagios
+    }
+
+
+def relatorio(user_id, migrado):
+    campo = "dia" if migrado else "data"
+    consultas = _consultas(user_id, campo, migrado)
+    if not consultas:
+        print(f"  Usuário {user_id} não tem gastos; sem consultas para comparar.")
+    for nome, cursor in consultas:
+        r = _resumo_plano(cursor.explain())
+        print(
+            f"  {nome:<30} índice={r['indice']:<24} chaves={r['chaves']:<7} documentos={r['documentos']:<7} "
+            f"retornados={r['retornados']:<6} {r['ms']}ms{'  [coberta]' if r['coberta'] else ''}"
+        )
+        print(f"  {'':<30} {r['estagios']}")
+
+    print("  Acessos por índice ($indexStats, desde o início do servidor):")
+    for item in db_mongo.expenses_collection.aggregate([{"$indexStats": {}}]):
+        print(f"  - {item['name']}: {item['accesses']['ops']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra os gastos para a chave de data `dia`")
+    parser.add_argument("--user-id", type=int, default=None, help="Usuário das consultas do relatório (padrão: o do último gasto)")
+    parser.add_argument("--lote", type=int, default=1000, help="Gastos por lote de atualização")
+    parser.add_argument("--apenas-relatorio", action="store_true", help="Não migra, só mostra os planos")
+    parser.add_argument("--manter-indices-antigos", action="store_true", help="Não remove os índices sobre `data`")
+    parser.add_argument("--apenas-indices", action="store_true", help="Só cria os índices, sem migrar nem comparar planos")
+    args = parser.parse_args()
+
+    db_mongo.conectar()
+    if args.apenas_indices:
+        criar_indices()
+        print("Índices criados.")
+        if db_mongo.expenses_collection.find_one({"dia": {"$exists": False}}, {"_id": 1}) is None:
+            marcar_migracao_dia()
+        else:
+            print("Há gastos sem `dia`: execute a migração completa (sem --apenas-indices).")
+        return
+
+    user_id = args.user_id
+    if user_id is None:
+        ultimo = db_mongo.expenses_collection.find_one(sort=[("_id", DESCENDING)])
+        user_id = ultimo["user_id"] if ultimo else None
+    if user_id is None:
+        print("Nenhum gasto encontrado.")
+
+    pendentes = db_mongo.expenses_collection.count_documents({"dia": {"$exists": False}})
+    if user_id is not None:
+        print(f"Planos antes da migração (filtro em {'dia' if not pendentes else 'data'}):")
+        relatorio(user_id, migrado=not pendentes)
+
+    if args.apenas_relatorio:
+        print(f"Gastos sem `dia`: {pendentes}")
+        return
+
+    print(f"Convertendo {pendentes} gastos...")
+    convertidos, invalidos = preencher_dia(args.lote)
+    print(f"Gastos convertidos: {convertidos}")
+    if invalidos:
+        print(f"Gastos com data inválida (sem `dia`): {len(invalidos)}")
+        for doc_id in invalidos[:20]:
+            print(f"- {doc_id}")
+    # Gastos com data inválida não entram em nenhum período, com ou sem `dia`
+    marcar_migracao_dia()
+
+    criar_indices()
+    if not args.manter_indices_antigos:
+        existentes = set(db_mongo.expenses_collection.index_information())
+        for nome in INDICES_ANTIGOS:
+            if nome in existentes:
+                db_mongo.expenses_collection.drop_index(nome)
+                print(f"Índice removido: {nome}")
+
+    if user_id is not None:
+        print("Planos depois da migração (filtro em dia):")
+        relatorio(user_id, migrado=True)
+
+
+if __name__ == "__main__":
+    main()
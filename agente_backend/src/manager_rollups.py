@@ -0,0 +1,44 @@
+"""
+Reconstrói e verifica os rollups mensais (monthly_rollups) a partir da coleção de gastos.
+
+Uso (a partir de agente_backend/):
+
+    python -m src.manager_rollups                # verifica e corrige todos os usuários
+    python -m src.manager_rollups --user-id 3    # apenas um usuário
+    python -m src.manager_rollups --verificar    # apenas relata divergências, sem corrigir
+"""
+import argparse
+
+from src.db_mongo import conectar, rebuild_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstrói os rollups mensais de gastos")
+    parser.add_argument("--user-id", type=int, default=None, help="ID do usuário (padrão: todos)")
+    parser.add_argument("--verificar", action="store_true", help="Apenas verifica, sem corrigir")
+    args = parser.parse_args()
+
+    conectar()
+    relatorio = rebuild_rollups(user_id=args.user_id, corrigir=not args.verificar)
+    divergencias = relatorio["divergencias"]
+
+    print(f"Rollups recalculados: {relatorio['verificados']}")
+    if not divergencias:
+        print("Nenhuma divergência encontrada.")
+        return
+
+    print(f"Divergências encontradas: {len(divergencias)}")
+    for item in divergencias:
+        print(
+            f"- usuário {item['user_id']} | {item['mes']} | {item['tipo']}: "
+            f"esperado R$ {item['esperado']:.2f}, encontrado R$ {item['encontrado']:.2f}"
+        )
+
+    if args.verificar:
+        print("Execute sem --verificar para corrigir.")
+    else:
+        print("Rollups corrigidos.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+# agente_backend/src/metrics.py
+"""
+Métricas da API no formato texto do Prometheus (exposto em /metrics).
+
+Sem dependências externas: histogramas e contadores simples, protegidos por
+lock. As fontes de dados são:
+- middleware HTTP em main.py (latência por rota)
+- `cronometrar`/`cronometrado` em volta das etapas de uma rota
+- eventos do SQLAlchemy (`instrumentar_sqlalchemy`)
+- CommandListener do pymongo/motor (`monitor_mongo`), que cobre toda operação
+  nas coleções, inclusive os getMore dos cursores
+- `registrar_chamada_llm`, com o campo `usage` das respostas da OpenAI (também
+  somado por usuário em `consumo_llm`)
+- estatísticas dos caches, lidas no momento da coleta
+"""
+import re
+import time
+import asyncio
+import threading
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# Limites padrão do cliente oficial do Prometheus (segundos)
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _rotulos(nomes, valores, extra=""):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Contador:
+    """Contador monotônico com rótulos"""
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, quantidade=1, **rotulos):
+        chave = tuple(str(rotulos.get(nome, "")) for nome in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + quantidade
+
+    def linhas(self):
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}" for chave, valor in itens]
+
+
+class Histograma:
+    """Histograma cumulativo com rótulos"""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(sorted(buckets))
+        # chave -> [contagens por bucket, soma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(str(rotulos.get(nome, "")) for nome in self.rotulos)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def linhas(self):
+        with self._lock:
+            itens = sorted((chave, (list(c), s, t)) for chave, (c, s, t) in self._series.items())
+        linhas = []
+        for chave, (contagens, soma, total) in itens:
+            for limite, contagem in zip(self.buckets, contagens):
+                rotulos = _rotulos(self.rotulos, chave, 'le="%s"' % limite)
+                linhas.append(f"{self.nome}_bucket{rotulos} {contagem}")
+            rotulos = _rotulos(self.rotulos, chave, 'le="+Inf"')
+            linhas.append(f"{self.nome}_bucket{rotulos} {total}")
+            rotulos = _rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {repr(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {total}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas e de coletores chamados no momento da exportação"""
+
+    def __init__(self):
+        self._metricas = []
+        self._coletores = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def coletor(self, funcao):
+        """
+        Registra uma função que retorna [(nome, tipo, ajuda, [(rótulos, valor)])]
+
+        Usado para valores que já são contados em outro lugar (ex.: caches).
+        """
+        self._coletores.append(funcao)
+        return funcao
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        saida = []
+        for metrica in self._metricas:
+            saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            saida.extend(metrica.linhas())
+        for coletor in self._coletores:
+            for nome, tipo, ajuda, amostras in coletor():
+                saida.append(f"# HELP {nome} {ajuda}")
+                saida.append(f"# TYPE {nome} {tipo}")
+                for rotulos, valor in amostras:
+                    saida.append(f"{nome}{_rotulos(rotulos.keys(), rotulos.values())} {_numero(valor)}")
+        return "\n".join(saida) + "\n"
+
+
+registro = RegistroMetricas()
+
+HTTP_DURACAO = registro.registrar(Histograma(
+    "http_request_duration_seconds", "Latência das requisições HTTP", ("method", "route", "status")
+))
+ETAPA_DURACAO = registro.registrar(Histograma(
+    "stage_duration_seconds", "Latência das etapas internas das rotas", ("stage",)
+))
+SQL_DURACAO = registro.registrar(Histograma(
+    "sql_query_duration_seconds", "Latência das consultas SQLAlchemy", ("operation", "table")
+))
+MONGO_DURACAO = registro.registrar(Histograma(
+    "mongo_command_duration_seconds", "Latência dos comandos MongoDB", ("collection", "command", "status")
+))
+LLM_DURACAO = registro.registrar(Histograma(
+    "llm_request_duration_seconds", "Latência das chamadas chat.completions.create", ("kind", "model", "status"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+))
+LLM_TOKENS = registro.registrar(Contador(
+    "llm_tokens_total", "Tokens informados no campo usage das respostas da OpenAI", ("kind", "model", "type")
+))
+LLM_TOKENS_CHAMADA = registro.registrar(Histograma(
+    "llm_tokens_per_call", "Tokens de entrada e de saída por chamada à OpenAI", ("kind", "model", "type"),
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048)
+))
+CLASSIFICADOR_DECISOES = registro.registrar(Contador(
+    "category_classifier_decisions_total",
+    "Decisões do classificador de categoria aprendido (confident: dispensa o GPT para a categoria)", ("result",)
+))
+LLM_RESPOSTAS_INVALIDAS = registro.registrar(Contador(
+    "llm_invalid_responses_total", "Respostas do GPT descartadas (JSON inválido ou fora do esquema)", ("kind", "mode")
+))
+
+
+@contextmanager
+def cronometrar(histograma=ETAPA_DURACAO, **rotulos):
+    """Mede o bloco e registra no histograma (também quando há exceção)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        histograma.observar(time.perf_counter() - inicio, **rotulos)
+
+
+def cronometrado(etapa):
+    """Decorador que registra a duração da função como uma etapa (sync ou async)"""
+    def decorador(funcao):
+        if asyncio.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envoltorio_async(*args, **kwargs):
+                with cronometrar(ETAPA_DURACAO, stage=etapa):
+                    return await funcao(*args, **kwargs)
+            return envoltorio_async
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            with cronometrar(ETAPA_DURACAO, stage=etapa):
+                return funcao(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+def registrar_chamada_llm(tipo, modelo, duracao, response=None, user_id=None):
+    """
+    Registra a latência da chamada e os tokens de `response.usage` (None se falhou)
+
+    Os tokens também são somados ao usuário em `consumo_llm`; uma chamada
+    compartilhada por requisições coalescidas conta para quem a iniciou.
+    """
+    LLM_DURACAO.observar(duracao, kind=tipo, model=modelo, status="ok" if response is not None else "erro")
+    uso = getattr(response, "usage", None)
+    if uso is None:
+        return
+    tokens = {}
+    for campo in ("prompt_tokens", "completion_tokens"):
+        quantidade = getattr(uso, campo, None) or 0
+        tokens[campo.split("_")[0]] = quantidade
+        if quantidade:
+            LLM_TOKENS.inc(quantidade, kind=tipo, model=modelo, type=campo.split("_")[0])
+        LLM_TOKENS_CHAMADA.observar(quantidade, kind=tipo, model=modelo, type=campo.split("_")[0])
+    if user_id is not None:
+        consumo_llm.registrar(user_id, tokens["prompt"], tokens["completion"])
+
+
+class ConsumoLLM:
+    """Chamadas e tokens da OpenAI por usuário, em memória (LRU limitado, desde o início do processo)"""
+
+    def __init__(self, max_usuarios=10000):
+        self.max_usuarios = max_usuarios
+        self._usuarios = OrderedDict()
+        self._lock = threading.Lock()
+
+    def registrar(self, user_id, prompt, completion):
+        with self._lock:
+            item = self._usuarios.get(user_id)
+            if item is None:
+                item = self._usuarios[user_id] = {"chamadas": 0, "prompt": 0, "completion": 0}
+                while len(self._usuarios) > self.max_usuarios:
+                    self._usuarios.popitem(last=False)
+            self._usuarios.move_to_end(user_id)
+            item["chamadas"] += 1
+            item["prompt"] += prompt
+            item["completion"] += completion
+
+    def do_usuario(self, user_id):
+        with self._lock:
+            return dict(self._usuarios.get(user_id) or {"chamadas": 0, "prompt": 0, "completion": 0})
+
+    def maiores(self, limite=20):
+        """Usuários com mais tokens (entrada + saída)"""
+        with self._lock:
+            itens = [{"user_id": user_id, **item} for user_id, item in self._usuarios.items()]
+        itens.sort(key=lambda item: item["prompt"] + item["completion"], reverse=True)
+        return itens[:limite]
+
+
+consumo_llm = ConsumoLLM()
+
+
+# --- SQLAlchemy ---------------------------------------------------------------
+
+_RE_TABELA = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+[\"`]?(\w+)", re.IGNORECASE)
+
+
+def instrumentar_sqlalchemy(engine):
+    """
+    Registra a duração de cada consulta executada pelo engine
+
+    O início fica no contexto de execução da consulta, e não em uma pilha na
+    conexão: uma consulta que falha não chega ao after_cursor_execute, e o
+    início dela seria descartado junto com o contexto (na pilha, ficaria para
+    sempre na conexão do pool). Execuções sem contexto não são medidas.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._inicio_consulta = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, "_inicio_consulta", None)
+        if inicio is None:
+            return
+        duracao = time.perf_counter() - inicio
+        tabela = _RE_TABELA.search(statement)
+        SQL_DURACAO.observar(
+            duracao,
+            operation=statement.lstrip().split(None, 1)[0].upper(),
+            table=tabela.group(1) if tabela else ""
+        )
+
+
+# --- MongoDB ------------------------------------------------------------------
+
+class MonitorMongo(monitoring.CommandListener):
+    """Mede os comandos enviados ao MongoDB (clientes pymongo e motor)"""
+
+    def __init__(self):
+        self._colecoes = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        comando = event.command
+        colecao = comando.get("collection") if event.command_name == "getMore" else comando.get(event.command_name)
+        with self._lock:
+            self._colecoes[(event.connection_id, event.request_id)] = colecao if isinstance(colecao, str) else ""
+
+    def _registrar(self, event, status):
+        with self._lock:
+            colecao = self._colecoes.pop((event.connection_id, event.request_id), "")
+        MONGO_DURACAO.observar(
+            event.duration_micros / 1_000_000, collection=colecao, command=event.command_name, status=status
+        )
+
+    def succeeded(self, event):
+        self._registrar(event, "ok")
+
+    def failed(self, event):
+        self._registrar(event, "erro")
+
+
+monitor_mongo = MonitorMongo()
+
+
+# --- Caches -------------------------------------------------------------------
+
+@registro.coletor
+def _metricas_caches():
+    from src.llm_cache import cache as llm_cache
+    from src.auth_cache import cache_usuarios
+    from src.versoes import respostas
+
+    llm = llm_cache.estatisticas()
+    auth = cache_usuarios.estatisticas()
+    resp = respostas.estatisticas()
+    return [
+        ("cache_requests_total", "counter", "Consultas aos caches por resultado", [
+            ({"cache": "llm", "result": "hit_memory"}, llm["acertos_memoria"]),
+            ({"cache": "llm", "result": "hit_persistent"}, llm["acertos_persistentes"]),
+            ({"cache": "llm", "result": "miss"}, llm["falhas"]),
+            ({"cache": "auth", "result": "hit_memory"}, auth["acertos"]),
+            ({"cache": "auth", "result": "miss"}, auth["falhas"]),
+            ({"cache": "respostas", "result": "hit_memory"}, resp["acertos"]),
+            ({"cache": "respostas", "result": "miss"}, resp["falhas"]),
+        ]),
+        ("cache_hit_ratio", "gauge", "Taxa de acerto dos caches desde o início do processo", [
+            ({"cache": "llm"}, llm["taxa_acerto"]),
+            ({"cache": "auth"}, auth["taxa_acerto"]),
+            ({"cache": "respostas"}, resp["taxa_acerto"]),
+        ]),
+        ("cache_items", "gauge", "Itens em memória nos caches", [
+            ({"cache": "llm"}, llm["itens_memoria"]),
+            ({"cache": "auth"}, auth["itens_memoria"]),
+            ({"cache": "respostas"}, resp["itens_memoria"]),
+        ]),
+        ("cache_bytes", "gauge", "Bytes em memória no cache de respostas", [
+            ({"cache": "respostas"}, resp["bytes"]),
+        ]),
+    ]
+
+
+# --- Partida do worker --------------------------------------------------------
+
+# Fase ("importacao", "conexoes", "total") -> segundos, preenchido pelo lifespan em main.py
+partida = {}
+
+
+@registro.coletor
+def _metricas_partida():
+    return [
+        ("worker_cold_start_seconds", "gauge", "Duração da partida a frio do worker por fase", [
+            ({"phase": fase}, duracao) for fase, duracao in partida.items()
+        ]),
+    ]
+
+
+# --- Coalescência das chamadas ao GPT -----------------------------------------
+
+@registro.coletor
+def _metricas_coalescencia():
+    from src.coalescencia import chamadas_llm
+
+    estatisticas = chamadas_llm.estatisticas()
+    return [
+        ("llm_singleflight_calls_total", "counter", "Chamadas ao GPT por resultado da coalescência", [
+            ({"result": "executed"}, estatisticas["executadas"]),
+            ({"result": "coalesced"}, estatisticas["coalescidas"]),
+        ]),
+        ("llm_singleflight_inflight", "gauge", "Chamadas ao GPT em andamento", [
+            ({}, estatisticas["em_andamento"]),
+        ]),
+        ("llm_singleflight_max_group", "gauge", "Maior número de requisições que compartilharam uma chamada", [
+            ({}, estatisticas["maior_grupo"]),
+        ]),
+    ]
@@ -0,0 +1,234 @@
+# agente_backend/src/parser_local.py
+"""
+Interpretador local (sem LLM) para frases simples de gasto em português,
+como "gastei 50 reais com mercado hoje" ou "uber R$ 23,90 ontem".
+
+Extrai valor, data e categoria de forma determinística e informa uma
+confiança entre 0 e 1. Frases ambíguas recebem confiança baixa e devem
+seguir para o GPT.
+
+A confiança é a soma de três partes:
+- valor: 0.5 com "R$" ou "reais"; 0.2 para um número solto
+- categoria: 0.4 para uma palavra-chave sem empate; 0.1 sem palavra-chave
+  ("outros"); 0 quando categorias diferentes empatam
+- 0.1 de base
+
+Referências de data que o interpretador não resolve ("dia 15", "na sexta",
+"semana passada", "3 dias atrás") limitam a confiança a CONFIANCA_DATA_INCERTA:
+sem elas a data seria hoje, então a frase vai ao GPT.
+
+Com a confiança mínima padrão (0.8 em src/process_input.py), só passam as frases
+com valor marcado, uma categoria sem empate e data de hoje, ontem, anteontem ou
+DD/MM[/AAAA].
+"""
+import re
+import unicodedata
+from datetime import datetime, timedelta
+
+# Categorias fixas usadas também no prompt do GPT
+CATEGORIAS = ["alimentação", "transporte", "moradia", "lazer", "saúde", "educação", "vestuário", "outros"]
+
+# Palavras-chave (sem acento, minúsculas) que indicam cada categoria
+PALAVRAS_CATEGORIA = {
+    "alimentação": [
+        "mercado", "supermercado", "restaurante", "lanche", "lanchonete", "almoco", "jantar",
+        "cafe", "padaria", "ifood", "comida", "pizza", "hamburguer", "feira", "acougue",
+        "hortifruti", "sorvete", "delivery", "marmita"
+    ],
+    "transporte": [
+        "uber", "99", "taxi", "onibus", "metro", "trem", "gasolina", "combustivel", "etanol",
+        "estacionamento", "pedagio", "passagem", "corrida", "mecanico", "oficina"
+    ],
+    "moradia": [
+        "aluguel", "condominio", "luz", "energia", "agua", "internet", "gas", "iptu",
+        "reforma", "moveis", "faxina", "diarista"
+    ],
+    "lazer": [
+        "cinema", "show", "bar", "balada", "netflix", "spotify", "streaming", "viagem",
+        "jogo", "festa", "teatro", "ingresso", "passeio", "hotel"
+    ],
+    "saúde": [
+        "farmacia", "remedio", "medico", "consulta", "dentista", "exame", "hospital",
+        "academia", "plano de saude", "terapia", "psicologo"
+    ],
+    "educação": [
+        "curso", "livro", "livraria", "escola", "faculdade", "mensalidade", "apostila",
+        "material escolar", "aula", "udemy"
+    ],
+    "vestuário": [
+        "roupa", "roupas", "camisa", "camiseta", "calca", "sapato", "tenis", "vestido",
+        "blusa", "jaqueta", "bermuda", "meia", "cueca", "sutia"
+    ],
+}
+
+# Palavras que indicam que o texto não é um gasto (ex.: receita)
+PALAVRAS_NAO_GASTO = ["recebi", "ganhei", "salario", "reembolso", "me pagou", "me pagaram"]
+
+# Teto da confiança quando o texto tem uma referência de data não resolvida
+CONFIANCA_DATA_INCERTA = 0.3
+
+_RE_ANTEONTEM = re.compile(r"\banteontem\b")
+_RE_ONTEM = re.compile(r"\bontem\b")
+# Referências de data que _extrair_data não resolve (texto sem acentos)
+_RE_DATA_NAO_RESOLVIDA = re.compile(
+    r"\bdia\s+\d{1,2}\b|\b(?:segunda|terca|quarta|quinta|sexta|sabado|domingo)(?:-feira)?\b"
+    r"|\bpassad[oa]s?\b|\bretrasad[oa]s?\b|\batras\b|\bsemana\b|\bdias?\s+antes\b"
+)
+_RE_DATA = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b")
+_RE_VALOR_MARCADO = re.compile(
+    r"r\$\s*(\d{1,3}(?:\.\d{3})+|\d+)(?:[,.](\d{1,2}))?\b"
+    r"|\b(\d{1,3}(?:\.\d{3})+|\d+)(?:[,.](\d{1,2}))?\s*(?:reais|real|conto|contos|pila)\b"
+)
+_RE_NUMERO = re.compile(r"\b(\d{1,3}(?:\.\d{3})+|\d+)(?:[,.](\d{1,2}))?\b")
+
+
+def _normalizar(texto):
+    """Minúsculas e sem acentos, para comparar com as palavras-chave"""
+    sem_acento = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in sem_acento if not unicodedata.combining(c))
+
+
+def _converter_valor(inteiro, centavos):
+    valor = float(inteiro.replace(".", ""))
+    if centavos:
+        valor += float(f"0.{centavos.ljust(2, '0')}")
+    return round(valor, 2)
+
+
+def _extrair_data(texto, hoje):
+    """Retorna (data YYYY-MM-DD, texto sem a data); data None se for inválida"""
+    if _RE_ANTEONTEM.search(texto):
+        return (hoje - timedelta(days=2)).strftime("%Y-%m-%d"), texto
+    if _RE_ONTEM.search(texto):
+        return (hoje - timedelta(days=1)).strftime("%Y-%m-%d"), texto
+
+    encontrada = _RE_DATA.search(texto)
+    if encontrada:
+        dia, mes, ano = encontrada.groups()
+        if ano is None:
+            ano = hoje.year
+        elif len(ano) == 2:
+            ano = 2000 + int(ano)
+        try:
+            data = datetime(int(ano), int(mes), int(dia))
+        except ValueError:
+            return None, texto
+        # "15/12" dito em janeiro se refere ao ano anterior
+        if encontrada.group(3) is None and data.date() > hoje.date():
+            data = data.replace(year=data.year - 1)
+        texto_sem_data = texto[:encontrada.start()] + " " + texto[encontrada.end():]
+        return data.strftime("%Y-%m-%d"), texto_sem_data
+
+    # Sem data explícita (ou "hoje"): usa a data atual, como no prompt do GPT
+    return hoje.strftime("%Y-%m-%d"), texto
+
+
+def _extrair_valor(texto):
+    """Retorna (valor, confiança da extração)"""
+    marcados = list(_RE_VALOR_MARCADO.finditer(texto))
+    if len(marcados) == 1:
+        m = marcados[0]
+        inteiro, centavos = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+        return _converter_valor(inteiro, centavos), 0.5
+    if len(marcados) > 1:
+        return None, 0
+
+    # Número sem "R$" nem "reais" pode ser quantidade ("almoço com 3 amigos"):
+    # mesmo com uma palavra-chave, a frase não passa da confiança mínima e vai ao GPT
+    numeros = list(_RE_NUMERO.finditer(texto))
+    if len(numeros) == 1:
+        return _converter_valor(numeros[0].group(1), numeros[0].group(2)), 0.2
+    return None, 0
+
+
+def _palavras_texto(texto):
+    """Palavras do texto junto com o singular dos plurais ("camisetas", "bares", "passagens")"""
+    palavras = set(re.findall(r"[a-z0-9]+", texto))
+    for palavra in list(palavras):
+        if len(palavra) > 3 and palavra.endswith("s"):
+            palavras.add(palavra[:-1])
+            if palavra.endswith("es"):
+                palavras.add(palavra[:-2])
+            elif palavra.endswith("ns"):
+                palavras.add(palavra[:-2] + "m")
+    return palavras
+
+
+def _extrair_categoria(texto):
+    """Retorna (categoria, confiança da categoria)"""
+    palavras = _palavras_texto(texto)
+    pontos = {}
+    for categoria, chaves in PALAVRAS_CATEGORIA.items():
+        for chave in chaves:
+            if (" " in chave and chave in texto) or chave in palavras:
+                pontos[categoria] = pontos.get(categoria, 0) + 1
+
+    if not pontos:
+        return "outros", 0.1
+
+    melhores = sorted(pontos.items(), key=lambda item: item[1], reverse=True)
+    if len(melhores) > 1 and melhores[0][1] == melhores[1][1]:
+        # Empate entre categorias: sem confiança na categoria, deixa o GPT decidir
+        return melhores[0][0], 0.0
+    return melhores[0][0], 0.4
+
+
+def categorizar(descricao):
+    """
+    Categoria de um gasto pela descrição (ex.: linha de extrato bancário)
+
+    Returns:
+        Tupla (categoria, confiança da categoria); "outros" quando nenhuma palavra-chave aparece
+    """
+    return _extrair_categoria(_normalizar(descricao or ""))
+
+
+def interpretar_gasto(texto, hoje=None, categoria=None):
+    """
+    Interpreta localmente um texto de gasto
+
+    Args:
+        texto: Texto informado pelo usuário
+        hoje: Data de referência (padrão: agora)
+        categoria: Categoria já decidida pelo classificador aprendido
+            (src/classificador.py); substitui as palavras-chave
+
+    Returns:
+        Dict com valor, tipo, data, descricao e confianca (0 a 1),
+        ou None se nenhum valor puder ser identificado
+    """
+    hoje = hoje or datetime.now()
+    normalizado = _normalizar(texto)
+
+    if any(palavra in normalizado for palavra in PALAVRAS_NAO_GASTO):
+        return None
+
+    data, sem_data = _extrair_data(normalizado, hoje)
+    if data is None:
+        return None
+
+    # "99" também é o nome de um app de corridas: ignora quando há outro número
+    if len(_RE_NUMERO.findall(sem_data)) > 1:
+        sem_data = re.sub(r"\b99\b(?![,.]\d)", " ", sem_data)
+
+    valor, confianca_valor = _extrair_valor(sem_data)
+    if valor is None or valor <= 0:
+        return None
+
+    if categoria is not None:
+        # Mesma confiança de uma palavra-chave sem empate
+        tipo, confianca_tipo = categoria, 0.4
+    else:
+        tipo, confianca_tipo = _extrair_categoria(normalizado)
+    confianca = confianca_valor + confianca_tipo + 0.1
+    if _RE_DATA_NAO_RESOLVIDA.search(sem_data):
+        # A data ficaria como hoje, provavelmente errada
+        confianca = min(confianca, CONFIANCA_DATA_INCERTA)
+
+    return {
+        "valor": valor,
+        "tipo": tipo,
+        "data": data,
+        "descricao": texto,
+        "confianca": round(min(confianca, 1.0), 2)
+    }
@@ -0,0 +1,340 @@
+# agente_backend/src/perfil_mongo.py
+"""
+Perfil das consultas ao MongoDB por forma de consulta.
+
+`MonitorConsultas` é um CommandListener registrado nos clientes de
+src/db_mongo.py (pymongo e motor), então toda operação é medida, inclusive os
+getMore dos cursores, que são atribuídos à consulta que abriu o cursor.
+
+- Forma: o comando com os valores trocados por "?" (nomes de campos,
+  operadores, ordenação e projeção são mantidos), para agrupar consultas iguais
+  de usuários e períodos diferentes.
+- Consultas acima de MONGO_LENTA_MS são registradas no log com a forma.
+- Uma fração MONGO_EXPLAIN_AMOSTRA das consultas (find e aggregate) é repetida
+  com explain("executionStats") em uma thread separada, fora do caminho da
+  requisição, para registrar chaves e documentos examinados contra retornados
+  e o índice usado.
+
+`relatorio` lista as piores formas (exposto em /admin/consultas-mongo).
+"""
+import os
+import json
+import queue
+import random
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from pymongo import monitoring
+
+load_dotenv()
+
+MONGO_LENTA_MS = float(os.getenv("MONGO_LENTA_MS", "100"))
+MONGO_EXPLAIN_AMOSTRA = float(os.getenv("MONGO_EXPLAIN_AMOSTRA", "0.01"))
+# Formas distintas acompanhadas (LRU) e explains pendentes na fila
+MONGO_FORMAS_MAX = int(os.getenv("MONGO_FORMAS_MAX", "500"))
+MONGO_EXPLAIN_FILA = 100
+
+logger = logging.getLogger(__name__)
+
+# Comandos de conexão, autenticação e os próprios explains não entram no perfil
+_IGNORADOS = {
+    "explain", "hello", "ismaster", "isMaster", "ping", "buildInfo", "endSessions",
+    "saslStart", "saslContinue", "getnonce", "authenticate", "killCursors"
+}
+_COM_EXPLAIN = {"find", "aggregate"}
+# Campos da sessão/cluster que não fazem parte da consulta repetida no explain
+_CAMPOS_SESSAO = {"lsid", "$clusterTime", "$db", "txnNumber", "$readPreference", "autocommit", "startTransaction"}
+# Cursores abertos cujo getMore ainda pode chegar
+_CURSORES_MAX = 10000
+
+
+def _normalizar(valor):
+    """Troca os valores por "?" mantendo campos, operadores e caminhos "$campo" das agregações"""
+    if isinstance(valor, dict):
+        return {chave: _normalizar(item) for chave, item in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        if valor and all(isinstance(item, dict) for item in valor):
+            return [_normalizar(item) for item in valor]
+        return ["?"] if valor else []
+    if isinstance(valor, str) and valor.startswith("$"):
+        return valor
+    return "?"
+
+
+def forma_consulta(nome, comando):
+    """Forma normalizada de um comando (sem valores), usada como chave do perfil"""
+    if nome == "find":
+        partes = {"filter": _normalizar(comando.get("filter", {}))}
+        if comando.get("sort"):
+            partes["sort"] = dict(comando["sort"])
+        if comando.get("projection"):
+            partes["projection"] = sorted(comando["projection"])
+        if "limit" in comando:
+            partes["limit"] = "?"
+    elif nome == "aggregate":
+        partes = {"pipeline": _normalizar(comando.get("pipeline", []))}
+    elif nome in ("update", "delete"):
+        chave = "updates" if nome == "update" else "deletes"
+        operacoes = comando.get(chave) or [{}]
+        partes = {campo: _normalizar(valor) for campo, valor in operacoes[0].items() if campo in ("q", "u")}
+    elif nome == "findAndModify":
+        partes = {"query": _normalizar(comando.get("query", {})), "remove": bool(comando.get("remove"))}
+    elif nome in ("count", "distinct"):
+        partes = {"query": _normalizar(comando.get("query", {}))}
+        if nome == "distinct":
+            partes["key"] = comando.get("key")
+    else:
+        partes = {}
+    return f"{comando.get(nome)}.{nome} {json.dumps(partes, ensure_ascii=False, default=str)}"
+
+
+def resumo_explain(resultado):
+    """Chaves e documentos examinados, documentos retornados e índices do plano vencedor"""
+    estatisticas = _procurar(resultado, "executionStats") or {}
+    indices, estagios = set(), set()
+    for plano in _procurar_todos(resultado, "winningPlan"):
+        _percorrer_plano(plano, indices, estagios)
+    documentos = estatisticas.get("totalDocsExamined", 0)
+    return {
+        "chaves": estatisticas.get("totalKeysExamined", 0),
+        "documentos": documentos,
+        "retornados": estatisticas.get("nReturned", 0),
+        "indices": sorted(indices),
+        "coberta": bool(indices) and documentos == 0 and "FETCH" not in estagios
+    }
+
+
+def _procurar(valor, chave):
+    """Primeiro valor de `chave` em um documento aninhado (find e aggregate têm formatos diferentes)"""
+    for encontrado in _procurar_todos(valor, chave):
+        return encontrado
+    return None
+
+
+def _procurar_todos(valor, chave):
+    if isinstance(valor, dict):
+        if chave in valor:
+            yield valor[chave]
+        for item in valor.values():
+            yield from _procurar_todos(item, chave)
+    elif isinstance(valor, list):
+        for item in valor:
+            yield from _procurar_todos(item, chave)
+
+
+def _percorrer_plano(no, indices, estagios):
+    if isinstance(no, dict):
+        if isinstance(no.get("stage"), str):
+            estagios.add(no["stage"])
+        if isinstance(no.get("indexName"), str):
+            indices.add(no["indexName"])
+        for item in no.values():
+            _percorrer_plano(item, indices, estagios)
+    elif isinstance(no, list):
+        for item in no:
+            _percorrer_plano(item, indices, estagios)
+
+
+class _EstatisticasForma:
+    __slots__ = (
+        "colecao", "comando", "execucoes", "tempo_total", "tempo_max", "lentas", "erros", "retornados",
+        "amostras", "chaves_examinadas", "docs_examinados", "retornados_amostra", "indices", "cobertas"
+    )
+
+    def __init__(self, colecao, comando):
+        self.colecao = colecao
+        self.comando = comando
+        self.execucoes = self.lentas = self.erros = self.retornados = 0
+        self.tempo_total = self.tempo_max = 0.0
+        self.amostras = self.chaves_examinadas = self.docs_examinados = self.retornados_amostra = self.cobertas = 0
+        self.indices = set()
+
+
+class MonitorConsultas(monitoring.CommandListener):
+    """Tempo, consultas lentas e amostras de explain por forma de consulta"""
+
+    def __init__(self, limite_ms=MONGO_LENTA_MS, amostra=MONGO_EXPLAIN_AMOSTRA, max_formas=MONGO_FORMAS_MAX):
+        self.limite_ms = limite_ms
+        self.amostra = amostra
+        self.max_formas = max_formas
+        self._formas = OrderedDict()
+        # (conexão, request_id) -> (forma, comando a repetir no explain ou None, cursor do getMore)
+        self._pendentes = {}
+        # id do cursor -> forma da consulta que o abriu (para os getMore)
+        self._cursores = OrderedDict()
+        self._lock = threading.Lock()
+        self._client = None
+        self._fila = queue.Queue(maxsize=MONGO_EXPLAIN_FILA)
+        self._explicador = None
+
+    def configurar_explain(self, client):
+        """Cliente síncrono usado para executar os explains amostrados"""
+        self._client = client
+
+    # Eventos do driver
+
+    def started(self, event):
+        nome = event.command_name
+        if nome in _IGNORADOS:
+            return
+        comando = event.command
+        cursor_id = None
+        if nome == "getMore":
+            cursor_id = comando.get("getMore")
+            with self._lock:
+                forma = self._cursores.get(cursor_id)
+            if forma is None:
+                forma = f"{comando.get('collection')}.getMore"
+            explicar = None
+        else:
+            forma = forma_consulta(nome, comando)
+            explicar = None
+            if nome in _COM_EXPLAIN and self._client is not None and random.random() < self.amostra:
+                explicar = (event.database_name, {
+                    chave: valor for chave, valor in comando.items() if chave not in _CAMPOS_SESSAO
+                })
+        with self._lock:
+            self._pendentes[(event.connection_id, event.request_id)] = (forma, explicar, cursor_id)
+
+    def succeeded(self, event):
+        with self._lock:
+            pendente = self._pendentes.pop((event.connection_id, event.request_id), None)
+        if pendente is None:
+            return
+        forma, explicar, cursor_id = pendente
+
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        retornados = 0
+        if isinstance(cursor, dict):
+            retornados = len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+            with self._lock:
+                if cursor.get("id"):
+                    self._cursores[cursor["id"]] = forma
+                    while len(self._cursores) > _CURSORES_MAX:
+                        self._cursores.popitem(last=False)
+                elif cursor_id is not None:
+                    # Cursor esgotado
+                    self._cursores.pop(cursor_id, None)
+
+        duracao_ms = event.duration_micros / 1000
+        self._registrar(forma, event.command_name, duracao_ms, retornados)
+        if duracao_ms >= self.limite_ms:
+            logger.warning("Consulta lenta ao MongoDB (%.0f ms): %s", duracao_ms, forma)
+        if explicar is not None:
+            self._agendar_explain(forma, explicar)
+
+    def failed(self, event):
+        with self._lock:
+            pendente = self._pendentes.pop((event.connection_id, event.request_id), None)
+        if pendente is not None:
+            self._registrar(pendente[0], event.command_name, event.duration_micros / 1000, 0, erro=True)
+
+    # Estatísticas
+
+    def _estatisticas(self, forma, comando):
+        # Chamado com o lock adquirido
+        item = self._formas.get(forma)
+        if item is None:
+            item = self._formas[forma] = _EstatisticasForma(forma.split(" ", 1)[0].rsplit(".", 1)[0], comando)
+            while len(self._formas) > self.max_formas:
+                self._formas.popitem(last=False)
+        self._formas.move_to_end(forma)
+        return item
+
+    def _registrar(self, forma, comando, duracao_ms, retornados, erro=False):
+        with self._lock:
+            item = self._estatisticas(forma, comando)
+            item.execucoes += 1
+            item.tempo_total += duracao_ms
+            item.tempo_max = max(item.tempo_max, duracao_ms)
+            item.retornados += retornados
+            item.lentas += duracao_ms >= self.limite_ms
+            item.erros += erro
+
+    # Explain amostrado
+
+    def _agendar_explain(self, forma, explicar):
+        if self._explicador is None:
+            with self._lock:
+                if self._explicador is None:
+                    self._explicador = threading.Thread(target=self._executar_explains, daemon=True)
+                    self._explicador.start()
+        try:
+            self._fila.put_nowait((forma, explicar))
+        except queue.Full:
+            pass
+
+    def _executar_explains(self):
+        while True:
+            forma, (banco, comando) = self._fila.get()
+            try:
+                resultado = self._client[banco].command({"explain": comando, "verbosity": "executionStats"})
+            except Exception as e:
+                logger.debug("Explain amostrado falhou para %s: %s", forma, e)
+                continue
+            resumo = resumo_explain(resultado)
+            with self._lock:
+                item = self._estatisticas(forma, forma.split(" ", 1)[0].rsplit(".", 1)[-1])
+                item.amostras += 1
+                item.chaves_examinadas += resumo["chaves"]
+                item.docs_examinados += resumo["documentos"]
+                item.retornados_amostra += resumo["retornados"]
+                item.indices.update(resumo["indices"])
+                item.cobertas += resumo["coberta"]
+
+    # Relatório
+
+    def relatorio(self, limite=20, ordem="tempo_total"):
+        """
+        Piores formas de consulta
+
+        Args:
+            ordem: "tempo_total", "tempo_max", "lentas" ou "examinados" (documentos
+                examinados por documento retornado, nas amostras de explain)
+        """
+        with self._lock:
+            itens = [(forma, item) for forma, item in self._formas.items()]
+            linhas = [self._linha(forma, item) for forma, item in itens]
+
+        chaves = {
+            "tempo_total": lambda linha: linha["tempo_total_ms"],
+            "tempo_max": lambda linha: linha["tempo_max_ms"],
+            "lentas": lambda linha: linha["lentas"],
+            "examinados": lambda linha: linha["explain"]["examinados_por_retornado"] if linha["explain"] else -1
+        }
+        if ordem not in chaves:
+            raise ValueError(f"Ordem inválida: {ordem}")
+        return sorted(linhas, key=chaves[ordem], reverse=True)[:limite]
+
+    @staticmethod
+    def _linha(forma, item):
+        explain = None
+        if item.amostras:
+            examinados = max(item.docs_examinados, item.chaves_examinadas)
+            explain = {
+                "amostras": item.amostras,
+                "chaves_examinadas": item.chaves_examinadas,
+                "docs_examinados": item.docs_examinados,
+                "retornados": item.retornados_amostra,
+                "examinados_por_retornado": round(examinados / max(item.retornados_amostra, 1), 2),
+                "indices": sorted(item.indices) or ["COLLSCAN"],
+                "cobertas": item.cobertas
+            }
+        return {
+            "forma": forma,
+            "colecao": item.colecao,
+            "comando": item.comando,
+            "execucoes": item.execucoes,
+            "tempo_total_ms": round(item.tempo_total, 1),
+            "tempo_medio_ms": round(item.tempo_total / item.execucoes, 2) if item.execucoes else 0.0,
+            "tempo_max_ms": round(item.tempo_max, 1),
+            "lentas": item.lentas,
+            "erros": item.erros,
+            "retornados": item.retornados,
+            "explain": explain
+        }
+
+
+monitor_consultas = MonitorConsultas()
@@ -1,26 +1,209 @@
 # agente_backend/src/gpt_processor.py
 import os
-from openai import OpenAI
+import time
 import json
+import asyncio
+import threading
 from datetime import datetime, timedelta
 import calendar
 from dotenv import load_dotenv
+from src.parser_local import interpretar_gasto
+from src.llm_cache import cache, chave_cache
+from src.coalescencia import chamadas_llm
+from src.classificador import classificadores, CLASSIFICADOR_CONFIANCA_MINIMA
+from src.storage import get_storage
+from src.metrics import registrar_chamada_llm, LLM_RESPOSTAS_INVALIDAS, CLASSIFICADOR_DECISOES
+from src import saida_estruturada
+from src.saida_estruturada import GastoExtraido, ConsultaExtraida, RespostaInvalida
 
 load_dotenv()
 
 # Obtenha a chave da API do OpenAI de variáveis de ambiente
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Cliente OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Tempo limite (segundos) e novas tentativas das chamadas à OpenAI
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_TENTATIVAS = int(os.getenv("OPENAI_MAX_TENTATIVAS", "2"))
+
+# Clientes OpenAI, criados no primeiro uso: importar o pacote openai é a parte
+# mais lenta da partida do worker e muitas frases nem chegam ao GPT.
+# O assíncrono é usado pelas rotas async (não ocupa uma thread durante a chamada)
+client = None
+async_client = None
+_clientes_lock = threading.Lock()
+
+def _cliente():
+    global client
+    if client is None:
+        with _clientes_lock:
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_TENTATIVAS)
+    return client
+
+def _cliente_async():
+    global async_client
+    if async_client is None:
+        with _clientes_lock:
+            if async_client is None:
+                from openai import AsyncOpenAI
+                async_client = AsyncOpenAI(
+                    api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_TENTATIVAS
+                )
+    return async_client
+
+async def fechar_clientes():
+    """Fecha as conexões HTTP dos clientes OpenAI (no desligamento da API)"""
+    global client, async_client
+    if async_client is not None:
+        await async_client.close()
+    if client is not None:
+        client.close()
+    client = async_client = None
+
+# Confiança mínima para aceitar o interpretador local sem chamar o GPT
+CONFIANCA_MINIMA_LOCAL = float(os.getenv("CONFIANCA_MINIMA_LOCAL", "0.8"))
+
+# Saída estruturada (JSON Schema estrito, prompt curto e max_tokens baixo; ver
+# src/saida_estruturada.py). Com "0", usa os prompts em texto livre com gpt-3.5-turbo.
+LLM_SAIDA_ESTRUTURADA = os.getenv("LLM_SAIDA_ESTRUTURADA", "1") == "1"
 
 def processar_texto(texto, user_id):
     """
-    Usa o GPT para processar o texto e extrair informações estruturadas sobre um gasto
+    Extrai informações estruturadas sobre um gasto a partir do texto
+
+    Frases simples são resolvidas pelo interpretador local, com a categoria do
+    classificador aprendido com os gastos do usuário (src/classificador.py)
+    quando ele passa de CLASSIFICADOR_CONFIANCA_MINIMA. O GPT só é chamado
+    quando a confiança local fica abaixo de CONFIANCA_MINIMA_LOCAL e a frase
+    não está no cache; chamadas idênticas simultâneas compartilham uma única
+    chamada (src/coalescencia.py). O campo "origem" ("local", "cache" ou
+    "llm") indica qual caminho foi usado.
+    """
+    pronto, chave = _resolver_texto_sem_llm(texto, user_id, _classificador(user_id))
+    if pronto is not None:
+        return pronto
+
+    def chamar():
+        response = _criar_completion("texto", _parametros_texto(texto), user_id)
+        return _interpretar_resposta_texto(response, texto, chave)
+
+    try:
+        # Chamada para a API do OpenAI (compartilhada com chamadas idênticas em andamento)
+        return _gasto_do_usuario(chamadas_llm.executar(chave, chamar), texto, user_id)
+    except Exception as e:
+        return {"erro": f"Erro ao processar o texto: {str(e)}"}
+
+async def processar_texto_async(texto, user_id):
+    """Versão assíncrona de processar_texto (usa AsyncOpenAI)"""
+    pronto, chave = _resolver_texto_sem_llm(texto, user_id, await _classificador_async(user_id))
+    if pronto is not None:
+        return pronto
+
+    async def chamar():
+        response = await _criar_completion_async("texto", _parametros_texto(texto), user_id)
+        return _interpretar_resposta_texto(response, texto, chave)
+
+    try:
+        return _gasto_do_usuario(await chamadas_llm.executar_async(chave, chamar), texto, user_id)
+    except Exception as e:
+        return {"erro": f"Erro ao processar o texto: {str(e)}"}
+
+def _criar_completion(tipo, parametros, user_id=None):
+    """
+    Chama o GPT registrando latência e tokens usados (métricas em /metrics, tokens por usuário)
+
+    Em uma chamada coalescida, os tokens contam só para `user_id`, o usuário da
+    requisição que a iniciou.
     """
+    inicio = time.perf_counter()
+    response = None
+    try:
+        response = _cliente().chat.completions.create(**parametros)
+        return response
+    finally:
+        registrar_chamada_llm(tipo, parametros["model"], time.perf_counter() - inicio, response, user_id)
+
+async def _criar_completion_async(tipo, parametros, user_id=None):
+    """Versão assíncrona de _criar_completion"""
+    inicio = time.perf_counter()
+    response = None
     try:
-        # Prompt para extrair informações de gasto
-        prompt = f"""
+        response = await _cliente_async().chat.completions.create(**parametros)
+        return response
+    finally:
+        registrar_chamada_llm(tipo, parametros["model"], time.perf_counter() - inicio, response, user_id)
+
+def _resposta_invalida(tipo, erro, conteudo=None):
+    """Conta a resposta descartada e monta o erro devolvido à rota"""
+    LLM_RESPOSTAS_INVALIDAS.inc(kind=tipo, mode="estruturada" if LLM_SAIDA_ESTRUTURADA else "texto")
+    resposta = {"erro": f"Não foi possível processar a resposta do GPT: {erro}"}
+    if conteudo is not None:
+        resposta["resposta_raw"] = conteudo
+    return resposta
+
+def _classificador(user_id):
+    """Classificador aprendido do usuário (carrega o histórico na primeira vez)"""
+    try:
+        return classificadores.obter(get_storage(), user_id)
+    except Exception as e:
+        # Sem o histórico (ex.: banco fora do ar), a categoria fica com as palavras-chave
+        print(f"Classificador de categoria indisponível: {str(e)}")
+        return None
+
+async def _classificador_async(user_id):
+    """Versão assíncrona de _classificador: o carregamento do histórico roda em uma thread"""
+    classificador = classificadores.em_cache(user_id)
+    if classificador is not None:
+        return classificador
+    return await asyncio.to_thread(_classificador, user_id)
+
+def _categoria_aprendida(texto, classificador):
+    """Categoria do classificador aprendido, ou None abaixo de CLASSIFICADOR_CONFIANCA_MINIMA"""
+    if classificador is None:
+        return None
+    tipo, confianca = classificador.classificar(texto)
+    if tipo is None:
+        CLASSIFICADOR_DECISOES.inc(result="unknown")
+        return None
+    if confianca < CLASSIFICADOR_CONFIANCA_MINIMA:
+        CLASSIFICADOR_DECISOES.inc(result="uncertain")
+        return None
+    CLASSIFICADOR_DECISOES.inc(result="confident")
+    return tipo
+
+def _resolver_texto_sem_llm(texto, user_id, classificador=None):
+    """
+    Tenta resolver o gasto pelo interpretador local ou pelo cache
+
+    Returns:
+        Tupla (gasto ou None, chave do cache)
+    """
+    local = interpretar_gasto(texto, categoria=_categoria_aprendida(texto, classificador))
+    if local and local["confianca"] >= CONFIANCA_MINIMA_LOCAL:
+        gasto = {chave: local[chave] for chave in ("valor", "tipo", "data", "descricao")}
+        gasto["user_id"] = user_id
+        gasto["origem"] = "local"
+        return gasto, None
+
+    chave = chave_cache("texto", texto, datetime.now().strftime("%Y-%m-%d"))
+    em_cache = cache.obter(chave)
+    if em_cache is not None:
+        if "erro" not in em_cache:
+            em_cache["descricao"] = texto
+        em_cache["user_id"] = user_id
+        em_cache["origem"] = "cache"
+        return em_cache, chave
+
+    return None, chave
+
+def _parametros_texto(texto):
+    """Parâmetros da chamada ao GPT para extrair um gasto"""
+    if LLM_SAIDA_ESTRUTURADA:
+        return saida_estruturada.parametros_gasto(texto, datetime.now())
+
+    # Prompt para extrair informações de gasto
+    prompt = f"""
         Analise o seguinte texto e extraia informações sobre um gasto financeiro.
         Se não for um gasto, responda com {{"erro": "Não é um gasto"}}.
 
@@ -35,106 +218,193 @@ def processar_texto(texto, user_id):
         Responda em formato JSON com as chaves: valor, tipo, data, descricao
         """
 
-        # Chamada para a API do OpenAI
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # ou gpt-4 se disponível
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,  # Baixa temperatura para resultados consistentes
-            max_tokens=500
-        )
+    return {
+        "model": "gpt-3.5-turbo",  # ou gpt-4 se disponível
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.1,  # Baixa temperatura para resultados consistentes
+        "max_tokens": 500
+    }
 
+def _interpretar_resposta_texto(response, texto, chave):
+    """
+    Converte a resposta do GPT em um gasto e guarda no cache
+
+    Roda uma vez por chamada ao GPT (na requisição que a iniciou); as requisições
+    coalescidas recebem o mesmo resultado e o completam com _gasto_do_usuario.
+
+    Returns:
+        Tupla (gasto ou {"erro": "Não é um gasto"}, True), sem user_id, ou
+        (erro da resposta inválida, False)
+    """
+    if LLM_SAIDA_ESTRUTURADA:
+        try:
+            extraido = saida_estruturada.ler_resposta(response, GastoExtraido)
+        except RespostaInvalida as e:
+            return _resposta_invalida("texto", e), False
+        if extraido.eh_gasto:
+            parsed_response = {
+                "valor": extraido.valor,
+                "tipo": extraido.tipo,
+                "data": extraido.data or datetime.now().strftime("%Y-%m-%d"),
+                "descricao": texto
+            }
+        else:
+            parsed_response = {"erro": "Não é um gasto"}
+    else:
         # Extrair resposta
         gpt_response = response.choices[0].message.content.strip()
-        
+
         # Tentar converter para JSON
         try:
             parsed_response = json.loads(gpt_response)
-            
-            # Sempre definir explicitamente o user_id
-            parsed_response["user_id"] = user_id
-                
-            return parsed_response
-            
         except json.JSONDecodeError:
             # Se o GPT não retornar um JSON válido
-            return {
-                "erro": "Não foi possível processar a resposta do GPT",
-                "resposta_raw": gpt_response
-            }
+            return _resposta_invalida("texto", "JSON inválido", gpt_response), False
 
-    except Exception as e:
-        return {"erro": f"Erro ao processar o texto: {str(e)}"}
+    # Guardar no cache antes de associar ao usuário
+    cache.salvar(chave, parsed_response)
+    return parsed_response, True
+
+def _gasto_do_usuario(resultado, texto, user_id):
+    """Cópia do resultado compartilhado de _interpretar_resposta_texto com o texto e o usuário da requisição"""
+    resposta, valida = resultado
+    resposta = dict(resposta)
+    if not valida:
+        return resposta
+    if "erro" not in resposta:
+        resposta["descricao"] = texto
+    # Sempre definir explicitamente o user_id
+    resposta["user_id"] = user_id
+    resposta["origem"] = "llm"
+    return resposta
 
 def processar_consulta(texto, user_id):
     """
     Usa o GPT para interpretar uma consulta sobre gastos
+
+    O resultado é guardado em cache pela consulta normalizada e pela data atual,
+    e consultas idênticas simultâneas compartilham uma única chamada ao GPT.
     """
+    hoje = datetime.now()
     try:
-        hoje = datetime.now()
-        
-        # Prompt para interpretar consulta
-        prompt = f"""
+        chave = chave_cache("consulta", texto, hoje.strftime("%Y-%m-%d"))
+        em_cache = cache.obter(chave)
+        if em_cache is not None:
+            em_cache["user_id"] = user_id
+            return em_cache
+
+        def chamar():
+            response = _criar_completion("consulta", _parametros_consulta(texto, hoje), user_id)
+            return _interpretar_resposta_consulta(response, chave, hoje)
+
+        # Chamada para a API do OpenAI (compartilhada com chamadas idênticas em andamento)
+        return _consulta_do_usuario(chamadas_llm.executar(chave, chamar), user_id)
+    except Exception as e:
+        return _erro_consulta(e, user_id, hoje)
+
+async def processar_consulta_async(texto, user_id):
+    """Versão assíncrona de processar_consulta (usa AsyncOpenAI)"""
+    hoje = datetime.now()
+    try:
+        chave = chave_cache("consulta", texto, hoje.strftime("%Y-%m-%d"))
+        em_cache = cache.obter(chave)
+        if em_cache is not None:
+            em_cache["user_id"] = user_id
+            return em_cache
+
+        async def chamar():
+            response = await _criar_completion_async("consulta", _parametros_consulta(texto, hoje), user_id)
+            return _interpretar_resposta_consulta(response, chave, hoje)
+
+        return _consulta_do_usuario(await chamadas_llm.executar_async(chave, chamar), user_id)
+    except Exception as e:
+        return _erro_consulta(e, user_id, hoje)
+
+def _parametros_consulta(texto, hoje):
+    """Parâmetros da chamada ao GPT para interpretar uma consulta"""
+    if LLM_SAIDA_ESTRUTURADA:
+        return saida_estruturada.parametros_consulta(texto, hoje)
+
+    # Prompt para interpretar consulta
+    prompt = f"""
         Analise o seguinte texto como uma consulta sobre gastos financeiros:
-        
+
         Texto: "{texto}"
-        
+
         Data atual: {hoje.strftime('%Y-%m-%d')}
-        
+
         Interprete a consulta e determine:
         1. Período de tempo (diário, semanal, mensal, anual, personalizado)
         2. Categoria específica (se houver)
         3. Datas de início e fim no formato YYYY-MM-DD
-        
+
         Por exemplo:
         - "gastos deste mês" seria o mês atual completo
         - "gastos com alimentação" seria todos os gastos da categoria alimentação
         - "gastos com transporte esta semana" seria gastos de transporte da semana atual
-        
+
         Responda em formato JSON com as chaves: periodo, start_date, end_date, tipo (categoria)
         """
 
-        # Chamada para a API do OpenAI
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # ou gpt-4 se disponível
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=500
-        )
+    return {
+        "model": "gpt-3.5-turbo",  # ou gpt-4 se disponível
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.1,
+        "max_tokens": 500
+    }
+
+def _interpretar_resposta_consulta(response, chave, hoje):
+    """
+    Converte a resposta do GPT nos parâmetros da consulta e guarda no cache
 
+    Como _interpretar_resposta_texto, roda uma vez por chamada ao GPT e retorna
+    (parâmetros sem user_id, True) ou (erro da resposta inválida, False).
+    """
+    if LLM_SAIDA_ESTRUTURADA:
+        try:
+            parsed_response = saida_estruturada.ler_resposta(response, ConsultaExtraida).como_dict()
+        except RespostaInvalida as e:
+            return _resposta_invalida("consulta", e), False
+    else:
         # Extrair resposta
         gpt_response = response.choices[0].message.content.strip()
-        
+
         # Tentar converter para JSON
         try:
             parsed_response = json.loads(gpt_response)
-            
-            # Sempre definir explicitamente o user_id
-            parsed_response["user_id"] = user_id
-                
-            # Valores padrão para datas se não forem fornecidas
-            if "start_date" not in parsed_response or not parsed_response["start_date"]:
-                # Padrão: primeiro dia do mês atual
-                primeiro_dia_mes = hoje.replace(day=1)
-                parsed_response["start_date"] = primeiro_dia_mes.strftime("%Y-%m-%d")
-                
-            if "end_date" not in parsed_response or not parsed_response["end_date"]:
-                # Padrão: último dia do mês atual
-                ultimo_dia_mes = hoje.replace(day=calendar.monthrange(hoje.year, hoje.month)[1])
-                parsed_response["end_date"] = ultimo_dia_mes.strftime("%Y-%m-%d")
-                
-            return parsed_response
-            
         except json.JSONDecodeError:
             # Se o GPT não retornar um JSON válido
-            return {
-                "erro": "Não foi possível processar a resposta do GPT",
-                "resposta_raw": gpt_response
-            }
+            return _resposta_invalida("consulta", "JSON inválido", gpt_response), False
 
-    except Exception as e:
-        return {
-            "erro": f"Erro ao processar a consulta: {str(e)}",
-            "user_id": user_id,
-            "start_date": hoje.replace(day=1).strftime("%Y-%m-%d"),
-            "end_date": hoje.replace(day=calendar.monthrange(hoje.year, hoje.month)[1]).strftime("%Y-%m-%d")
-        }
\ No newline at end of file
+    # Valores padrão para datas se não forem fornecidas
+    if "start_date" not in parsed_response or not parsed_response["start_date"]:
+        # Padrão: primeiro dia do mês atual
+        primeiro_dia_mes = hoje.replace(day=1)
+        parsed_response["start_date"] = primeiro_dia_mes.strftime("%Y-%m-%d")
+
+    if "end_date" not in parsed_response or not parsed_response["end_date"]:
+        # Padrão: último dia do mês atual
+        ultimo_dia_mes = hoje.replace(day=calendar.monthrange(hoje.year, hoje.month)[1])
+        parsed_response["end_date"] = ultimo_dia_mes.strftime("%Y-%m-%d")
+
+    parsed_response.pop("user_id", None)
+    cache.salvar(chave, parsed_response)
+    return parsed_response, True
+
+def _consulta_do_usuario(resultado, user_id):
+    """Cópia do resultado compartilhado de _interpretar_resposta_consulta com o usuário da requisição"""
+    resposta, valida = resultado
+    resposta = dict(resposta)
+    if valida:
+        # Sempre definir explicitamente o user_id
+        resposta["user_id"] = user_id
+    return resposta
+
+def _erro_consulta(erro, user_id, hoje):
+    """Resposta de erro da consulta, com o mês atual como período padrão"""
+    return {
+        "erro": f"Erro ao processar a consulta: {str(erro)}",
+        "user_id": user_id,
+        "start_date": hoje.replace(day=1).strftime("%Y-%m-%d"),
+        "end_date": hoje.replace(day=calendar.monthrange(hoje.year, hoje.month)[1]).strftime("%Y-%m-%d")
+    }
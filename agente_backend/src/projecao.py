@@ -0,0 +1,306 @@
+# agente_backend/src/projecao.py
+"""
+Projeção de gastos do mês a partir do histórico do usuário.
+
+A projeção linear (total / dias passados * dias do mês) erra muito no início do
+mês: no dia 2, com o aluguel já pago, ela multiplica o aluguel por 15. Aqui o
+gasto é separado em duas partes:
+
+- recorrente: gastos com a mesma categoria e valor (arredondado) presentes em
+  quase todos os meses anteriores, perto do mesmo dia (aluguel, mensalidades, assinaturas). Os que
+  ainda não apareceram no mês atual entram como pendentes, pelo valor típico.
+- variável: o restante, modelado como gasto diário por dia da semana (média e
+  variância dos meses anteriores). Os dias que faltam somam as médias do seu
+  dia da semana, ajustadas pelo ritmo do mês atual; as variâncias dão a faixa.
+
+O estado de cada usuário (gastos da janela de treino e do mês atual) fica em
+cache e é atualizado a cada gasto salvo ou excluído (`registrar`/`remover`);
+o ajuste é refeito a partir desse estado em memória, sem nova consulta ao banco.
+O modelo expira depois de PROJECAO_CACHE_TTL segundos, para incluir gravações
+feitas fora deste processo (managers, outros workers).
+"""
+import os
+import math
+import time
+import threading
+from calendar import monthrange
+from collections import OrderedDict, defaultdict
+from datetime import date, timedelta
+from statistics import median
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Meses completos usados no ajuste
+PROJECAO_MESES = int(os.getenv("PROJECAO_MESES", "6"))
+PROJECAO_CACHE_TAMANHO = int(os.getenv("PROJECAO_CACHE_TAMANHO", "5000"))
+PROJECAO_CACHE_TTL = int(os.getenv("PROJECAO_CACHE_TTL", "600"))
+
+# Faixa de 90%: média ± 1,645 desvios
+CONFIANCA = 0.9
+Z_CONFIANCA = 1.645
+
+# Um gasto recorrente aparece em 3/4 dos meses, até 1,25 vez por mês (em média)
+# e varia até 3 dias em torno do dia típico
+RECORRENTE_FRACAO_MESES = 0.75
+RECORRENTE_MAX_POR_MES = 1.25
+RECORRENTE_TOLERANCIA_DIAS = 3
+
+# Peso do histórico no ajuste pelo ritmo do mês atual, em dias de gasto médio
+RITMO_DIAS_PESO = 7
+
+# Sem histórico, a faixa da projeção linear é de ±25%
+MARGEM_LINEAR = 0.25
+
+
+def _mes(data):
+    return data[:7]
+
+
+def _inicio_mes(ano, mes):
+    return date(ano, mes, 1)
+
+
+def _meses_antes(dia, quantidade):
+    """Primeiro dia do mês `quantidade` meses antes do mês de `dia`"""
+    indice = dia.year * 12 + dia.month - 1 - quantidade
+    return _inicio_mes(indice // 12, indice % 12 + 1)
+
+
+def _chave_recorrencia(tipo, valor):
+    # Mesmo valor com centavos diferentes (ex.: conta de 99,90 / 100,10) conta como o mesmo gasto
+    return tipo, round(float(valor))
+
+
+class ModeloProjecao:
+    """Estado da projeção de um usuário para o mês de referência"""
+
+    def __init__(self, referencia, gastos):
+        # referencia: primeiro dia do mês atual
+        self.referencia = referencia
+        self.inicio_treino = _meses_antes(referencia, PROJECAO_MESES)
+        self.mes_atual = referencia.strftime("%Y-%m")
+        # (data, tipo, valor) da janela de treino e do mês atual
+        self.treino = []
+        self.atual = []
+        self._ajuste = None
+        self._lock = threading.Lock()
+        for gasto in gastos:
+            self._adicionar(gasto)
+
+    def _lista(self, data):
+        if _mes(data) == self.mes_atual:
+            return self.atual
+        if self.inicio_treino.isoformat() <= data < self.referencia.isoformat():
+            return self.treino
+        return None
+
+    def _adicionar(self, gasto):
+        lista = self._lista(gasto["data"])
+        if lista is None:
+            return False
+        lista.append((gasto["data"], gasto["tipo"], float(gasto["valor"])))
+        return True
+
+    def registrar(self, gasto):
+        """Inclui um gasto salvo; o ajuste só é refeito se ele cair na janela de treino"""
+        with self._lock:
+            if self._adicionar(gasto) and _mes(gasto["data"]) != self.mes_atual:
+                self._ajuste = None
+
+    def remover(self, gasto):
+        """Retira um gasto excluído"""
+        with self._lock:
+            lista = self._lista(gasto["data"])
+            item = (gasto["data"], gasto["tipo"], float(gasto["valor"]))
+            if lista is not None and item in lista:
+                lista.remove(item)
+                if lista is self.treino:
+                    self._ajuste = None
+
+    def _ajustar(self):
+        """Recorrentes e média/variância do gasto variável por dia da semana"""
+        if not self.treino:
+            return None
+
+        primeiro_mes = min(data for data, _, _ in self.treino)[:7]
+        inicio = date(int(primeiro_mes[:4]), int(primeiro_mes[5:7]), 1)
+        n_meses = (self.referencia.year - inicio.year) * 12 + self.referencia.month - inicio.month
+
+        # Recorrente: presente em pelo menos 3/4 dos meses (no mínimo 2), cerca de
+        # uma vez por mês e sempre perto do mesmo dia. Sem as duas últimas condições,
+        # valores comuns de gastos variáveis (ex.: R$ 30 no mercado) se repetiriam por acaso.
+        ocorrencias = defaultdict(list)
+        for data, tipo, valor in self.treino:
+            ocorrencias[_chave_recorrencia(tipo, valor)].append((_mes(data), int(data[8:10]), valor))
+        minimo_meses = max(2, math.ceil(n_meses * RECORRENTE_FRACAO_MESES))
+        recorrentes = {}
+        for chave, itens in ocorrencias.items():
+            meses = {mes for mes, _, _ in itens}
+            if len(meses) < minimo_meses or len(itens) > len(meses) * RECORRENTE_MAX_POR_MES:
+                continue
+            dias = [dia for _, dia, _ in itens]
+            dia_tipico = median(dias)
+            if median(abs(dia - dia_tipico) for dia in dias) <= RECORRENTE_TOLERANCIA_DIAS:
+                recorrentes[chave] = median(valor for _, _, valor in itens)
+
+        # Gasto variável de cada dia do período de treino (dias sem gasto contam como zero)
+        por_dia = defaultdict(float)
+        for data, tipo, valor in self.treino:
+            if _chave_recorrencia(tipo, valor) not in recorrentes:
+                por_dia[data] += valor
+        amostras = [[] for _ in range(7)]
+        dia = inicio
+        while dia < self.referencia:
+            amostras[dia.weekday()].append(por_dia.get(dia.isoformat(), 0.0))
+            dia += timedelta(days=1)
+
+        medias, variancias = [], []
+        for valores in amostras:
+            media = sum(valores) / len(valores) if valores else 0.0
+            medias.append(media)
+            variancias.append(
+                sum((v - media) ** 2 for v in valores) / (len(valores) - 1) if len(valores) > 1 else media ** 2
+            )
+        return {"recorrentes": recorrentes, "medias": medias, "variancias": variancias, "meses": n_meses}
+
+    def projetar(self, hoje, total_atual):
+        """
+        Projeção do total do mês com faixa de confiança
+
+        Args:
+            hoje: data de referência (dentro do mês do modelo)
+            total_atual: total já gasto no mês até agora
+        """
+        dias_no_mes = monthrange(hoje.year, hoje.month)[1]
+        with self._lock:
+            if self._ajuste is None:
+                self._ajuste = self._ajustar()
+            ajuste = self._ajuste
+            atual = list(self.atual)
+
+        if ajuste is None:
+            linear = total_atual / hoje.day * dias_no_mes
+            return {
+                "valor": round(linear, 2),
+                "minimo": round(max(total_atual, linear * (1 - MARGEM_LINEAR)), 2),
+                "maximo": round(linear * (1 + MARGEM_LINEAR), 2),
+                "recorrente_pendente": 0.0,
+                "variavel_restante": round(linear - total_atual, 2),
+                "confianca": CONFIANCA,
+                "metodo": "linear",
+                "meses_historico": 0
+            }
+
+        recorrentes = ajuste["recorrentes"]
+        vistos = {_chave_recorrencia(tipo, valor) for _, tipo, valor in atual}
+        pendente = sum(valor for chave, valor in recorrentes.items() if chave not in vistos)
+
+        # Ritmo do mês: gasto variável até hoje contra o esperado. O histórico entra
+        # como RITMO_DIAS_PESO dias "já observados", então poucos dias no início do
+        # mês mexem pouco na projeção e o ritmo real ganha peso com o passar do mês.
+        variavel_atual = sum(valor for _, tipo, valor in atual if _chave_recorrencia(tipo, valor) not in recorrentes)
+        dias_passados = [hoje.replace(day=d) for d in range(1, hoje.day + 1)]
+        esperado_ate_hoje = sum(ajuste["medias"][d.weekday()] for d in dias_passados)
+        peso_historico = RITMO_DIAS_PESO * sum(ajuste["medias"]) / 7
+        fator = 1.0
+        if esperado_ate_hoje + peso_historico > 0:
+            fator = min(2.0, max(0.5, (variavel_atual + peso_historico) / (esperado_ate_hoje + peso_historico)))
+
+        dias_restantes = [hoje.replace(day=d) for d in range(hoje.day + 1, dias_no_mes + 1)]
+        restante = fator * sum(ajuste["medias"][d.weekday()] for d in dias_restantes)
+        desvio = fator * math.sqrt(sum(ajuste["variancias"][d.weekday()] for d in dias_restantes))
+
+        projecao = total_atual + pendente + restante
+        return {
+            "valor": round(projecao, 2),
+            "minimo": round(max(total_atual, projecao - Z_CONFIANCA * desvio), 2),
+            "maximo": round(projecao + Z_CONFIANCA * desvio, 2),
+            "recorrente_pendente": round(pendente, 2),
+            "variavel_restante": round(restante, 2),
+            "confianca": CONFIANCA,
+            "metodo": "historico",
+            "meses_historico": ajuste["meses"]
+        }
+
+
+class CacheProjecoes:
+    """Modelos por usuário (LRU com expiração), atualizados incrementalmente a cada gravação"""
+
+    def __init__(self, tamanho_maximo=PROJECAO_CACHE_TAMANHO, ttl=PROJECAO_CACHE_TTL):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        # user_id -> (modelo, expiração)
+        self._modelos = OrderedDict()
+        # user_id -> [carregamentos em andamento, gravações], só enquanto há
+        # carregamentos: um carregamento que começou antes de uma gravação não é
+        # guardado (ela pode ter sido aplicada só no modelo anterior)
+        self._alteracoes = {}
+        self._lock = threading.Lock()
+
+    def obter(self, storage, user_id, hoje=None):
+        """Modelo do usuário para o mês de `hoje`, carregado do armazenamento se preciso"""
+        referencia = (hoje or date.today()).replace(day=1)
+        with self._lock:
+            item = self._modelos.get(user_id)
+            if item is not None and item[0].referencia == referencia and item[1] > time.monotonic():
+                self._modelos.move_to_end(user_id)
+                return item[0]
+            contagem = self._alteracoes.setdefault(user_id, [0, 0])
+            contagem[0] += 1
+            alteracoes = contagem[1]
+
+        try:
+            fim = referencia.replace(day=monthrange(referencia.year, referencia.month)[1])
+            gastos = storage.find_range(
+                user_id, _meses_antes(referencia, PROJECAO_MESES).isoformat(), fim.isoformat(),
+                fields=["data", "tipo", "valor"]
+            )
+            modelo = ModeloProjecao(referencia, gastos)
+        except BaseException:
+            with self._lock:
+                self._fim_carregamento(user_id, contagem)
+            raise
+
+        with self._lock:
+            self._fim_carregamento(user_id, contagem)
+            # Verificação e troca sob o mesmo lock: na virada do mês, uma requisição
+            # ainda no mês anterior não substitui o modelo do mês novo
+            atual = self._modelos.get(user_id)
+            if contagem[1] != alteracoes:
+                return modelo
+            if atual is not None and atual[0].referencia > referencia:
+                return modelo
+            self._modelos[user_id] = (modelo, time.monotonic() + self.ttl)
+            self._modelos.move_to_end(user_id)
+            while len(self._modelos) > self.tamanho_maximo:
+                self._modelos.popitem(last=False)
+        return modelo
+
+    def _fim_carregamento(self, user_id, contagem):
+        """Encerra um carregamento (com self._lock); sem outros em andamento, a contagem sai do dicionário"""
+        contagem[0] -= 1
+        if not contagem[0]:
+            del self._alteracoes[user_id]
+
+    def _aplicar(self, user_id, gastos, operacao):
+        with self._lock:
+            if user_id in self._alteracoes:
+                self._alteracoes[user_id][1] += 1
+            item = self._modelos.get(user_id)
+            if item is None:
+                return
+        for gasto in gastos:
+            getattr(item[0], operacao)(gasto)
+
+    def registrar(self, user_id, gastos):
+        """Atualiza o modelo com gastos recém-salvos"""
+        self._aplicar(user_id, gastos, "registrar")
+
+    def remover(self, user_id, gastos):
+        """Atualiza o modelo com gastos excluídos"""
+        self._aplicar(user_id, gastos, "remover")
+
+
+projecoes = CacheProjecoes()
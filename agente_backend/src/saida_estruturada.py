@@ -0,0 +1,179 @@
+# agente_backend/src/saida_estruturada.py
+"""
+Modo de saída estruturada das chamadas ao GPT (LLM_SAIDA_ESTRUTURADA).
+
+Em vez das instruções longas em texto livre, a chamada leva um prompt curto e um
+JSON Schema estrito (`response_format` do tipo json_schema): o modelo só pode
+responder com um objeto no formato do esquema, então a resposta sempre é um
+JSON válido. O texto do gasto não é pedido de volta (a descrição é o próprio
+texto), o que reduz os tokens de saída e permite um `max_tokens` pequeno.
+
+A resposta ainda é validada e convertida em `GastoExtraido` ou
+`ConsultaExtraida`; respostas recusadas, truncadas ou fora do esquema levantam
+RespostaInvalida.
+"""
+import os
+import json
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Optional
+from dotenv import load_dotenv
+
+from src.parser_local import CATEGORIAS
+
+load_dotenv()
+
+# Structured Outputs (json_schema estrito) exige gpt-4o-mini ou mais recente
+LLM_MODELO_ESTRUTURADO = os.getenv("LLM_MODELO_ESTRUTURADO", "gpt-4o-mini")
+LLM_MAX_TOKENS_ESTRUTURADO = int(os.getenv("LLM_MAX_TOKENS_ESTRUTURADO", "64"))
+
+PERIODOS = ["diario", "semanal", "mensal", "anual", "personalizado"]
+_DIAS_SEMANA = ["segunda-feira", "terça-feira", "quarta-feira", "quinta-feira", "sexta-feira", "sábado", "domingo"]
+
+_DATA_OU_NULO = {"type": ["string", "null"], "description": "YYYY-MM-DD"}
+_CATEGORIA_OU_NULO = {"type": ["string", "null"], "enum": [*CATEGORIAS, None]}
+
+ESQUEMA_GASTO = {
+    "type": "object",
+    "properties": {
+        "eh_gasto": {"type": "boolean"},
+        "valor": {"type": ["number", "null"]},
+        "tipo": _CATEGORIA_OU_NULO,
+        "data": _DATA_OU_NULO
+    },
+    "required": ["eh_gasto", "valor", "tipo", "data"],
+    "additionalProperties": False
+}
+
+ESQUEMA_CONSULTA = {
+    "type": "object",
+    "properties": {
+        "periodo": {"type": "string", "enum": PERIODOS},
+        "start_date": _DATA_OU_NULO,
+        "end_date": _DATA_OU_NULO,
+        "tipo": _CATEGORIA_OU_NULO
+    },
+    "required": ["periodo", "start_date", "end_date", "tipo"],
+    "additionalProperties": False
+}
+
+
+class RespostaInvalida(ValueError):
+    """Resposta do GPT recusada, truncada ou fora do esquema"""
+
+
+def _data(valor, campo):
+    if valor is None:
+        return None
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise RespostaInvalida(f"{campo} inválida: {valor!r}")
+
+
+def _categoria(valor):
+    if valor is not None and valor not in CATEGORIAS:
+        raise RespostaInvalida(f"Categoria inválida: {valor!r}")
+    return valor
+
+
+@dataclass(frozen=True)
+class GastoExtraido:
+    eh_gasto: bool
+    valor: Optional[float]
+    tipo: Optional[str]
+    data: Optional[str]
+
+    @classmethod
+    def validar(cls, dados):
+        if not isinstance(dados.get("eh_gasto"), bool):
+            raise RespostaInvalida("eh_gasto ausente")
+        valor = dados.get("valor")
+        if dados["eh_gasto"]:
+            if isinstance(valor, bool) or not isinstance(valor, (int, float)) or valor <= 0:
+                raise RespostaInvalida(f"Valor inválido: {valor!r}")
+            if dados.get("tipo") is None:
+                raise RespostaInvalida("Categoria ausente")
+        return cls(
+            eh_gasto=dados["eh_gasto"],
+            valor=float(valor) if valor is not None else None,
+            tipo=_categoria(dados.get("tipo")),
+            data=_data(dados.get("data"), "Data")
+        )
+
+
+@dataclass(frozen=True)
+class ConsultaExtraida:
+    periodo: str
+    start_date: Optional[str]
+    end_date: Optional[str]
+    tipo: Optional[str]
+
+    @classmethod
+    def validar(cls, dados):
+        if dados.get("periodo") not in PERIODOS:
+            raise RespostaInvalida(f"Período inválido: {dados.get('periodo')!r}")
+        consulta = cls(
+            periodo=dados["periodo"],
+            start_date=_data(dados.get("start_date"), "start_date"),
+            end_date=_data(dados.get("end_date"), "end_date"),
+            tipo=_categoria(dados.get("tipo"))
+        )
+        if consulta.start_date and consulta.end_date and consulta.start_date > consulta.end_date:
+            raise RespostaInvalida("start_date depois de end_date")
+        return consulta
+
+    def como_dict(self):
+        return asdict(self)
+
+
+def _parametros(nome, esquema, instrucao, texto):
+    return {
+        "model": LLM_MODELO_ESTRUTURADO,
+        "messages": [
+            {"role": "system", "content": instrucao},
+            {"role": "user", "content": texto}
+        ],
+        "temperature": 0,
+        "max_tokens": LLM_MAX_TOKENS_ESTRUTURADO,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": nome, "strict": True, "schema": esquema}
+        }
+    }
+
+
+def parametros_gasto(texto, hoje):
+    """Parâmetros da chamada que extrai um gasto"""
+    instrucao = (
+        f"Extraia o gasto descrito pelo usuário. Hoje: {hoje.strftime('%Y-%m-%d')}. "
+        "data null se não citada; eh_gasto false se não for um gasto."
+    )
+    return _parametros("gasto", ESQUEMA_GASTO, instrucao, texto)
+
+
+def parametros_consulta(texto, hoje):
+    """Parâmetros da chamada que interpreta uma consulta de gastos"""
+    instrucao = (
+        f"Interprete a consulta de gastos do usuário. Hoje: {hoje.strftime('%Y-%m-%d')} "
+        f"({_DIAS_SEMANA[hoje.weekday()]}). "
+        "Datas null se a consulta não cita o período: o padrão é o mês atual."
+    )
+    return _parametros("consulta", ESQUEMA_CONSULTA, instrucao, texto)
+
+
+def ler_resposta(response, classe):
+    """Valida a resposta da chamada e a converte em `classe` (GastoExtraido ou ConsultaExtraida)"""
+    escolha = response.choices[0]
+    mensagem = escolha.message
+    if getattr(mensagem, "refusal", None):
+        raise RespostaInvalida(f"Resposta recusada: {mensagem.refusal}")
+    if getattr(escolha, "finish_reason", None) == "length":
+        raise RespostaInvalida("Resposta truncada por max_tokens")
+    try:
+        dados = json.loads(mensagem.content)
+    except (TypeError, json.JSONDecodeError):
+        raise RespostaInvalida("Resposta não é um JSON")
+    if not isinstance(dados, dict):
+        raise RespostaInvalida("Resposta não é um objeto")
+    return classe.validar(dados)
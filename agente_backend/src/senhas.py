@@ -0,0 +1,225 @@
+# agente_backend/src/senhas.py
+"""
+Hash e verificação de senhas fora do processo da API.
+
+O bcrypt é deliberadamente caro; executado no threadpool das rotas, uma rajada
+de logins ocupa todas as threads e atrasa rotas que não têm nada a ver com
+autenticação. Aqui o trabalho vai para um pool de processos de tamanho fixo
+(SENHA_WORKERS) e as rotas apenas aguardam o resultado.
+
+- BCRYPT_ROUNDS define o custo dos hashes novos. Senhas com custo diferente são
+  refeitas no próximo login bem-sucedido (`verificar_senha` devolve o hash novo).
+- `LimitadorLogin` limita as tentativas antes de qualquer trabalho de bcrypt,
+  para que força bruta não consuma CPU. O limite principal é por (username, IP
+  do cliente), para que um terceiro não consiga bloquear o login de uma conta
+  conhecida errando a senha de propósito; tetos mais altos por username e por
+  IP cobrem ataques distribuídos por muitos IPs ou muitas contas.
+
+Os processos do pool são iniciados com "forkserver" (ou "spawn"), nunca com
+fork: o pool é criado depois que a API já tem threads (uvicorn, threadpool,
+explains do MongoDB), e um fork nesse estado pode herdar locks travados. Se um
+processo do pool morrer, o pool é recriado e a operação repetida uma vez.
+"""
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+SENHA_WORKERS = int(os.getenv("SENHA_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Tentativas de login por (username, IP) dentro da janela (sucesso zera a contagem)
+LOGIN_MAX_TENTATIVAS = int(os.getenv("LOGIN_MAX_TENTATIVAS", "5"))
+# Tetos por username (tentativas vindas de muitos IPs) e por IP (muitos usernames)
+LOGIN_MAX_TENTATIVAS_USUARIO = int(os.getenv("LOGIN_MAX_TENTATIVAS_USUARIO", "20"))
+LOGIN_MAX_TENTATIVAS_IP = int(os.getenv("LOGIN_MAX_TENTATIVAS_IP", "50"))
+LOGIN_JANELA_SEGUNDOS = int(os.getenv("LOGIN_JANELA_SEGUNDOS", "300"))
+LOGIN_USUARIOS_RASTREADOS = int(os.getenv("LOGIN_USUARIOS_RASTREADOS", "100000"))
+
+
+def custo_do_hash(hashed):
+    """Custo (log2 das rodadas) de um hash bcrypt no formato $2b$12$..."""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+# Funções executadas nos processos do pool (precisam ser de nível de módulo)
+
+def _gerar_hash(senha, rounds):
+    return bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _verificar(senha, hashed, rounds):
+    """Retorna (senha correta, hash novo se o custo mudou)"""
+    if not bcrypt.checkpw(senha.encode("utf-8"), hashed.encode("utf-8")):
+        return False, None
+    if custo_do_hash(hashed) != rounds:
+        return True, _gerar_hash(senha, rounds)
+    return True, None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _contexto():
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+
+
+def _obter_pool():
+    # Criado no primeiro uso, para não iniciar processos ao importar o módulo
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=SENHA_WORKERS, mp_context=_contexto())
+        return _pool
+
+
+def _descartar_pool(pool):
+    """Descarta um pool quebrado; o próximo uso cria outro"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def fechar():
+    """Encerra os processos do pool (no desligamento da API)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def _executar(funcao, *args):
+    loop = asyncio.get_running_loop()
+    pool = _obter_pool()
+    try:
+        return await loop.run_in_executor(pool, funcao, *args)
+    except BrokenProcessPool:
+        # Um processo do pool morreu (ex.: falta de memória) e o pool inteiro
+        # ficou inutilizável: recria e tenta de novo uma vez
+        print("Pool de senhas quebrado; recriando")
+        _descartar_pool(pool)
+        return await loop.run_in_executor(_obter_pool(), funcao, *args)
+
+
+async def gerar_hash(senha, rounds=None):
+    """Hash bcrypt da senha, calculado no pool de processos"""
+    return await _executar(_gerar_hash, senha, rounds or BCRYPT_ROUNDS)
+
+
+async def verificar_senha(senha, hashed, rounds=None):
+    """
+    Verifica a senha no pool de processos
+
+    Returns:
+        Tupla (senha correta, hash novo ou None). O hash novo só vem quando a
+        senha está correta e o custo do hash salvo difere de BCRYPT_ROUNDS.
+    """
+    return await _executar(_verificar, senha, hashed, rounds or BCRYPT_ROUNDS)
+
+
+class LimitadorTentativas:
+    """
+    Janela deslizante de tentativas por chave
+
+    Cada tentativa é reservada antes da verificação, então uma rajada simultânea
+    também é limitada (e não apenas as falhas já concluídas).
+    """
+
+    def __init__(self, max_tentativas=LOGIN_MAX_TENTATIVAS, janela=LOGIN_JANELA_SEGUNDOS,
+                 max_usuarios=LOGIN_USUARIOS_RASTREADOS):
+        self.max_tentativas = max_tentativas
+        self.janela = janela
+        self.max_usuarios = max_usuarios
+        self._tentativas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _espera(self, chave, agora):
+        """Segundos até a próxima tentativa permitida (0 se permitida), sem registrar"""
+        tentativas = self._tentativas.get(chave)
+        if tentativas is None:
+            return 0
+        while tentativas and tentativas[0] <= agora - self.janela:
+            tentativas.popleft()
+        if len(tentativas) >= self.max_tentativas:
+            return max(1, int(tentativas[0] + self.janela - agora) + 1)
+        return 0
+
+    def _registrar(self, chave, agora):
+        tentativas = self._tentativas.get(chave)
+        if tentativas is None:
+            tentativas = self._tentativas[chave] = deque()
+        self._tentativas.move_to_end(chave)
+        tentativas.append(agora)
+        while len(self._tentativas) > self.max_usuarios:
+            self._tentativas.popitem(last=False)
+
+    def reservar(self, chave):
+        """Registra uma tentativa; retorna 0 se permitida ou os segundos até a próxima"""
+        agora = time.monotonic()
+        with self._lock:
+            espera = self._espera(chave, agora)
+            if not espera:
+                self._registrar(chave, agora)
+            return espera
+
+    def limpar(self, chave):
+        """Zera as tentativas após um login bem-sucedido"""
+        with self._lock:
+            self._tentativas.pop(chave, None)
+
+
+class LimitadorLogin:
+    """
+    Limites de tentativas de login antes de qualquer trabalho de bcrypt
+
+    - por (username, IP): o limite principal, zerado por um login bem-sucedido;
+    - por username: teto mais alto para tentativas contra uma conta vindas de
+      muitos IPs (só o par deixaria a verificação ilimitada);
+    - por IP: teto para um IP que tenta muitos usernames.
+
+    Os tetos por username e por IP não são zerados pelo sucesso. Uma tentativa só
+    é registrada se os três limites a permitem.
+    """
+
+    def __init__(self, max_par=LOGIN_MAX_TENTATIVAS, max_usuario=LOGIN_MAX_TENTATIVAS_USUARIO,
+                 max_ip=LOGIN_MAX_TENTATIVAS_IP, janela=LOGIN_JANELA_SEGUNDOS,
+                 max_chaves=LOGIN_USUARIOS_RASTREADOS):
+        self.par = LimitadorTentativas(max_par, janela, max_chaves)
+        self.usuario = LimitadorTentativas(max_usuario, janela, max_chaves)
+        self.ip = LimitadorTentativas(max_ip, janela, max_chaves)
+        self._lock = threading.Lock()
+
+    def reservar(self, username, ip):
+        """Registra uma tentativa; retorna 0 se permitida ou os segundos até a próxima"""
+        agora = time.monotonic()
+        limites = ((self.par, (username, ip)), (self.usuario, username), (self.ip, ip))
+        with self._lock:
+            espera = max(limitador._espera(chave, agora) for limitador, chave in limites)
+            if not espera:
+                for limitador, chave in limites:
+                    limitador._registrar(chave, agora)
+            return espera
+
+    def limpar(self, username, ip):
+        """Zera as tentativas do par após um login bem-sucedido"""
+        self.par.limpar((username, ip))
+
+
+limitador_login = LimitadorLogin()
@@ -0,0 +1,307 @@
+# agente_backend/src/storage.py
+"""
+Interface de armazenamento de gastos e seleção do backend.
+
+O backend é escolhido pela variável de ambiente EXPENSE_BACKEND:
+- "mongo" (padrão): MongoDB, via src/db_mongo.py
+- "sqlite": SQLite embarcado em modo WAL, via src/db_sqlite_expenses.py
+
+As rotas usam apenas os métodos desta interface, então os dois backends são
+intercambiáveis e podem ser comparados com o mesmo benchmark.
+"""
+import os
+import math
+import asyncio
+from datetime import date, datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXPENSE_BACKEND = os.getenv("EXPENSE_BACKEND", "mongo").lower()
+
+# Mensagem de erro de save_many para gastos importados que já existem
+# (mesmo hash_importacao do usuário, barrado pelo índice único)
+ERRO_DUPLICADO = "Gasto já importado"
+
+
+class GastoInvalido(ValueError):
+    """Gasto sem valor, data ou categoria utilizáveis (recusado antes de gravar)"""
+
+
+def normalizar_gasto(gasto):
+    """
+    Valida e normaliza valor, data e tipo de um gasto antes de gravar
+
+    O valor vira um float positivo (aceita "23,90"), a data fica "YYYY-MM-DD" e
+    o tipo em minúsculas ("outros" quando ausente). Os backends chamam esta
+    função antes de inserir, para que o rollup mensal (que usa o mês da data e o
+    valor) nunca falhe depois de o gasto já estar gravado.
+
+    Returns:
+        O próprio gasto, alterado
+
+    Raises:
+        GastoInvalido: valor ou data ausentes ou inválidos
+    """
+    valor = gasto.get("valor")
+    if isinstance(valor, str):
+        texto = valor.replace("R$", "").strip()
+        if "," in texto:
+            texto = texto.replace(".", "").replace(",", ".")
+        try:
+            valor = float(texto)
+        except ValueError:
+            raise GastoInvalido(f"Valor inválido: {gasto.get('valor')!r}")
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor) or valor <= 0:
+        raise GastoInvalido(f"Valor inválido: {gasto.get('valor')!r}")
+    gasto["valor"] = round(float(valor), 2)
+
+    data = gasto.get("data")
+    if isinstance(data, (date, datetime)):
+        gasto["data"] = data.strftime("%Y-%m-%d")
+    else:
+        try:
+            gasto["data"] = datetime.strptime(data[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            raise GastoInvalido(f"Data inválida: {data!r}")
+
+    tipo = gasto.get("tipo")
+    if tipo is not None and not isinstance(tipo, str):
+        raise GastoInvalido(f"Categoria inválida: {tipo!r}")
+    gasto["tipo"] = (tipo or "").strip().lower() or "outros"
+    return gasto
+
+
+class ExpenseStorage:
+    """
+    Operações de gastos usadas pela API
+
+    As variantes *_async executam a versão síncrona em uma thread por padrão;
+    backends com driver assíncrono nativo as sobrescrevem.
+    """
+
+    nome = "base"
+
+    def conectar(self):
+        """Abre as conexões do backend (no lifespan da API; as operações também conectam no primeiro uso)"""
+
+    def fechar(self):
+        """Fecha as conexões abertas por conectar"""
+
+    async def verificar_async(self):
+        """
+        Faz uma operação mínima no banco; levanta exceção se ele não responde ou
+        ainda não pode servir, como o MongoDB antes da migração de `dia` (usado por /ready)
+        """
+        raise NotImplementedError
+
+    def register_user(self, user_id, username=None):
+        """Registra o usuário no backend (idempotente)"""
+        raise NotImplementedError
+
+    def save(self, gasto):
+        """Salva um gasto e retorna o documento serializável (com _id); GastoInvalido se não passar em normalizar_gasto"""
+        raise NotImplementedError
+
+    def save_many(self, gastos):
+        """Salva vários gastos; retorna (salvos {índice: doc}, erros {índice: mensagem}), inválidos entram em erros"""
+        raise NotImplementedError
+
+    def find_range(self, user_id, start_date=None, end_date=None, tipo=None, fields=None):
+        """Lista os gastos do período, opcionalmente filtrados por categoria"""
+        raise NotImplementedError
+
+    def find_page(self, user_id, start_date=None, end_date=None, tipo=None, cursor=None, limit=100, fields=None):
+        """Página de gastos em ordem (data, id) decrescente; retorna gastos e proximo_cursor"""
+        raise NotImplementedError
+
+    def iter_range(self, user_id, start_date=None, end_date=None, tipo=None, fields=None, batch_size=500):
+        """Itera sobre os gastos do período em lotes de até batch_size (gerador livre de estado por thread)"""
+        raise NotImplementedError
+
+    def dashboard_summary(self, user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes=5):
+        """Totais e somas por categoria dos dois períodos e as últimas transações do atual"""
+        raise NotImplementedError
+
+    def delete(self, user_id, gasto_id):
+        """Exclui um gasto do usuário; retorna o documento excluído ou None"""
+        raise NotImplementedError
+
+    def existing_import_hashes(self, user_id, hashes):
+        """Subconjunto de `hashes` (hash_importacao) que o usuário já tem gravado"""
+        raise NotImplementedError
+
+    def data_version(self, user_id):
+        """
+        Versão persistida dos dados do usuário (0 se ele nunca gravou)
+
+        save, save_many e delete a incrementam no próprio banco, então ela muda
+        também com as gravações dos managers e de outros processos da API.
+        """
+        raise NotImplementedError
+
+    def bump_data_versions(self, user_ids):
+        """Incrementa a versão dos usuários (alterações feitas fora de save/save_many/delete)"""
+        raise NotImplementedError
+
+    async def data_version_async(self, user_id):
+        return await asyncio.to_thread(self.data_version, user_id)
+
+    async def register_user_async(self, user_id, username=None):
+        return await asyncio.to_thread(self.register_user, user_id, username)
+
+    async def save_async(self, gasto):
+        return await asyncio.to_thread(self.save, gasto)
+
+    async def save_many_async(self, gastos):
+        return await asyncio.to_thread(self.save_many, gastos)
+
+    async def find_range_async(self, user_id, start_date=None, end_date=None, tipo=None, fields=None):
+        return await asyncio.to_thread(self.find_range, user_id, start_date, end_date, tipo, fields)
+
+    async def find_page_async(self, user_id, start_date=None, end_date=None, tipo=None, cursor=None, limit=100, fields=None):
+        return await asyncio.to_thread(self.find_page, user_id, start_date, end_date, tipo, cursor, limit, fields)
+
+    async def iter_range_async(self, user_id, start_date=None, end_date=None, tipo=None, fields=None, batch_size=500):
+        # Cada lote é lido em uma thread do pool, não necessariamente a mesma:
+        # iter_range não pode depender de estado por thread (ex.: a conexão
+        # por thread do SQLite, que abre uma conexão própria para o iterador)
+        lotes = self.iter_range(user_id, start_date, end_date, tipo, fields, batch_size)
+        try:
+            while True:
+                lote = await asyncio.to_thread(next, lotes, None)
+                if lote is None:
+                    return
+                yield lote
+        finally:
+            # Cliente desconectado no meio do fluxo: fecha o cursor do backend
+            # (se a leitura cancelada ainda roda na thread, o coletor fecha depois)
+            try:
+                lotes.close()
+            except ValueError:
+                pass
+
+    async def dashboard_summary_async(self, user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes=5):
+        return await asyncio.to_thread(
+            self.dashboard_summary, user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes
+        )
+
+    async def delete_async(self, user_id, gasto_id):
+        return await asyncio.to_thread(self.delete, user_id, gasto_id)
+
+
+class MongoExpenseStorage(ExpenseStorage):
+    """Backend MongoDB: delega para as funções de src/db_mongo.py"""
+
+    nome = "mongo"
+
+    @property
+    def db(self):
+        """
+        Módulo src/db_mongo.py, importado e conectado no primeiro uso
+
+        Assim, importar a API não importa o pymongo/motor nem cria clientes;
+        as conexões são abertas no lifespan (conectar) ou na primeira operação.
+        """
+        from src import db_mongo
+        if db_mongo.client is None:
+            db_mongo.conectar()
+        return db_mongo
+
+    def conectar(self):
+        from src import db_mongo
+        db_mongo.conectar()
+
+    def fechar(self):
+        from src import db_mongo
+        db_mongo.fechar()
+
+    async def verificar_async(self):
+        await self.db.ping_async()
+        await self.db.verificar_migracao_async()
+
+    def register_user(self, user_id, username=None):
+        self.db.registrar_usuario_mongo(user_id, username)
+
+    def save(self, gasto):
+        return self.db.save_expense(gasto)
+
+    def save_many(self, gastos):
+        return self.db.save_expenses(gastos)
+
+    def find_range(self, user_id, start_date=None, end_date=None, tipo=None, fields=None):
+        return self.db.get_user_expenses(user_id, start_date, end_date, tipo, fields=fields)
+
+    def find_page(self, user_id, start_date=None, end_date=None, tipo=None, cursor=None, limit=100, fields=None):
+        return self.db.get_user_expenses_page(user_id, start_date, end_date, tipo, cursor=cursor, limit=limit, fields=fields)
+
+    def iter_range(self, user_id, start_date=None, end_date=None, tipo=None, fields=None, batch_size=500):
+        return self.db.iter_user_expenses(user_id, start_date, end_date, tipo, fields=fields, batch_size=batch_size)
+
+    def dashboard_summary(self, user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes=5):
+        return self.db.get_dashboard_summary(user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes)
+
+    def delete(self, user_id, gasto_id):
+        return self.db.delete_expense(user_id, gasto_id)
+
+    def existing_import_hashes(self, user_id, hashes):
+        return self.db.get_existing_import_hashes(user_id, hashes)
+
+    def data_version(self, user_id):
+        return self.db.get_data_version(user_id)
+
+    def bump_data_versions(self, user_ids):
+        self.db.incrementar_versoes(user_ids)
+
+    async def data_version_async(self, user_id):
+        return await self.db.get_data_version_async(user_id)
+
+    async def save_async(self, gasto):
+        return await self.db.save_expense_async(gasto)
+
+    async def save_many_async(self, gastos):
+        return await self.db.save_expenses_async(gastos)
+
+    async def find_range_async(self, user_id, start_date=None, end_date=None, tipo=None, fields=None):
+        return await self.db.get_user_expenses_async(user_id, start_date, end_date, tipo, fields=fields)
+
+    async def find_page_async(self, user_id, start_date=None, end_date=None, tipo=None, cursor=None, limit=100, fields=None):
+        return await self.db.get_user_expenses_page_async(
+            user_id, start_date, end_date, tipo, cursor=cursor, limit=limit, fields=fields
+        )
+
+    async def iter_range_async(self, user_id, start_date=None, end_date=None, tipo=None, fields=None, batch_size=500):
+        async for lote in self.db.iter_user_expenses_async(
+            user_id, start_date, end_date, tipo, fields=fields, batch_size=batch_size
+        ):
+            yield lote
+
+    async def dashboard_summary_async(self, user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes=5):
+        return await self.db.get_dashboard_summary_async(
+            user_id, inicio_atual, fim_atual, inicio_anterior, fim_anterior, limite_transacoes
+        )
+
+    async def delete_async(self, user_id, gasto_id):
+        return await self.db.delete_expense_async(user_id, gasto_id)
+
+
+def criar_storage(backend=None):
+    """Cria o backend de armazenamento pelo nome ("mongo" ou "sqlite")"""
+    backend = (backend or EXPENSE_BACKEND).lower()
+    if backend == "mongo":
+        return MongoExpenseStorage()
+    if backend == "sqlite":
+        from src.db_sqlite_expenses import SQLiteExpenseStorage
+        return SQLiteExpenseStorage()
+    raise ValueError(f"EXPENSE_BACKEND desconhecido: {backend}")
+
+
+_storage = None
+
+
+def get_storage():
+    """Backend configurado em EXPENSE_BACKEND (criado no primeiro uso)"""
+    global _storage
+    if _storage is None:
+        _storage = criar_storage()
+    return _storage
@@ -0,0 +1,186 @@
+# agente_backend/src/versoes.py
+"""
+Versão dos dados de cada usuário, ETags e cache de respostas prontas.
+
+Toda gravação que muda o que o usuário vê (gastos salvos ou excluídos, meta)
+incrementa a versão dele. O ETag de uma resposta é derivado da versão e dos
+parâmetros da requisição. Assim, um `If-None-Match` que confere pode ser
+respondido com 304 sem consultar os gastos, e a resposta serializada pode ser
+reaproveitada enquanto a versão não muda.
+
+A versão tem duas partes:
+- a persistida no banco de gastos (storage.data_version), que save, save_many e
+  delete incrementam na própria gravação. Ela muda também com os managers
+  (importação, rollups, migração) e com as gravações de outros workers, e é
+  lida no máximo uma vez a cada VERSOES_TTL_S por usuário;
+- um contador local, incrementado pelas rotas deste processo, que descarta na
+  hora a versão persistida em cache (o próprio processo vê as suas gravações
+  imediatamente).
+
+O ETag inclui ainda um identificador aleatório por processo, então um restart
+invalida todos os ETags. Uma gravação de outro processo aparece em até
+VERSOES_TTL_S segundos.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Por quanto tempo a versão persistida de um usuário é reaproveitada sem ler o banco
+VERSOES_TTL_S = float(os.getenv("VERSOES_TTL_S", "2"))
+VERSOES_CACHE_TAMANHO = int(os.getenv("VERSOES_CACHE_TAMANHO", "10000"))
+
+RESPOSTAS_CACHE_BYTES = int(os.getenv("RESPOSTAS_CACHE_BYTES", str(64 * 1024 * 1024)))
+# Respostas maiores que isso não são guardadas (ex.: /gastos sem filtro de um histórico longo)
+RESPOSTAS_CACHE_MAX_ITEM = int(os.getenv("RESPOSTAS_CACHE_MAX_ITEM", str(1024 * 1024)))
+
+
+class VersoesDados:
+    """
+    Versão dos dados por usuário: contador local mais a versão persistida
+
+    Args:
+        storage: Backend de gastos com data_version (padrão: get_storage() no primeiro uso)
+        ttl: Segundos em que a versão persistida lida é reaproveitada
+    """
+
+    def __init__(self, storage=None, ttl=VERSOES_TTL_S, tamanho=VERSOES_CACHE_TAMANHO):
+        self.epoca = os.urandom(8).hex()
+        self.ttl = ttl
+        self.tamanho = tamanho
+        self._storage = storage
+        self._locais = {}
+        # user_id -> (versão persistida, instante da leitura)
+        self._persistidas = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from src.storage import get_storage
+            self._storage = get_storage()
+        return self._storage
+
+    def _em_cache(self, user_id):
+        """(local, persistida em cache ou None)"""
+        with self._lock:
+            local = self._locais.get(user_id, 0)
+            item = self._persistidas.get(user_id)
+            if item is not None and time.monotonic() - item[1] < self.ttl:
+                self._persistidas.move_to_end(user_id)
+                return local, item[0]
+            return local, None
+
+    def _guardar(self, user_id, local, persistida, lida_em):
+        with self._lock:
+            # Se o processo gravou durante a leitura, o valor lido pode ser anterior
+            # à gravação: não guarda (a próxima chamada lê de novo)
+            if self._locais.get(user_id, 0) != local:
+                return
+            self._persistidas[user_id] = (persistida, lida_em)
+            self._persistidas.move_to_end(user_id)
+            while len(self._persistidas) > self.tamanho:
+                self._persistidas.popitem(last=False)
+
+    def atual(self, user_id):
+        """Versão atual ("local.persistida"); pode ler o banco"""
+        local, persistida = self._em_cache(user_id)
+        if persistida is None:
+            lida_em = time.monotonic()
+            persistida = self.storage.data_version(user_id)
+            self._guardar(user_id, local, persistida, lida_em)
+        return f"{local}.{persistida}"
+
+    async def atual_async(self, user_id):
+        """Versão assíncrona de atual (só acessa o banco quando a versão persistida expirou)"""
+        local, persistida = self._em_cache(user_id)
+        if persistida is None:
+            lida_em = time.monotonic()
+            persistida = await self.storage.data_version_async(user_id)
+            self._guardar(user_id, local, persistida, lida_em)
+        return f"{local}.{persistida}"
+
+    def incrementar(self, user_id, persistir=False):
+        """
+        Nova versão após uma gravação deste processo
+
+        Args:
+            persistir: Incrementa também a versão no banco, para alterações que
+                não passam por save/save_many/delete (ex.: a meta mensal)
+        """
+        if persistir:
+            self.storage.bump_data_versions([user_id])
+        with self._lock:
+            self._locais[user_id] = self._locais.get(user_id, 0) + 1
+            self._persistidas.pop(user_id, None)
+            return self._locais[user_id]
+
+
+def gerar_etag(epoca, user_id, versao, rota, *partes):
+    """ETag forte: mesma versão e mesmos parâmetros produzem o mesmo corpo"""
+    base = "|".join(str(parte) for parte in (epoca, user_id, versao, rota, *partes))
+    return f'"{hashlib.sha256(base.encode()).hexdigest()[:32]}"'
+
+
+def etag_confere(if_none_match, etag):
+    """Comparação fraca do If-None-Match (RFC 9110): aceita "*", listas e o prefixo W/"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidatos = (item.strip() for item in if_none_match.split(","))
+    return any((c[2:] if c.startswith("W/") else c) == etag for c in candidatos)
+
+
+class CacheRespostas:
+    """Corpos JSON já serializados, por ETag, com limite total de bytes (LRU)"""
+
+    def __init__(self, limite_bytes=RESPOSTAS_CACHE_BYTES, maximo_item=RESPOSTAS_CACHE_MAX_ITEM):
+        self.limite_bytes = limite_bytes
+        self.maximo_item = maximo_item
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, etag):
+        with self._lock:
+            corpo = self._itens.get(etag)
+            if corpo is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(etag)
+            self.acertos += 1
+            return corpo
+
+    def guardar(self, etag, corpo):
+        if len(corpo) > self.maximo_item:
+            return
+        with self._lock:
+            if etag in self._itens:
+                return
+            self._itens[etag] = corpo
+            self._bytes += len(corpo)
+            while self._bytes > self.limite_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._bytes -= len(removido)
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos / total, 4) if total else 0.0,
+                "itens_memoria": len(self._itens),
+                "bytes": self._bytes
+            }
+
+
+versoes = VersoesDados()
+respostas = CacheRespostas()
@@ -0,0 +1,145 @@
+import time
+import threading
+
+import pytest
+
+from src import process_input
+from src.classificador import Classificadores, palavras
+from src.llm_cache import LLMCache
+
+USUARIO = 1
+
+
+class StorageFalso:
+    """iter_range sobre um histórico em memória, contando os carregamentos"""
+
+    def __init__(self, gastos):
+        self.gastos = list(gastos)
+        self.carregamentos = 0
+        self.durante_leitura = None
+
+    def iter_range(self, user_id, start_date=None, end_date=None, tipo=None, fields=None, batch_size=500):
+        self.carregamentos += 1
+        if self.durante_leitura:
+            self.durante_leitura()
+        yield list(self.gastos)
+
+
+def _historico(descricao, tipo, vezes):
+    return [{"descricao": descricao, "tipo": tipo} for _ in range(vezes)]
+
+
+HISTORICO = (
+    _historico("posto shell", "transporte", 8)
+    + _historico("padaria do zé", "alimentação", 8)
+    # Mesma loja em duas categorias: o classificador não tem confiança
+    + _historico("loja central camisa", "vestuário", 3)
+    + _historico("loja central cinema", "lazer", 3)
+)
+
+
+@pytest.fixture
+def resolver(tmp_path, monkeypatch):
+    """_resolver_texto_sem_llm com o histórico sintético e um cache do GPT vazio"""
+    classificadores = Classificadores()
+    storage = StorageFalso(HISTORICO)
+    monkeypatch.setattr(process_input, "cache", LLMCache(str(tmp_path / "llm_cache.db")))
+
+    def resolver(texto):
+        classificador = classificadores.obter(storage, USUARIO)
+        return process_input._resolver_texto_sem_llm(texto, USUARIO, classificador)[0]
+
+    return resolver
+
+
+def test_palavras_ignora_numeros_e_palavras_genericas():
+    assert palavras("Gastei 30 reais no Posto Shell") == ["posto", "shell"]
+
+
+def test_classificador_resolve_frase_sem_palavra_chave(resolver):
+    # Sem o classificador, "posto shell" fica em "outros" e vai ao GPT (confiança 0.7)
+    assert process_input._resolver_texto_sem_llm("30 reais posto shell", USUARIO)[0] is None
+
+    gasto = resolver("30 reais posto shell")
+    assert gasto["origem"] == "local"
+    assert gasto["tipo"] == "transporte"
+
+
+def test_classificador_sem_confianca_deixa_as_palavras_chave(resolver):
+    # "loja central" divide o histórico entre duas categorias; vale a palavra-chave
+    gasto = resolver("R$ 80 loja central mercado")
+    assert gasto["origem"] == "local"
+    assert gasto["tipo"] == "alimentação"
+
+
+def test_classificador_sem_evidencia_deixa_as_palavras_chave(resolver):
+    gasto = resolver("25 reais uber")
+    assert gasto["tipo"] == "transporte"
+    assert resolver("25 reais loja nova") is None
+
+
+def test_carregamentos_simultaneos_compartilham_a_leitura():
+    liberar = threading.Event()
+    storage = StorageFalso(HISTORICO)
+    storage.durante_leitura = lambda: liberar.wait(5)
+    classificadores = Classificadores()
+
+    resultados = []
+    threads = [
+        threading.Thread(target=lambda: resultados.append(classificadores.obter(storage, USUARIO)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    limite = time.monotonic() + 5
+    while classificadores._carregamentos.estatisticas()["coalescidas"] < 4 and time.monotonic() < limite:
+        time.sleep(0.001)
+    liberar.set()
+    for thread in threads:
+        thread.join()
+
+    assert storage.carregamentos == 1
+    assert len({id(resultado.modelo) for resultado in resultados}) == 1
+    assert classificadores.global_.n_documentos == len(HISTORICO)
+
+
+def test_modelo_expirado_e_recarregado_sem_duplicar_o_global():
+    storage = StorageFalso(HISTORICO)
+    classificadores = Classificadores(ttl=0)
+    classificadores.obter(storage, USUARIO)
+    # Gasto gravado fora da API (ex.: manager_importacao)
+    storage.gastos += _historico("posto shell", "transporte", 1)
+    classificadores.obter(storage, USUARIO)
+
+    assert storage.carregamentos == 2
+    assert classificadores.global_.n_documentos == len(HISTORICO) + 1
+
+
+def test_gravacao_durante_o_carregamento_descarta_o_modelo():
+    storage = StorageFalso(HISTORICO)
+    classificadores = Classificadores()
+    storage.durante_leitura = lambda: classificadores.aprender(USUARIO, _historico("posto shell", "transporte", 1))
+    classificadores.obter(storage, USUARIO)
+    assert classificadores.em_cache(USUARIO) is None
+
+    storage.durante_leitura = None
+    assert classificadores.obter(storage, USUARIO).classificar("posto shell")[0] == "transporte"
+    assert classificadores.em_cache(USUARIO) is not None
+
+
+def test_contagem_de_gravacoes_so_existe_durante_o_carregamento():
+    storage = StorageFalso(HISTORICO)
+    classificadores = Classificadores(tamanho_maximo=2)
+    for user_id in range(1, 50):
+        classificadores.aprender(user_id, _historico("posto shell", "transporte", 1))
+        classificadores.obter(storage, user_id)
+        classificadores.esquecer(user_id, _historico("posto shell", "transporte", 1))
+    assert classificadores._alteracoes == {}
+
+    def falhar():
+        raise RuntimeError("banco fora do ar")
+
+    storage.durante_leitura = falhar
+    with pytest.raises(RuntimeError):
+        classificadores.obter(storage, 99)
+    assert classificadores._alteracoes == {}
@@ -0,0 +1,152 @@
+import json
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src import process_input
+from src.coalescencia import ChamadasCoalescidas
+from src.llm_cache import LLMCache
+
+
+def _esperar(condicao, limite=5):
+    fim = time.monotonic() + limite
+    while not condicao() and time.monotonic() < fim:
+        time.sleep(0.001)
+
+
+def test_executar_compartilha_a_chamada_entre_threads():
+    chamadas = ChamadasCoalescidas()
+    liberar = threading.Event()
+    execucoes = []
+
+    def funcao():
+        execucoes.append(1)
+        liberar.wait(5)
+        return {"valor": 10}
+
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(chamadas.executar("chave", funcao))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    _esperar(lambda: chamadas.estatisticas()["coalescidas"] == 3)
+    liberar.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(execucoes) == 1
+    assert resultados == [{"valor": 10}] * 4
+    estatisticas = chamadas.estatisticas()
+    assert (estatisticas["executadas"], estatisticas["maior_grupo"], estatisticas["em_andamento"]) == (1, 4, 0)
+
+
+def test_executar_repassa_a_excecao_e_libera_a_chave():
+    chamadas = ChamadasCoalescidas()
+
+    def falha():
+        raise RuntimeError("timeout")
+
+    with pytest.raises(RuntimeError):
+        chamadas.executar("chave", falha)
+    assert chamadas.executar("chave", lambda: 1) == 1
+
+
+class Interrompida(BaseException):
+    """Exceção fora de Exception, como KeyboardInterrupt e SystemExit"""
+
+
+def test_executar_repassa_base_exception_a_quem_espera():
+    chamadas = ChamadasCoalescidas()
+    liberar = threading.Event()
+
+    def funcao():
+        liberar.wait(5)
+        raise Interrompida()
+
+    resultados = []
+
+    def seguir():
+        try:
+            resultados.append(chamadas.executar("chave", funcao))
+        except Interrompida as e:
+            resultados.append(e)
+
+    lider = threading.Thread(target=seguir)
+    lider.start()
+    _esperar(lambda: chamadas.estatisticas()["em_andamento"] == 1)
+    seguidor = threading.Thread(target=seguir)
+    seguidor.start()
+    _esperar(lambda: chamadas.estatisticas()["coalescidas"] == 1)
+    liberar.set()
+    lider.join()
+    seguidor.join()
+
+    assert len(resultados) == 2 and all(isinstance(resultado, Interrompida) for resultado in resultados)
+    assert chamadas.estatisticas()["em_andamento"] == 0
+
+
+def test_executar_async_sobrevive_ao_cancelamento_de_quem_iniciou():
+    chamadas = ChamadasCoalescidas()
+    execucoes = []
+
+    async def funcao():
+        execucoes.append(1)
+        await asyncio.sleep(0.01)
+        return "resposta"
+
+    async def cenario():
+        lider = asyncio.ensure_future(chamadas.executar_async("chave", funcao))
+        await asyncio.sleep(0)
+        seguidor = asyncio.ensure_future(chamadas.executar_async("chave", funcao))
+        await asyncio.sleep(0)
+        lider.cancel()
+        return await seguidor
+
+    assert asyncio.run(cenario()) == "resposta"
+    assert len(execucoes) == 1
+
+
+@pytest.fixture
+def gpt_falso(tmp_path, monkeypatch):
+    """GPT em texto livre que responde devagar, com o cache e os usos contados"""
+    cache = LLMCache(str(tmp_path / "llm_cache.db"))
+    gravacoes = []
+    salvar = cache.salvar
+    monkeypatch.setattr(cache, "salvar", lambda chave, valor: (gravacoes.append(chave), salvar(chave, valor)))
+    monkeypatch.setattr(process_input, "cache", cache)
+    monkeypatch.setattr(process_input, "chamadas_llm", ChamadasCoalescidas())
+    monkeypatch.setattr(process_input, "LLM_SAIDA_ESTRUTURADA", False)
+    usuarios = []
+
+    async def classificador(user_id):
+        return None
+
+    async def completion(tipo, parametros, user_id=None):
+        usuarios.append(user_id)
+        await asyncio.sleep(0.01)
+        conteudo = {"valor": 42.0, "tipo": "lazer", "data": "2024-03-15", "descricao": "show"}
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(conteudo)))])
+
+    monkeypatch.setattr(process_input, "_classificador_async", classificador)
+    monkeypatch.setattr(process_input, "_criar_completion_async", completion)
+    return SimpleNamespace(gravacoes=gravacoes, usuarios=usuarios)
+
+
+def test_requisicoes_identicas_interpretam_e_guardam_uma_vez(gpt_falso):
+    textos = ["Ingresso do show quarenta e dois", "  ingresso do show quarenta e dois!"]
+
+    async def cenario():
+        return await asyncio.gather(*(
+            process_input.processar_texto_async(textos[user_id % 2], user_id) for user_id in range(1, 5)
+        ))
+
+    respostas = asyncio.run(cenario())
+    assert gpt_falso.usuarios == [1]
+    assert len(gpt_falso.gravacoes) == 1
+    for user_id, resposta in enumerate(respostas, start=1):
+        assert resposta["user_id"] == user_id
+        assert resposta["origem"] == "llm"
+        assert resposta["descricao"] == textos[user_id % 2]
+        assert resposta["valor"] == 42.0
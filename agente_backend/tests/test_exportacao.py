@@ -0,0 +1,125 @@
+import io
+import csv
+import asyncio
+import zipfile
+
+import pytest
+
+from src.db_sqlite_expenses import SQLiteExpenseStorage
+from src.exportacao import (
+    COLUNAS_ADMIN, csv_cabecalho, csv_lote, empacotar, escrever_csv, exportar_arquivo, exportar_usuarios,
+    lotes_gastos, lotes_gastos_async
+)
+from src.importacao import importar_extrato
+
+USUARIO = 1
+OUTRO_USUARIO = 2
+
+GASTOS = [
+    {"valor": 10, "tipo": "alimentação", "data": "2024-01-05", "descricao": "padaria"},
+    {"valor": 25.5, "tipo": "transporte", "data": "2024-01-10", "descricao": 'uber "centro", volta'},
+    {"valor": 1500, "tipo": "moradia", "data": "2024-02-01", "descricao": "aluguel\nfevereiro"},
+    {"valor": 40, "tipo": "lazer", "data": "2024-02-15", "descricao": "cinema"},
+]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteExpenseStorage(str(tmp_path / "gastos.db"))
+    for gasto in GASTOS:
+        storage.save({**gasto, "user_id": USUARIO})
+    storage.save({**GASTOS[0], "user_id": OUTRO_USUARIO})
+    return storage
+
+
+def _chaves(gastos):
+    return sorted((gasto["data"], float(gasto["valor"]), gasto["tipo"], gasto["descricao"]) for gasto in gastos)
+
+
+def test_csv_ida_e_volta(storage):
+    saida = io.StringIO()
+    total = escrever_csv(saida, lotes_gastos(storage, USUARIO, batch_size=3))
+    assert total == len(GASTOS)
+
+    linhas = list(csv.DictReader(io.StringIO(saida.getvalue())))
+    assert _chaves(linhas) == _chaves(storage.find_range(USUARIO))
+    assert {linha["id"] for linha in linhas} == {gasto["_id"] for gasto in storage.find_range(USUARIO)}
+
+
+def test_csv_exportado_pode_ser_importado_de_volta(storage, tmp_path):
+    caminho = tmp_path / "gastos.csv"
+    exportar_arquivo(storage, USUARIO, str(caminho), "csv")
+
+    with open(caminho, "rb") as arquivo:
+        relatorio = importar_extrato(arquivo, OUTRO_USUARIO + 1, storage, "csv", despesas="positivas")
+    assert relatorio["importados"] == len(GASTOS)
+
+    def sem_tipo(gastos):
+        return sorted((gasto["data"], float(gasto["valor"]), gasto["descricao"]) for gasto in gastos)
+
+    assert sem_tipo(storage.find_range(OUTRO_USUARIO + 1)) == sem_tipo(storage.find_range(USUARIO))
+
+
+FORMULAS = ["=HYPERLINK(\"http://exemplo.com\")", "+55 11 99999", "-saque", "@SOMA(A1)", "\tcafé", "\rpão"]
+
+
+def test_csv_escapa_formulas_e_volta_na_importacao(tmp_path):
+    storage = SQLiteExpenseStorage(str(tmp_path / "formulas.db"))
+    for dia, descricao in enumerate(FORMULAS, start=1):
+        storage.save({"user_id": USUARIO, "valor": 10, "tipo": "outros", "data": f"2024-03-0{dia}",
+                      "descricao": descricao})
+
+    saida = io.StringIO()
+    escrever_csv(saida, lotes_gastos(storage, USUARIO))
+    linhas = list(csv.DictReader(io.StringIO(saida.getvalue())))
+    assert sorted(linha["descricao"] for linha in linhas) == sorted("'" + descricao for descricao in FORMULAS)
+    assert all(not linha["valor"].startswith("'") for linha in linhas)
+
+    relatorio = importar_extrato(
+        io.BytesIO(saida.getvalue().encode("utf-8")), OUTRO_USUARIO, storage, "csv", despesas="positivas"
+    )
+    assert relatorio["importados"] == len(FORMULAS)
+    assert sorted(gasto["descricao"] for gasto in storage.find_range(OUTRO_USUARIO)) == sorted(FORMULAS)
+
+
+def test_exportacao_filtra_periodo_e_categoria(storage):
+    fevereiro = [gasto for lote in lotes_gastos(storage, USUARIO, "2024-02-01", "2024-02-29") for gasto in lote]
+    assert sorted(gasto["descricao"] for gasto in fevereiro) == ["aluguel\nfevereiro", "cinema"]
+    lazer = [gasto for lote in lotes_gastos(storage, USUARIO, tipo="lazer") for gasto in lote]
+    assert [gasto["descricao"] for gasto in lazer] == ["cinema"]
+
+
+def test_lotes_async_iguais_aos_sincronos(storage):
+    async def ler():
+        return [lote async for lote in lotes_gastos_async(storage, USUARIO, batch_size=3)]
+
+    assert asyncio.run(ler()) == list(lotes_gastos(storage, USUARIO, batch_size=3))
+
+
+def test_cabecalho_e_lote_admin_incluem_o_usuario(storage):
+    lote = storage.find_range(USUARIO)[:1]
+    texto = csv_cabecalho(COLUNAS_ADMIN) + csv_lote(lote, COLUNAS_ADMIN)
+    linha = next(csv.DictReader(io.StringIO(texto)))
+    assert linha["user_id"] == str(USUARIO)
+
+
+def test_exportar_usuarios_e_empacotar(storage, tmp_path):
+    arquivos = exportar_usuarios(storage, [USUARIO, OUTRO_USUARIO], str(tmp_path / "exportacao"), "csv", workers=2)
+    assert [(user_id, total) for user_id, _, total in arquivos] == [(USUARIO, len(GASTOS)), (OUTRO_USUARIO, 1)]
+
+    pacote = empacotar(arquivos, str(tmp_path / "exportacao.zip"))
+    with zipfile.ZipFile(pacote) as zip_:
+        assert sorted(zip_.namelist()) == ["gastos_1.csv", "gastos_2.csv"]
+        linhas = list(csv.DictReader(io.StringIO(zip_.read("gastos_2.csv").decode("utf-8"))))
+    assert [linha["user_id"] for linha in linhas] == [str(OUTRO_USUARIO)]
+
+
+def test_parquet_ida_e_volta(storage, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    caminho = str(tmp_path / "gastos.parquet")
+    assert exportar_arquivo(storage, USUARIO, caminho, "parquet") == len(GASTOS)
+
+    tabela = pq.read_table(caminho)
+    assert str(tabela.schema.field("data").type) == "date32[day]"
+    linhas = [{**linha, "data": linha["data"].isoformat()} for linha in tabela.to_pylist()]
+    assert _chaves(linhas) == _chaves(storage.find_range(USUARIO))
@@ -0,0 +1,106 @@
+import io
+
+import pytest
+
+from src.db_sqlite_expenses import SQLiteExpenseStorage
+from src.importacao import _converter_valor, importar_extrato, ler_csv
+
+USUARIO = 1
+
+CSV = """Data;Descrição;Valor
+05/03/2024;Padaria Pão Quente;-12,50
+05/03/2024;Padaria Pão Quente;-12,50
+06/03/2024;Salário;5.000,00
+07/03/2024;Uber *Viagem;-23,90
+data errada;Posto Shell;-100,00
+08/03/2024;Aluguel;-1.500,00
+"""
+
+OFX = """OFXHEADER:100
+DATA:OFXSGML
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<BANKACCTFROM><BANKID>341<ACCTID>12345-6</BANKACCTFROM>
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000<TRNAMT>-45.00<FITID>A1<MEMO>FARMACIA SAO JOAO</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240306<TRNAMT>100.00<FITID>A2<MEMO>PIX RECEBIDO</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240307<TRNAMT>-9.90<FITID>A3<MEMO>NETFLIX.COM</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240307<TRNAMT>-9.90<FITID>A3<MEMO>NETFLIX.COM</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteExpenseStorage(str(tmp_path / "gastos.db"))
+
+
+def _importar(storage, conteudo, formato="csv", codificacao="utf-8", **kwargs):
+    return importar_extrato(io.BytesIO(conteudo.encode(codificacao)), USUARIO, storage, formato, **kwargs)
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("-1.234,56", -1234.56),
+    ("1,234.56", 1234.56),
+    ("R$ 12,00", 12.0),
+    ("(12,00)", -12.0),
+    ("-1234.56", -1234.56),
+    ("1.234.567", 1234567.0),
+])
+def test_converter_valor(texto, esperado):
+    assert _converter_valor(texto) == esperado
+
+
+def test_importa_csv_e_ignora_creditos(storage):
+    relatorio = _importar(storage, CSV)
+    assert (relatorio["lidos"], relatorio["importados"], relatorio["ignorados"], relatorio["invalidos"]) == (6, 4, 1, 1)
+    assert relatorio["duplicados"] == 0
+    assert "linha 6" in relatorio["erros"][0]
+
+    gastos = {gasto["descricao"]: gasto for gasto in storage.find_range(USUARIO)}
+    assert gastos["Uber *Viagem"]["tipo"] == "transporte"
+    assert gastos["Uber *Viagem"]["valor"] == 23.9
+    assert gastos["Aluguel"]["valor"] == 1500.0
+    assert gastos["Aluguel"]["data"] == "2024-03-08"
+
+
+def test_reimportar_o_mesmo_extrato_nao_duplica(storage):
+    _importar(storage, CSV)
+    relatorio = _importar(storage, CSV, tamanho_lote=2)
+    assert (relatorio["importados"], relatorio["duplicados"]) == (0, 4)
+    assert len(storage.find_range(USUARIO)) == 4
+
+
+def test_extrato_sobreposto_importa_so_as_transacoes_novas(storage):
+    _importar(storage, CSV)
+    sobreposto = "Data;Descrição;Valor\n07/03/2024;Uber *Viagem;-23,90\n09/03/2024;Cinema;-40,00\n"
+    relatorio = _importar(storage, sobreposto)
+    assert (relatorio["importados"], relatorio["duplicados"]) == (1, 1)
+    assert len(storage.find_range(USUARIO)) == 5
+
+
+def test_hash_nao_depende_da_codificacao_nem_do_delimitador(storage):
+    def hashes(conteudo, codificacao):
+        linhas = ler_csv(io.BytesIO(conteudo.encode(codificacao)), USUARIO)
+        return [gasto["hash_importacao"] for _, gasto, _ in linhas if gasto]
+
+    utf8 = hashes(CSV, "utf-8-sig")
+    assert hashes(CSV, "cp1252") == utf8
+    assert hashes(CSV.replace(";", "\t"), "utf-8") == utf8
+    # As duas padarias iguais no mesmo dia são gastos diferentes
+    assert len(set(utf8)) == len(utf8) == 4
+
+
+def test_importa_ofx_pelo_fitid(storage):
+    gravados = []
+    relatorio = _importar(storage, OFX, formato="ofx", ao_salvar=gravados.extend)
+    assert (relatorio["importados"], relatorio["ignorados"], relatorio["duplicados"]) == (2, 1, 1)
+    assert sorted(gasto["valor"] for gasto in gravados) == [9.9, 45.0]
+
+    # O mesmo FITID com outra descrição continua sendo a mesma transação
+    relatorio = _importar(storage, OFX.replace("FARMACIA SAO JOAO", "FARMACIA SJ"), formato="ofx")
+    assert (relatorio["importados"], relatorio["duplicados"]) == (0, 3)
+
+
+def test_cabecalho_sem_colunas_conhecidas(storage):
+    with pytest.raises(ValueError):
+        _importar(storage, "quando;quanto\n01/01/2024;10\n")
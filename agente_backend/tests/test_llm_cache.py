@@ -0,0 +1,58 @@
+import time
+
+from src.llm_cache import LLMCache, chave_cache, normalizar_texto
+
+
+def test_chave_ignora_caixa_espacos_e_pontuacao():
+    assert normalizar_texto("  Uber   20!! ") == "uber 20"
+    assert chave_cache("texto", "Uber 20", "2024-03-15") == chave_cache("texto", " uber  20.", "2024-03-15")
+
+
+def test_chave_depende_do_tipo_e_da_data():
+    chave = chave_cache("texto", "uber 20", "2024-03-15")
+    assert chave != chave_cache("consulta", "uber 20", "2024-03-15")
+    assert chave != chave_cache("texto", "uber 20", "2024-03-16")
+
+
+def test_banco_aberto_apenas_no_primeiro_uso(tmp_path):
+    caminho = tmp_path / "llm_cache.db"
+    cache = LLMCache(str(caminho))
+    assert not caminho.exists()
+
+    cache.obter("chave")
+    assert caminho.exists()
+    cache.fechar()
+
+
+def test_valor_persistido_entre_instancias(tmp_path):
+    caminho = str(tmp_path / "llm_cache.db")
+    cache = LLMCache(caminho)
+    cache.salvar("chave", {"valor": 20, "tipo": "transporte"})
+    cache.fechar()
+
+    outro = LLMCache(caminho)
+    assert outro.obter("chave") == {"valor": 20, "tipo": "transporte"}
+    assert outro.estatisticas()["acertos_persistentes"] == 1
+    assert outro.obter("chave") == {"valor": 20, "tipo": "transporte"}
+    assert outro.estatisticas()["acertos_memoria"] == 1
+    outro.fechar()
+
+
+def test_item_expirado_nao_e_devolvido(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.db"))
+    cache.salvar("chave", {"valor": 1}, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.obter("chave") is None
+    assert cache.limpar_expirados() == 1
+    cache.fechar()
+
+
+def test_lru_limitado(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.db"), tamanho_maximo=2)
+    for chave in ("a", "b", "c"):
+        cache.salvar(chave, {"chave": chave})
+    assert cache.estatisticas()["itens_memoria"] == 2
+    # "a" saiu da memória, mas continua no SQLite
+    assert cache.obter("a") == {"chave": "a"}
+    assert cache.estatisticas()["acertos_persistentes"] == 1
+    cache.fechar()
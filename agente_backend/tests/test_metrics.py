@@ -0,0 +1,20 @@
+import pytest
+
+from src import metrics
+
+
+def test_sqlalchemy_consulta_com_erro_nao_deixa_inicio_na_conexao():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    engine = sqlalchemy.create_engine("sqlite://")
+    metrics.instrumentar_sqlalchemy(engine)
+
+    with engine.connect() as conn:
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            conn.execute(sqlalchemy.text("SELECT * FROM tabela_inexistente"))
+        conn.rollback()
+        conn.execute(sqlalchemy.text("CREATE TABLE gastos (valor REAL)"))
+        conn.execute(sqlalchemy.text("SELECT valor FROM gastos")).fetchall()
+        assert "inicio_consultas" not in conn.info
+
+    linhas = metrics.SQL_DURACAO.linhas()
+    assert any(linha.startswith('sql_query_duration_seconds_count{operation="SELECT",table="gastos"}') for linha in linhas)
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pytest
+
+from src.parser_local import interpretar_gasto, categorizar
+
+# Padrão de CONFIANCA_MINIMA_LOCAL em src/process_input.py
+CONFIANCA_MINIMA_LOCAL = 0.8
+
+HOJE = datetime(2024, 3, 15)
+
+
+def _interpretar(texto, **kwargs):
+    return interpretar_gasto(texto, hoje=HOJE, **kwargs)
+
+
+def test_frase_simples_resolvida_localmente():
+    gasto = _interpretar("gastei 50 reais com mercado hoje")
+    assert gasto["valor"] == 50
+    assert gasto["tipo"] == "alimentação"
+    assert gasto["data"] == "2024-03-15"
+    assert gasto["confianca"] >= CONFIANCA_MINIMA_LOCAL
+
+
+def test_valor_com_centavos_e_ontem():
+    gasto = _interpretar("uber R$ 23,90 ontem")
+    assert gasto["valor"] == 23.9
+    assert gasto["tipo"] == "transporte"
+    assert gasto["data"] == "2024-03-14"
+    assert gasto["confianca"] >= CONFIANCA_MINIMA_LOCAL
+
+
+def test_empate_entre_categorias_vai_para_o_gpt():
+    gasto = _interpretar("gastei 30 reais no cinema e no restaurante")
+    assert gasto["valor"] == 30
+    assert gasto["confianca"] < CONFIANCA_MINIMA_LOCAL
+
+
+def test_numero_sem_moeda_vai_para_o_gpt():
+    gasto = _interpretar("almoço com 3 amigos")
+    assert gasto["confianca"] < CONFIANCA_MINIMA_LOCAL
+
+
+def test_numero_sem_moeda_e_sem_categoria_vai_para_o_gpt():
+    gasto = _interpretar("paguei 42")
+    assert gasto["tipo"] == "outros"
+    assert gasto["confianca"] < CONFIANCA_MINIMA_LOCAL
+
+
+@pytest.mark.parametrize("texto, categoria", [
+    ("comprei camisetas por 80 reais", "vestuário"),
+    ("paguei 35 reais em remédios", "saúde"),
+    ("duas passagens por 120 reais", "transporte"),
+    ("R$ 90 nos bares ontem", "lazer"),
+    ("40 reais de lanches", "alimentação"),
+])
+def test_palavras_chave_no_plural(texto, categoria):
+    gasto = _interpretar(texto)
+    assert gasto["tipo"] == categoria
+    assert gasto["confianca"] >= CONFIANCA_MINIMA_LOCAL
+
+
+@pytest.mark.parametrize("texto", [
+    "gastei 50 reais com mercado na sexta",
+    "paguei R$ 80 no mercado dia 15",
+    "gastei 30 reais de uber semana passada",
+    "gastei 200 reais no mercado mês passado",
+    "gastei 40 reais no mercado 3 dias atrás",
+    "R$ 60 no restaurante sábado",
+])
+def test_data_nao_resolvida_vai_para_o_gpt(texto):
+    gasto = _interpretar(texto)
+    assert gasto["confianca"] < CONFIANCA_MINIMA_LOCAL
+
+
+def test_ontem_so_como_palavra_inteira():
+    gasto = _interpretar("gastei 20 reais no mercado, a nota contem desconto")
+    assert gasto["data"] == "2024-03-15"
+    assert _interpretar("mercado 20 reais anteontem")["data"] == "2024-03-13"
+
+
+def test_dois_valores_marcados_nao_sao_resolvidos():
+    assert _interpretar("mercado 20 reais e padaria 10 reais") is None
+
+
+def test_receita_nao_e_gasto():
+    assert _interpretar("recebi 100 reais de reembolso") is None
+
+
+def test_data_sem_ano_no_futuro_e_do_ano_anterior():
+    gasto = _interpretar("mercado 50 reais 20/12")
+    assert gasto["data"] == "2023-12-20"
+
+
+def test_data_invalida():
+    assert _interpretar("mercado 50 reais 31/02") is None
+
+
+def test_99_como_aplicativo_de_corrida():
+    gasto = _interpretar("corrida de 99 por 15 reais")
+    assert gasto["valor"] == 15
+    assert gasto["tipo"] == "transporte"
+
+
+def test_categoria_do_classificador_substitui_palavras_chave():
+    gasto = _interpretar("padaria do zé 12 reais", categoria="lazer")
+    assert gasto["tipo"] == "lazer"
+    assert gasto["confianca"] >= CONFIANCA_MINIMA_LOCAL
+
+
+def test_categorizar_descricao_de_extrato():
+    assert categorizar("COMPRA CARTAO SUPERMERCADO BOM PRECO") == ("alimentação", 0.4)
+    assert categorizar("TED ENVIADA") == ("outros", 0.1)
+    assert categorizar("cinema e restaurante")[1] == 0.0
@@ -0,0 +1,88 @@
+from datetime import date
+
+import pytest
+
+from src.projecao import CacheProjecoes
+
+USUARIO = 1
+
+
+class StorageFalso:
+    """find_range sobre uma lista em memória; `durante_leitura` simula uma gravação concorrente"""
+
+    def __init__(self, gastos=()):
+        self.gastos = list(gastos)
+        self.leituras = 0
+        self.durante_leitura = None
+
+    def find_range(self, user_id, start_date=None, end_date=None, tipo=None, fields=None):
+        self.leituras += 1
+        gastos = [g for g in self.gastos if start_date <= g["data"] <= end_date]
+        if self.durante_leitura:
+            self.durante_leitura()
+            self.durante_leitura = None
+        return gastos
+
+
+def _aluguel(mes):
+    return {"data": f"2024-{mes:02d}-05", "tipo": "moradia", "valor": 1500.0}
+
+
+def test_modelo_em_cache_e_atualizado_pelas_gravacoes():
+    storage = StorageFalso([_aluguel(mes) for mes in range(1, 7)])
+    cache = CacheProjecoes()
+    modelo = cache.obter(storage, USUARIO, date(2024, 7, 2))
+    assert cache.obter(storage, USUARIO, date(2024, 7, 20)) is modelo
+    assert storage.leituras == 1
+
+    assert modelo.projetar(date(2024, 7, 2), 0)["recorrente_pendente"] == 1500.0
+    cache.registrar(USUARIO, [_aluguel(7)])
+    assert modelo.projetar(date(2024, 7, 6), 1500)["recorrente_pendente"] == 0.0
+
+
+def test_modelo_expira_pelo_ttl():
+    storage = StorageFalso()
+    cache = CacheProjecoes(ttl=0)
+    cache.obter(storage, USUARIO, date(2024, 7, 2))
+    cache.obter(storage, USUARIO, date(2024, 7, 2))
+    assert storage.leituras == 2
+
+
+def test_carga_do_mes_anterior_nao_substitui_o_mes_novo():
+    storage = StorageFalso()
+    cache = CacheProjecoes()
+    novo = cache.obter(storage, USUARIO, date(2024, 8, 1))
+    # Requisição que ainda começou em julho termina depois da virada
+    cache.obter(storage, USUARIO, date(2024, 7, 31))
+    assert cache.obter(storage, USUARIO, date(2024, 8, 1)) is novo
+
+
+def test_carga_concorrente_com_gravacao_nao_fica_em_cache():
+    storage = StorageFalso()
+    cache = CacheProjecoes()
+    cache.obter(storage, USUARIO, date(2024, 7, 31))
+
+    # Virada do mês: o modelo de agosto é carregado enquanto um gasto é gravado e
+    # aplicado só no modelo de julho
+    storage.durante_leitura = lambda: cache.registrar(USUARIO, [_aluguel(8)])
+    cache.obter(storage, USUARIO, date(2024, 8, 1))
+    leituras = storage.leituras
+    cache.obter(storage, USUARIO, date(2024, 8, 1))
+    assert storage.leituras == leituras + 1
+
+
+def test_contagem_de_gravacoes_so_existe_durante_o_carregamento():
+    storage = StorageFalso([_aluguel(mes) for mes in range(1, 8)])
+    cache = CacheProjecoes(tamanho_maximo=2)
+    for user_id in range(1, 50):
+        cache.registrar(user_id, [_aluguel(7)])
+        cache.obter(storage, user_id, date(2024, 7, 31))
+    assert cache._alteracoes == {}
+
+    def falhar():
+        raise RuntimeError("banco fora do ar")
+
+    storage.durante_leitura = falhar
+    with pytest.raises(RuntimeError):
+        cache.obter(storage, 99, date(2024, 7, 31))
+    assert cache._alteracoes == {}
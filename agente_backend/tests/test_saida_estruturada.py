@@ -0,0 +1,107 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from src import process_input
+from src.llm_cache import LLMCache
+from src.saida_estruturada import (
+    ConsultaExtraida, GastoExtraido, RespostaInvalida, ESQUEMA_GASTO, ler_resposta, parametros_consulta,
+    parametros_gasto
+)
+
+
+def _response(conteudo, finish_reason="stop", refusal=None):
+    if not isinstance(conteudo, str):
+        conteudo = json.dumps(conteudo)
+    mensagem = SimpleNamespace(content=conteudo, refusal=refusal)
+    return SimpleNamespace(choices=[SimpleNamespace(message=mensagem, finish_reason=finish_reason)])
+
+
+def test_gasto_valido():
+    gasto = GastoExtraido.validar({"eh_gasto": True, "valor": 23, "tipo": "transporte", "data": "2024-03-15"})
+    assert gasto == GastoExtraido(eh_gasto=True, valor=23.0, tipo="transporte", data="2024-03-15")
+
+
+def test_nao_gasto_aceita_campos_nulos():
+    gasto = GastoExtraido.validar({"eh_gasto": False, "valor": None, "tipo": None, "data": None})
+    assert not gasto.eh_gasto
+
+
+@pytest.mark.parametrize("dados", [
+    {"valor": 10, "tipo": "lazer", "data": None},
+    {"eh_gasto": "sim", "valor": 10, "tipo": "lazer", "data": None},
+    {"eh_gasto": True, "valor": 0, "tipo": "lazer", "data": None},
+    {"eh_gasto": True, "valor": True, "tipo": "lazer", "data": None},
+    {"eh_gasto": True, "valor": "10", "tipo": "lazer", "data": None},
+    {"eh_gasto": True, "valor": 10, "tipo": None, "data": None},
+    {"eh_gasto": True, "valor": 10, "tipo": "viagens", "data": None},
+    {"eh_gasto": True, "valor": 10, "tipo": "lazer", "data": "15/03/2024"},
+    {"eh_gasto": True, "valor": 10, "tipo": "lazer", "data": "2024-02-30"},
+])
+def test_gasto_invalido(dados):
+    with pytest.raises(RespostaInvalida):
+        GastoExtraido.validar(dados)
+
+
+def test_consulta_valida():
+    dados = {"periodo": "mensal", "start_date": "2024-03-01", "end_date": "2024-03-31", "tipo": None}
+    assert ConsultaExtraida.validar(dados).como_dict() == dados
+
+
+@pytest.mark.parametrize("dados", [
+    {"periodo": "quinzenal", "start_date": None, "end_date": None, "tipo": None},
+    {"periodo": "mensal", "start_date": "2024-03-31", "end_date": "2024-03-01", "tipo": None},
+    {"periodo": "mensal", "start_date": "ontem", "end_date": None, "tipo": None},
+    {"periodo": "mensal", "start_date": None, "end_date": None, "tipo": "viagens"},
+])
+def test_consulta_invalida(dados):
+    with pytest.raises(RespostaInvalida):
+        ConsultaExtraida.validar(dados)
+
+
+def test_ler_resposta_converte_no_tipo_pedido():
+    gasto = ler_resposta(_response({"eh_gasto": True, "valor": 9.9, "tipo": "lazer", "data": None}), GastoExtraido)
+    assert (gasto.valor, gasto.tipo, gasto.data) == (9.9, "lazer", None)
+
+
+@pytest.mark.parametrize("response", [
+    _response({"eh_gasto": True, "valor": 9.9, "tipo": "lazer", "data": None}, refusal="não posso ajudar"),
+    _response('{"eh_gasto": true, "valor": 9', finish_reason="length"),
+    _response("não é json"),
+    _response(None),
+    _response([1, 2]),
+])
+def test_ler_resposta_recusa_respostas_invalidas(response):
+    with pytest.raises(RespostaInvalida):
+        ler_resposta(response, GastoExtraido)
+
+
+def test_parametros_usam_esquema_estrito_e_a_data_de_hoje():
+    hoje = datetime(2024, 3, 15)
+    parametros = parametros_gasto("uber 20", hoje)
+    formato = parametros["response_format"]["json_schema"]
+    assert formato["strict"] is True
+    assert formato["schema"] is ESQUEMA_GASTO
+    assert "2024-03-15" in parametros["messages"][0]["content"]
+    assert parametros["messages"][1]["content"] == "uber 20"
+    assert "sexta-feira" in parametros_consulta("gastos da semana", hoje)["messages"][0]["content"]
+
+
+def test_consulta_sem_datas_usa_o_mes_atual(tmp_path, monkeypatch):
+    """O prompt diz que datas null significam o mês atual, e é isso que a consulta recebe"""
+    hoje = datetime(2024, 2, 15)
+    assert "mês atual" in parametros_consulta("quanto gastei com lazer?", hoje)["messages"][0]["content"]
+
+    monkeypatch.setattr(process_input, "cache", LLMCache(str(tmp_path / "llm_cache.db")))
+    monkeypatch.setattr(process_input, "LLM_SAIDA_ESTRUTURADA", True)
+    resposta = _response({"periodo": "mensal", "start_date": None, "end_date": None, "tipo": "lazer"})
+    consulta, valida = process_input._interpretar_resposta_consulta(resposta, "chave", hoje)
+    assert valida
+    assert (consulta["start_date"], consulta["end_date"], consulta["tipo"]) == ("2024-02-01", "2024-02-29", "lazer")
+
+    # Só o fim em aberto: vai até o fim do mês atual
+    resposta = _response({"periodo": "mensal", "start_date": "2024-01-10", "end_date": None, "tipo": None})
+    consulta, _ = process_input._interpretar_resposta_consulta(resposta, "outra", hoje)
+    assert (consulta["start_date"], consulta["end_date"]) == ("2024-01-10", "2024-02-29")
@@ -0,0 +1,78 @@
+import os
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from src import senhas
+from src.senhas import LimitadorLogin, LimitadorTentativas
+
+
+def test_limitador_bloqueia_apos_o_maximo():
+    limitador = LimitadorTentativas(max_tentativas=2, janela=60)
+    chave = ("ana", "10.0.0.1")
+    assert limitador.reservar(chave) == 0
+    assert limitador.reservar(chave) == 0
+    assert limitador.reservar(chave) > 0
+
+
+def test_limitador_por_ip_nao_bloqueia_o_dono_da_conta():
+    limitador = LimitadorTentativas(max_tentativas=2, janela=60)
+    for _ in range(5):
+        limitador.reservar(("ana", "203.0.113.9"))
+    assert limitador.reservar(("ana", "10.0.0.1")) == 0
+
+
+def test_limitador_limpar_zera_tentativas():
+    limitador = LimitadorTentativas(max_tentativas=1, janela=60)
+    chave = ("ana", "10.0.0.1")
+    limitador.reservar(chave)
+    limitador.limpar(chave)
+    assert limitador.reservar(chave) == 0
+
+
+def test_login_limita_o_username_vindo_de_varios_ips():
+    limitador = LimitadorLogin(max_par=2, max_usuario=4, max_ip=100, janela=60)
+    for numero in range(4):
+        assert limitador.reservar("ana", f"203.0.113.{numero}") == 0
+    assert limitador.reservar("ana", "203.0.113.99") > 0
+    assert limitador.reservar("bruno", "203.0.113.99") == 0
+
+
+def test_login_limita_o_ip_que_tenta_varios_usernames():
+    limitador = LimitadorLogin(max_par=2, max_usuario=100, max_ip=3, janela=60)
+    for username in ("ana", "bruno", "carla"):
+        assert limitador.reservar(username, "203.0.113.9") == 0
+    assert limitador.reservar("daniel", "203.0.113.9") > 0
+    assert limitador.reservar("daniel", "10.0.0.1") == 0
+
+
+def test_login_bloqueado_nao_conta_nos_outros_limites():
+    limitador = LimitadorLogin(max_par=1, max_usuario=2, max_ip=100, janela=60)
+    limitador.reservar("ana", "10.0.0.1")
+    for _ in range(5):
+        assert limitador.reservar("ana", "10.0.0.1") > 0
+    # As tentativas recusadas pelo par não consumiram o teto do username
+    assert limitador.reservar("ana", "10.0.0.2") == 0
+
+
+def test_login_sucesso_zera_so_o_par():
+    limitador = LimitadorLogin(max_par=1, max_usuario=2, max_ip=100, janela=60)
+    limitador.reservar("ana", "10.0.0.1")
+    limitador.limpar("ana", "10.0.0.1")
+    assert limitador.reservar("ana", "10.0.0.1") == 0
+    assert limitador.reservar("ana", "10.0.0.2") > 0
+
+
+def test_pool_quebrado_e_recriado():
+    try:
+        pool = senhas._obter_pool()
+        with pytest.raises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+
+        hashed = asyncio.run(senhas.gerar_hash("segredo", rounds=4))
+        assert senhas._pool is not pool
+        assert asyncio.run(senhas.verificar_senha("segredo", hashed, rounds=4)) == (True, None)
+    finally:
+        senhas.fechar()
+    assert senhas._pool is None
@@ -0,0 +1,234 @@
+"""
+Mesmos testes para os dois backends de src/storage.py.
+
+O MongoDB usa o servidor de MONGO_URI_TESTES quando definido (banco descartável
+criado e apagado pelo teste) e, senão, o mongomock; sem pymongo/motor instalados,
+os testes do MongoDB são pulados.
+"""
+import os
+import uuid
+import asyncio
+
+import pytest
+
+from src.storage import GastoInvalido, MongoExpenseStorage
+
+USUARIO = 1
+OUTRO_USUARIO = 2
+
+GASTOS = [
+    {"valor": 10, "tipo": "alimentação", "data": "2024-01-05", "descricao": "padaria"},
+    {"valor": 25.5, "tipo": "transporte", "data": "2024-01-10", "descricao": "uber"},
+    {"valor": 100, "tipo": "alimentação", "data": "2024-02-01", "descricao": "mercado"},
+    {"valor": 40, "tipo": "lazer", "data": "2024-02-15", "descricao": "cinema"},
+    {"valor": 7, "tipo": "alimentação", "data": "2024-02-15", "descricao": "café"},
+]
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def storage(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        from src.db_sqlite_expenses import SQLiteExpenseStorage
+        yield SQLiteExpenseStorage(str(tmp_path / "gastos.db"))
+        return
+
+    db_mongo = pytest.importorskip("src.db_mongo", exc_type=ImportError)
+    uri = os.getenv("MONGO_URI_TESTES")
+    if uri:
+        monkeypatch.setattr(db_mongo, "MONGO_URI", uri)
+    else:
+        mongomock = pytest.importorskip("mongomock")
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        monkeypatch.setattr(db_mongo, "MongoClient", mongomock.MongoClient)
+        monkeypatch.setattr(db_mongo, "AsyncIOMotorClient", mongomock_motor.AsyncMongoMockClient)
+    monkeypatch.setattr(db_mongo, "DB_NAME", f"agente_financeiro_testes_{uuid.uuid4().hex[:8]}")
+
+    db_mongo.fechar()
+    db_mongo.conectar()
+    try:
+        yield MongoExpenseStorage()
+    finally:
+        db_mongo.client.drop_database(db_mongo.DB_NAME)
+        db_mongo.fechar()
+
+
+def _salvar(storage, gastos=GASTOS, user_id=USUARIO):
+    return [storage.save({**gasto, "user_id": user_id}) for gasto in gastos]
+
+
+def test_save_devolve_id_e_normaliza(storage):
+    salvo = storage.save({"user_id": USUARIO, "valor": "23,90", "tipo": " Lazer ", "data": "2024-3-5"})
+    assert salvo["_id"]
+    assert (salvo["valor"], salvo["tipo"], salvo["data"]) == (23.9, "lazer", "2024-03-05")
+
+
+@pytest.mark.parametrize("gasto", [
+    {"valor": None, "data": "2024-01-01", "tipo": "outros"},
+    {"valor": "abc", "data": "2024-01-01", "tipo": "outros"},
+    {"valor": 10, "data": None, "tipo": "outros"},
+    {"valor": 10, "data": "2024-02-30", "tipo": "outros"},
+])
+def test_save_recusa_gasto_invalido_sem_gravar(storage, gasto):
+    with pytest.raises(GastoInvalido):
+        storage.save({**gasto, "user_id": USUARIO})
+    assert storage.find_range(USUARIO) == []
+
+
+def test_save_many_grava_validos_e_informa_invalidos(storage):
+    gastos = [
+        {"user_id": USUARIO, "valor": 10, "tipo": "outros", "data": "2024-01-01"},
+        {"user_id": USUARIO, "valor": None, "tipo": "outros", "data": "2024-01-01"},
+        {"user_id": USUARIO, "valor": 20, "tipo": "outros", "data": "2024-01-02"},
+    ]
+    salvos, erros = storage.save_many(gastos)
+    assert sorted(salvos) == [0, 2]
+    assert list(erros) == [1]
+    assert len(storage.find_range(USUARIO)) == 2
+
+
+def test_find_range_filtra_periodo_categoria_e_usuario(storage):
+    _salvar(storage)
+    _salvar(storage, GASTOS[:1], user_id=OUTRO_USUARIO)
+
+    assert len(storage.find_range(USUARIO)) == 5
+    fevereiro = storage.find_range(USUARIO, "2024-02-01", "2024-02-29")
+    assert sorted(gasto["valor"] for gasto in fevereiro) == [7, 40, 100]
+    alimentacao = storage.find_range(USUARIO, "2024-01-01", "2024-02-29", tipo="alimentação")
+    assert sorted(gasto["valor"] for gasto in alimentacao) == [7, 10, 100]
+    assert len(storage.find_range(OUTRO_USUARIO)) == 1
+
+
+def test_find_range_com_campos(storage):
+    _salvar(storage)
+    gastos = storage.find_range(USUARIO, fields=["valor", "tipo"])
+    assert len(gastos) == 5
+    assert all("descricao" not in gasto for gasto in gastos)
+    assert all({"valor", "tipo"} <= set(gasto) for gasto in gastos)
+
+
+def test_find_page_percorre_tudo_em_ordem(storage):
+    _salvar(storage)
+    vistos, cursor = [], None
+    while True:
+        pagina = storage.find_page(USUARIO, cursor=cursor, limit=2)
+        assert len(pagina["gastos"]) <= 2
+        vistos.extend(pagina["gastos"])
+        cursor = pagina["proximo_cursor"]
+        if cursor is None:
+            break
+
+    assert len({gasto["_id"] for gasto in vistos}) == 5
+    datas = [gasto["data"] for gasto in vistos]
+    assert datas == sorted(datas, reverse=True)
+
+
+def test_find_page_cursor_invalido(storage):
+    with pytest.raises(ValueError):
+        storage.find_page(USUARIO, cursor="invalido")
+
+
+def test_iter_range_em_lotes(storage):
+    _salvar(storage)
+    lotes = list(storage.iter_range(USUARIO, batch_size=2))
+    assert [len(lote) for lote in lotes] == [2, 2, 1]
+    assert sorted(gasto["valor"] for lote in lotes for gasto in lote) == [7, 10, 25.5, 40, 100]
+
+
+def test_delete(storage):
+    salvo = _salvar(storage)[0]
+    assert storage.delete(OUTRO_USUARIO, salvo["_id"]) is None
+    excluido = storage.delete(USUARIO, salvo["_id"])
+    assert excluido["valor"] == 10
+    assert storage.delete(USUARIO, salvo["_id"]) is None
+    assert storage.delete(USUARIO, "id-inexistente") is None
+    assert len(storage.find_range(USUARIO)) == 4
+
+
+def test_escritas_incrementam_a_versao_dos_dados(storage):
+    assert storage.data_version(USUARIO) == 0
+    salvo = _salvar(storage, GASTOS[:1])[0]
+    storage.save_many([{**gasto, "user_id": USUARIO} for gasto in GASTOS[1:3]])
+    storage.delete(USUARIO, salvo["_id"])
+    storage.delete(USUARIO, salvo["_id"])
+    assert storage.data_version(USUARIO) == 3
+    assert storage.data_version(OUTRO_USUARIO) == 0
+    storage.bump_data_versions([USUARIO, OUTRO_USUARIO])
+    assert (storage.data_version(USUARIO), storage.data_version(OUTRO_USUARIO)) == (4, 1)
+    assert asyncio.run(storage.data_version_async(USUARIO)) == 4
+
+
+def test_iter_range_async_sqlite_com_escritas_intercaladas(tmp_path):
+    """O iterador usa uma conexão própria, não a da thread em que foi criado"""
+    from src.db_sqlite_expenses import SQLiteExpenseStorage
+    storage = SQLiteExpenseStorage(str(tmp_path / "gastos.db"))
+    _salvar(storage)
+
+    async def ler():
+        valores = []
+        async for lote in storage.iter_range_async(USUARIO, batch_size=1):
+            valores.extend(gasto["valor"] for gasto in lote)
+            # Outras operações nas threads do pool enquanto o cursor está aberto
+            await storage.save_async({"user_id": OUTRO_USUARIO, "valor": 1, "tipo": "outros", "data": "2024-01-01"})
+            await storage.find_range_async(OUTRO_USUARIO)
+        return valores
+
+    assert sorted(asyncio.run(ler())) == [7, 10, 25.5, 40, 100]
+    assert len(storage.find_range(OUTRO_USUARIO)) == 5
+
+
+def test_escrita_sqlite_que_falha_desfaz_a_transacao(tmp_path):
+    """Uma falha no incremento da versão desfaz o INSERT e libera o lock de escrita"""
+    import sqlite3
+    from src.db_sqlite_expenses import SQLiteExpenseStorage
+    storage = SQLiteExpenseStorage(str(tmp_path / "gastos.db"))
+    conn = storage._conexao()
+    conn.execute(
+        "CREATE TRIGGER falha_versao BEFORE INSERT ON data_versions "
+        "BEGIN SELECT RAISE(ABORT, 'falha simulada'); END"
+    )
+
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.save({**GASTOS[0], "user_id": USUARIO})
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.save_many([{**gasto, "user_id": USUARIO} for gasto in GASTOS])
+    assert not conn.in_transaction
+    assert storage.find_range(USUARIO) == []
+
+    # Outra conexão consegue escrever sem esperar o timeout do lock
+    outro = SQLiteExpenseStorage(str(tmp_path / "gastos.db"))
+    outro._conexao().execute("DROP TRIGGER falha_versao")
+    outro._conexao().commit()
+    _salvar(outro, GASTOS[:1])
+    assert storage.data_version(USUARIO) == 1
+
+
+def test_prontidao_do_mongo_espera_a_migracao_de_dia(storage, monkeypatch):
+    if storage.nome != "mongo":
+        asyncio.run(storage.verificar_async())
+        return
+    monkeypatch.setattr(storage.db, "_migracao_dia_concluida", False)
+    with pytest.raises(RuntimeError, match="manager_migracao"):
+        asyncio.run(storage.verificar_async())
+    storage.db.marcar_migracao_dia()
+    asyncio.run(storage.verificar_async())
+
+
+@pytest.mark.skipif(not os.getenv("MONGO_URI_TESTES"), reason="explain requer um MongoDB real (MONGO_URI_TESTES)")
+def test_consulta_com_tipo_e_coberta_pelo_indice(storage):
+    if storage.nome != "mongo":
+        pytest.skip("explain do MongoDB")
+    from src.perfil_mongo import resumo_explain
+    db_mongo = storage.db
+    db_mongo.criar_indices()
+    _salvar(storage)
+
+    filtro = db_mongo._montar_filtro(USUARIO, "2024-01-01", "2024-02-28", "alimentação")
+    projecao = db_mongo._montar_projecao(["data", "tipo", "valor"], cobrir=True)
+    plano = resumo_explain(db_mongo.expenses_collection.find(filtro, projecao).explain())
+    assert plano["coberta"], plano
+    assert "user_tipo_dia_valor" in plano["indices"]
+
+    hashes = db_mongo.expenses_collection.find(
+        {"user_id": USUARIO, "hash_importacao": {"$in": ["a", "b"]}}, {"hash_importacao": 1, "_id": 0}
+    )
+    assert resumo_explain(hashes.explain())["indices"]
@@ -0,0 +1,85 @@
+import asyncio
+
+from src.db_sqlite_expenses import SQLiteExpenseStorage
+from src.versoes import VersoesDados, CacheRespostas, gerar_etag, etag_confere
+
+USUARIO = 1
+GASTO = {"valor": 10, "tipo": "lazer", "data": "2024-01-05"}
+
+
+def test_gerar_etag_depende_de_todas_as_partes():
+    etag = gerar_etag("epoca", USUARIO, "0.1", "dashboard", "2024-01-05")
+    assert etag == gerar_etag("epoca", USUARIO, "0.1", "dashboard", "2024-01-05")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag != gerar_etag("epoca", USUARIO, "0.2", "dashboard", "2024-01-05")
+    assert etag != gerar_etag("outra", USUARIO, "0.1", "dashboard", "2024-01-05")
+    assert etag != gerar_etag("epoca", USUARIO, "0.1", "dashboard", "2024-01-06")
+
+
+def test_etag_confere():
+    etag = '"abc"'
+    assert etag_confere('"abc"', etag)
+    assert etag_confere('W/"abc"', etag)
+    assert etag_confere('"xyz", "abc"', etag)
+    assert etag_confere("*", etag)
+    assert not etag_confere('"xyz"', etag)
+    assert not etag_confere(None, etag)
+
+
+def test_cache_respostas_limita_bytes_e_tamanho_do_item():
+    cache = CacheRespostas(limite_bytes=10, maximo_item=6)
+    cache.guardar("a", b"12345")
+    cache.guardar("b", b"12345")
+    cache.obter("a")
+    cache.guardar("c", b"12345")
+    assert cache.obter("a") == b"12345"
+    assert cache.obter("b") is None
+    cache.guardar("grande", b"1234567")
+    assert cache.obter("grande") is None
+    assert cache.estatisticas()["bytes"] == 10
+
+
+def test_gravacao_de_outro_processo_muda_a_versao_depois_do_ttl(tmp_path):
+    caminho = str(tmp_path / "gastos.db")
+    api, manager = SQLiteExpenseStorage(caminho), SQLiteExpenseStorage(caminho)
+    versoes = VersoesDados(api, ttl=3600)
+    inicial = versoes.atual(USUARIO)
+
+    # Ex.: manager_importacao gravando no mesmo banco
+    manager.save({**GASTO, "user_id": USUARIO})
+    assert versoes.atual(USUARIO) == inicial
+
+    versoes.ttl = 0
+    assert versoes.atual(USUARIO) != inicial
+    assert asyncio.run(versoes.atual_async(USUARIO)) == versoes.atual(USUARIO)
+
+
+def test_incrementar_descarta_a_versao_em_cache_e_pode_persistir(tmp_path):
+    storage = SQLiteExpenseStorage(str(tmp_path / "gastos.db"))
+    versoes = VersoesDados(storage, ttl=3600)
+    inicial = versoes.atual(USUARIO)
+
+    storage.save({**GASTO, "user_id": USUARIO})
+    versoes.incrementar(USUARIO)
+    depois = versoes.atual(USUARIO)
+    assert depois != inicial
+    assert depois.endswith(".1")
+
+    versoes.incrementar(USUARIO, persistir=True)
+    assert storage.data_version(USUARIO) == 2
+
+
+def test_leitura_concorrente_com_gravacao_nao_guarda_versao_antiga():
+    class StorageLento:
+        versao = 0
+
+        def data_version(self, user_id):
+            lida = self.versao
+            # Gravação do próprio processo enquanto a leitura estava em andamento
+            self.versao += 1
+            versoes.incrementar(user_id)
+            return lida
+
+    versoes = VersoesDados(StorageLento(), ttl=3600)
+    primeira = versoes.atual(USUARIO)
+    assert versoes.atual(USUARIO) != primeira
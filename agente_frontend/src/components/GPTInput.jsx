@@ -97,10 +97,47 @@ const ErrorDisplay = ({ type, message, onRetry, onLogout }) => {
   );
 };
 
+// Lê uma resposta text/event-stream e chama onEvento(evento, dados) para cada evento
+const lerEventosSSE = async (response, onEvento) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Eventos são separados por uma linha em branco
+    let fim;
+    while ((fim = buffer.indexOf('\n\n')) !== -1) {
+      const bloco = buffer.slice(0, fim);
+      buffer = buffer.slice(fim + 2);
+
+      let evento = 'message';
+      let dados = '';
+      for (const linha of bloco.split('\n')) {
+        if (linha.startsWith('event: ')) evento = linha.slice(7);
+        else if (linha.startsWith('data: ')) dados += linha.slice(6);
+      }
+      onEvento(evento, dados ? JSON.parse(dados) : null);
+    }
+  }
+};
+
+// Texto exibido no botão enquanto os eventos chegam
+const ETAPAS = {
+  interpretando: 'Interpretando...',
+  rascunho: 'Salvando...',
+  periodo: 'Buscando gastos...',
+  gastos: 'Buscando gastos...'
+};
+
 export default function GPTInput() {
   const [input, setInput] = useState('');
   const [resposta, setResposta] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
+  const [etapa, setEtapa] = useState(null);
   const [erro, setErro] = useState(null);
   const [debug, setDebug] = useState([]);
 
@@ -130,6 +167,7 @@ export default function GPTInput() {
     setIsLoading(true);
     setErro(null);
     setDebug([]);
+    setEtapa(null);
     
     try {
       const token = getToken();
@@ -153,7 +191,8 @@ export default function GPTInput() {
       addDebug(`Endpoint selecionado: ${endpoint}`);
       addDebug(`Payload: ${JSON.stringify(payload)}`);
       
-      const response = await fetch(`http://localhost:8000${endpoint}`, {
+      // Modo SSE: o progresso e os gastos chegam antes do fim do processamento
+      const response = await fetch(`http://localhost:8000${endpoint}?formato=sse`, {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -184,28 +223,45 @@ export default function GPTInput() {
         throw new Error(errorText);
       }
       
-      const data = await response.json();
-      addDebug(`Resposta: ${JSON.stringify(data)}`);
-      
-      if (isGasto) {
-        // Formatando a resposta para um gasto
-        setResposta({
-          tipo: 'gasto',
-          categoria: data.gasto.tipo,
-          valor: data.gasto.valor,
-          data: data.gasto.data,
-          descricao: data.gasto.descricao
-        });
-      } else {
-        // Formatando a resposta para uma consulta
-        setResposta({
-          tipo: 'consulta',
-          periodo: data.periodo,
-          total: data.total,
-          por_categoria: data.por_categoria,
-          gastos: data.gastos
-        });
-      }
+      await lerEventosSSE(response, (evento, data) => {
+        addDebug(`Evento ${evento}: ${JSON.stringify(data)}`);
+        if (ETAPAS[evento]) setEtapa(ETAPAS[evento]);
+
+        if (evento === 'erro') {
+          throw new Error(data.mensagem);
+        }
+
+        if (isGasto) {
+          // O rascunho já aparece enquanto o gasto é salvo
+          if (evento === 'rascunho' || evento === 'concluido') {
+            setResposta({
+              tipo: 'gasto',
+              categoria: data.gasto.tipo,
+              valor: data.gasto.valor,
+              data: data.gasto.data,
+              descricao: data.gasto.descricao
+            });
+          }
+        } else if (evento === 'periodo') {
+          // Formatando a resposta para uma consulta; gastos e totais chegam aos poucos
+          setResposta({
+            tipo: 'consulta',
+            periodo: data.periodo,
+            total: 0,
+            por_categoria: {},
+            gastos: []
+          });
+        } else if (evento === 'gastos') {
+          setResposta(anterior => ({ ...anterior, gastos: [...anterior.gastos, ...data] }));
+        } else if (evento === 'resumo') {
+          setResposta(anterior => ({
+            ...anterior,
+            periodo: data.periodo,
+            total: data.total,
+            por_categoria: data.por_categoria
+          }));
+        }
+      });
     } catch (error) {
       console.error('Erro:', error);
       addDebug(`Erro capturado: ${error.message}`);
@@ -227,6 +283,7 @@ export default function GPTInput() {
       }
     } finally {
       setIsLoading(false);
+      setEtapa(null);
     }
   };
 
@@ -321,7 +378,7 @@ export default function GPTInput() {
         disabled={isLoading || !input.trim()}
         className="w-full px-6 py-2 bg-blue-600 text-white rounded-lg shadow-md hover:bg-blue-700 transition disabled:bg-blue-300 disabled:cursor-not-allowed"
       >
-        {isLoading ? 'Processando...' : 'Enviar para o Agente'}
+        {isLoading ? (etapa || 'Processando...') : 'Enviar para o Agente'}
       </button>
 
       {erro && (
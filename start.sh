@@ -33,6 +33,11 @@ if [ -f ".env" ]; then
   export $(grep -v '^#' .env | xargs)
 fi
 
+# Cria os índices do MongoDB (a API não cria índices ao subir)
+if [ "${EXPENSE_BACKEND:-mongo}" = "mongo" ]; then
+  python -m src.manager_migracao --apenas-indices || echo "⚠️  Não foi possível criar os índices do MongoDB."
+fi
+
 # Roda o backend com uvicorn
 echo "🚀 Iniciando backend em segundo plano..."
 uvicorn main:app --reload --host 0.0.0.0 --port 8000 &